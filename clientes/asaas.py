@@ -0,0 +1,123 @@
+import threading
+import time
+from django.conf import settings
+from prometheus_client import Histogram
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .circuito import Circuito
+import requests, logging
+
+LATENCIA_ASAAS = Histogram(
+    'asaas_requisicao_duracao_segundos',
+    'Duração das chamadas à API do Asaas',
+    ['metodo', 'recurso', 'status'],
+)
+
+
+class ErroAsaas(Exception):
+    pass
+
+
+class AsaasIndisponivel(ErroAsaas):
+    # chamada recusada pelo circuit breaker, sem contato com a API
+    pass
+
+# respostas que indicam o Asaas fora do ar (contam como falha para o circuito)
+STATUS_INDISPONIVEL = (429, 500, 502, 503, 504)
+
+
+class ClienteAsaas:
+    """
+    Cliente HTTP do Asaas com pool de conexões keep-alive (uma sessão por processo).
+
+    Só métodos idempotentes são repetidos automaticamente: um POST repetido
+    poderia criar o mesmo cliente ou a mesma cobrança duas vezes.
+    Com um 'circuito', as chamadas falham na hora enquanto o Asaas estiver fora do ar.
+    """
+
+    METODOS_IDEMPOTENTES = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+    def __init__(self, url_base, tamanho_pool=10, tentativas=2, timeout_conexao=3.05, timeout_leitura=15, circuito=None):
+        self.circuito = circuito
+        self.url_base = url_base.rstrip('/') + '/'
+        self.timeout = (timeout_conexao, timeout_leitura)
+        self.sessao = requests.Session()
+        self.sessao.headers.update({
+            "accept": "application/json",
+            "content-type": "application/json",
+        })
+        retry = Retry(
+            total=tentativas,
+            backoff_factor=0.3,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=self.METODOS_IDEMPOTENTES,
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamanho_pool, max_retries=retry)
+        self.sessao.mount('https://', adaptador)
+        self.sessao.mount('http://', adaptador)
+
+    def requisitar(self, metodo, recurso, **kwargs):
+        asaas_token = settings.ASAAS_ACCESS_TOKEN
+        if not asaas_token:
+            raise ErroAsaas("A variável de ambiente ASAAS_ACCESS_TOKEN não está configurada.")
+
+        if self.circuito and not self.circuito.permitir():
+            raise AsaasIndisponivel(f"Circuito do Asaas aberto: {metodo} {recurso} recusado.")
+
+        kwargs.setdefault('timeout', self.timeout)
+        headers = {"access_token": asaas_token, **kwargs.pop('headers', {})}
+        status_resposta = 'erro'
+        inicio = time.perf_counter()
+        try:
+            response = self.sessao.request(metodo, self.url_base + recurso, headers=headers, **kwargs)
+            status_resposta = str(response.status_code)
+        except requests.exceptions.RequestException:
+            self.registrar_resultado(falhou=True)
+            raise
+        finally:
+            duracao = time.perf_counter() - inicio
+            LATENCIA_ASAAS.labels(metodo, recurso, status_resposta).observe(duracao)
+            logging.debug(f"Asaas {metodo} {recurso}: {status_resposta} em {duracao * 1000:.0f}ms")
+
+        self.registrar_resultado(falhou=response.status_code in STATUS_INDISPONIVEL)
+        return response
+
+    def registrar_resultado(self, falhou):
+        if not self.circuito:
+            return
+        if falhou:
+            self.circuito.registrar_falha()
+        else:
+            self.circuito.registrar_sucesso()
+
+    def get(self, recurso, **kwargs):
+        return self.requisitar('GET', recurso, **kwargs)
+
+    def post(self, recurso, **kwargs):
+        return self.requisitar('POST', recurso, **kwargs)
+
+
+_cliente = None
+_lock_cliente = threading.Lock()
+
+
+def obter_cliente_asaas():
+    #cria a sessão uma única vez por processo, reaproveitando as conexões entre requisições
+    global _cliente
+    if _cliente is None:
+        with _lock_cliente:
+            if _cliente is None:
+                _cliente = ClienteAsaas(
+                    url_base=settings.ASAAS_API_URL,
+                    tamanho_pool=settings.ASAAS_POOL_CONEXOES,
+                    tentativas=settings.ASAAS_TENTATIVAS,
+                    timeout_conexao=settings.ASAAS_TIMEOUT_CONEXAO,
+                    timeout_leitura=settings.ASAAS_TIMEOUT_LEITURA,
+                    circuito=Circuito(
+                        'asaas',
+                        limite_falhas=settings.ASAAS_CIRCUITO_LIMITE_FALHAS,
+                        tempo_aberto=settings.ASAAS_CIRCUITO_TEMPO_ABERTO,
+                    ),
+                )
+    return _cliente
@@ -0,0 +1,63 @@
+"""
+Busca de clientes para a recepção: por CPF (com ou sem pontuação), nome ou email.
+
+- CPF: igualdade (11 dígitos) ou prefixo em cpf_normalizado, no índice único.
+- nome e email: prefixo sem diferenciar maiúsculas, nos índices UPPER(...) COLLATE "C".
+- com o pg_trgm instalado, completa com os nomes e emails parecidos ('Joao Slva' encontra
+  'João Silva'), do mais próximo para o mais distante, nos índices GiST da migration 0015.
+
+Cada critério é uma consulta separada, com LIMIT e na ordem do próprio índice: o Postgres para
+nos primeiros resultados, mesmo quando o prefixo ('Jo') casa com boa parte da base. Um OR entre
+os critérios obrigaria a ler e ordenar todos os candidatos.
+"""
+import functools
+import re
+from django.contrib.postgres.search import TrigramDistance
+from django.db import connection
+from django.db.models.functions import Collate, Upper
+from .models import CadastroClientes
+from .validador_cpf import normalizar_cpf
+
+LIMITE = 20
+TAMANHO_MINIMO = 2
+CAMPOS = ['id', 'nome_social', 'cpf', 'email', 'contato']
+
+
+@functools.cache
+def trigrama_disponivel():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def criterios_de_busca(termo):
+    clientes = CadastroClientes.objects.only(*CAMPOS)
+
+    #só dígitos e pontuação de CPF
+    if not re.sub(r'[\d.\-\s]', '', termo):
+        digitos = normalizar_cpf(termo)
+        if len(digitos) == 11:
+            return [clientes.filter(cpf_normalizado=digitos)]
+        return [clientes.filter(cpf_normalizado__startswith=digitos).order_by('cpf_normalizado')]
+
+    criterios = [
+        #mesmas expressões dos índices cliente_nome_prefixo_idx e cliente_email_prefixo_idx
+        clientes.alias(chave=Collate(Upper('nome_social'), 'C')).filter(chave__startswith=termo.upper()).order_by('chave', 'id'),
+        clientes.alias(chave=Collate(Upper('email'), 'C')).filter(chave__startswith=termo.upper()).order_by('chave', 'id'),
+    ]
+    if trigrama_disponivel():
+        criterios += [
+            clientes.filter(nome_social__trigram_similar=termo).order_by(TrigramDistance('nome_social', termo)),
+            clientes.filter(email__trigram_similar=termo).order_by(TrigramDistance('email', termo)),
+        ]
+    return criterios
+
+
+def buscar_clientes(termo, limite=LIMITE):
+    encontrados = {}
+    for criterio in criterios_de_busca(termo.strip()):
+        for cliente in criterio[:limite]:
+            encontrados.setdefault(cliente.id, cliente)
+        if len(encontrados) >= limite:
+            break
+    return list(encontrados.values())[:limite]
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from prometheus_client import Gauge
+from .models import CircuitoAsaas
+import logging
+
+ESTADO_CIRCUITO = Gauge(
+    'asaas_circuito_estado',
+    'Estado do circuit breaker do Asaas (0 fechado, 1 meio aberto, 2 aberto)',
+    ['circuito'],
+)
+VALOR_ESTADO = {'fechado': 0, 'meio_aberto': 1, 'aberto': 2}
+
+
+class Circuito:
+    """
+    Circuit breaker com o estado no banco, compartilhado entre os processos.
+
+    Abre depois de 'limite_falhas' falhas seguidas e, enquanto aberto, recusa as
+    chamadas na hora em vez de esperar o timeout. Vencido o prazo, um único processo
+    faz a chamada de teste (meio aberto): sucesso fecha o circuito, falha abre de novo.
+    """
+
+    def __init__(self, nome, limite_falhas=5, tempo_aberto=30):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = timedelta(seconds=tempo_aberto)
+        # cópia local do prazo de abertura: enquanto aberto, nem o banco é consultado
+        self._aberto_ate = None
+
+    def permitir(self):
+        agora = timezone.now()
+        if self._aberto_ate and agora < self._aberto_ate:
+            return False
+        self._aberto_ate = None
+
+        registro, _ = CircuitoAsaas.objects.get_or_create(nome=self.nome)
+        self._publicar(registro.estado)
+        if registro.estado == 'fechado':
+            return True
+        if registro.aberto_ate and agora < registro.aberto_ate:
+            if registro.estado == 'aberto':
+                self._aberto_ate = registro.aberto_ate
+            return False
+
+        # prazo vencido: só o processo que conseguir atualizar o registro faz a chamada de teste
+        reservado = CircuitoAsaas.objects.filter(
+            pk=registro.pk, estado=registro.estado, aberto_ate=registro.aberto_ate,
+        ).update(estado='meio_aberto', aberto_ate=agora + self.tempo_aberto, atualizado_em=agora)
+        if reservado:
+            logging.debug(f"Circuito {self.nome} meio aberto: enviando chamada de teste.")
+            self._publicar('meio_aberto')
+        return bool(reservado)
+
+    def registrar_sucesso(self):
+        fechados = CircuitoAsaas.objects.filter(nome=self.nome).exclude(
+            estado='fechado', falhas_consecutivas=0,
+        ).update(estado='fechado', falhas_consecutivas=0, aberto_ate=None, atualizado_em=timezone.now())
+        if fechados:
+            logging.debug(f"Circuito {self.nome} fechado.")
+        self._publicar('fechado')
+
+    def registrar_falha(self):
+        with transaction.atomic():
+            registro, _ = CircuitoAsaas.objects.select_for_update().get_or_create(nome=self.nome)
+            registro.falhas_consecutivas += 1
+            if registro.estado == 'meio_aberto' or registro.falhas_consecutivas >= self.limite_falhas:
+                registro.estado = 'aberto'
+                registro.aberto_ate = timezone.now() + self.tempo_aberto
+                self._aberto_ate = registro.aberto_ate
+                logging.debug(
+                    f"Circuito {self.nome} aberto após {registro.falhas_consecutivas} falha(s) "
+                    f"até {registro.aberto_ate:%H:%M:%S}."
+                )
+            registro.save()
+        self._publicar(registro.estado)
+
+    def _publicar(self, estado):
+        ESTADO_CIRCUITO.labels(self.nome).set(VALOR_ESTADO[estado])
@@ -0,0 +1,122 @@
+"""
+Importação de clientes em massa por CSV (onboarding das clínicas parceiras), usada pelo
+endpoint /clients/importar/ e pelo comando importar_clientes.
+
+O arquivo é lido em lotes de TAMANHO_DO_LOTE linhas, sem carregar tudo na memória. Cada lote
+custa um número fixo de queries: uma para achar CPFs e emails já cadastrados, um bulk_create
+dos clientes e outro dos eventos do outbox que criam os clientes no Asaas depois
+(processar_outbox_asaas), em vez de uma chamada síncrona ao Asaas por cliente.
+Cada lote é gravado na sua própria transação: se a importação parar no meio, é só enviar o
+mesmo arquivo de novo, o que já entrou volta como duplicado.
+"""
+import csv
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from .models import CadastroClientes
+from .outbox import enfileirar_clientes
+from .validador_cpf import normalizar_cpf
+import logging
+
+COLUNAS = ['nome_social', 'cpf', 'email', 'contato', 'logradouro', 'numero', 'complemento', 'bairro', 'cep']
+TAMANHO_DO_LOTE = 1000
+# um cadastro concorrente entre a checagem e o insert faz o lote ser refeito
+TENTATIVAS_INSERCAO = 3
+
+
+class ArquivoInvalido(Exception):
+    pass
+
+
+def ler_csv(arquivo):
+    #planilhas exportadas em pt-BR costumam usar ';' como separador
+    cabecalho = arquivo.readline()
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    colunas = [coluna.strip().lower() for coluna in next(csv.reader([cabecalho], delimiter=delimitador), [])]
+    faltando = [coluna for coluna in COLUNAS if coluna not in colunas]
+    if faltando:
+        raise ArquivoInvalido(f"Coluna(s) obrigatória(s) ausente(s) no cabeçalho: {', '.join(faltando)}.")
+    return csv.DictReader(arquivo, fieldnames=colunas, delimiter=delimitador)
+
+
+def importar_clientes(arquivo, tamanho_do_lote=TAMANHO_DO_LOTE):
+    """
+    Importa o CSV (um arquivo aberto em modo texto) lote a lote.
+    Gera, para cada lote, a quantidade de clientes criados e os erros por linha.
+    """
+    linhas = enumerate(ler_csv(arquivo), 2)  #a linha 1 é o cabeçalho
+    while lote := list(islice(linhas, tamanho_do_lote)):
+        yield importar_lote(lote)
+
+
+def importar_lote(lote):
+    erros = []
+    pendentes = validar_linhas(lote, erros)
+    for tentativa in range(TENTATIVAS_INSERCAO):
+        novos = separar_duplicados(pendentes, erros)
+        try:
+            with transaction.atomic():
+                gravar(novos)
+            break
+        except IntegrityError:
+            if tentativa == TENTATIVAS_INSERCAO - 1:
+                raise
+            logging.debug('cliente cadastrado durante a importação, refazendo a checagem de duplicados.')
+            pendentes = novos
+    erros.sort(key=lambda erro: erro['linha'])
+    return len(novos), erros
+
+
+def erro(erros, numero, status, mensagens):
+    erros.append({'linha': numero, 'status': status, 'erro': mensagens})
+
+
+def validar_linhas(lote, erros):
+    validos = []
+    for numero, dados in lote:
+        cliente = CadastroClientes(**{coluna: (dados.get(coluna) or '').strip() for coluna in COLUNAS})
+        # bulk_create não passa pelo save(), que preenche o cpf normalizado
+        cliente.cpf_normalizado = normalizar_cpf(cliente.cpf)
+        try:
+            #os validators dos campos (validar_cpf, email, tamanhos, obrigatórios), sem query.
+            #a unicidade é checada para o lote inteiro em separar_duplicados
+            cliente.full_clean(
+                exclude=['cpf_normalizado', 'asaas_customer_id'], validate_unique=False, validate_constraints=False
+            )
+        except ValidationError as e:
+            erro(erros, numero, 'invalido', e.message_dict)
+            continue
+        validos.append((numero, cliente))
+    return validos
+
+
+def separar_duplicados(validos, erros):
+    #CPFs e emails já cadastrados em uma query, pelos índices únicos; dentro do lote, a primeira linha fica
+    cpfs, emails = set(), set()
+    if validos:
+        cadastrados = CadastroClientes.objects.filter(
+            Q(cpf_normalizado__in={cliente.cpf_normalizado for _, cliente in validos})
+            | Q(email__in={cliente.email for _, cliente in validos})
+        ).values_list('cpf_normalizado', 'email')
+        for cpf, email in cadastrados:
+            cpfs.add(cpf)
+            emails.add(email)
+
+    novos = []
+    for numero, cliente in validos:
+        if cliente.cpf_normalizado in cpfs:
+            erro(erros, numero, 'duplicado', {'cpf': ['Já existe um cliente com este CPF.']})
+        elif cliente.email in emails:
+            erro(erros, numero, 'duplicado', {'email': ['Já existe um cliente com este email.']})
+        else:
+            cpfs.add(cliente.cpf_normalizado)
+            emails.add(cliente.email)
+            novos.append((numero, cliente))
+    return novos
+
+
+def gravar(novos):
+    clientes = CadastroClientes.objects.bulk_create([cliente for _, cliente in novos])
+    # bulk_create não dispara os signals; clientes novos ainda não estão no cache de nenhum nó
+    enfileirar_clientes(clientes)
@@ -0,0 +1,105 @@
+import json, random, statistics, time
+from unittest import mock
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from clientes import views
+from clientes.models import CadastroClientes, PagamentoConsultas
+from consultas.models import AgendamentosConsultas
+from profissionais.models import Profissionais
+
+TOKEN_BENCHMARK = 'token-benchmark-webhook'
+CONSTRAINT = 'pagamento_asaas_payment_id_unico'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o tempo de processamento do webhook do Asaas com a tabela de pagamentos populada. '
+        'Tudo roda em uma transação que é desfeita no final, nada fica gravado no banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pagamentos', type=int, default=1_000_000)
+        parser.add_argument('--requisicoes', type=int, default=200)
+        parser.add_argument(
+            '--sem-indice', action='store_true',
+            help='remove o índice único de asaas_payment_id (dentro da transação) para comparação'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.executar(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def executar(self, options):
+        total = options['pagamentos']
+        self.stdout.write(f'Populando {total} pagamentos...')
+        inicio = time.perf_counter()
+        consulta = self.criar_consulta()
+        with connection.cursor() as cursor:
+            if options['sem_indice']:
+                # precisa vir antes do INSERT: o ALTER TABLE não roda com triggers de FK pendentes
+                cursor.execute(f'ALTER TABLE {PagamentoConsultas._meta.db_table} DROP CONSTRAINT {CONSTRAINT}')
+            cursor.execute(
+                f"""
+                INSERT INTO {PagamentoConsultas._meta.db_table}
+                    (cliente_id, consulta_id, metodo_de_pagamento, preco_consulta,
+                     data_vencimento, status_pagamento, asaas_payment_id)
+                SELECT %s, %s, 'pix', 80.00, CURRENT_DATE, 'pendente', 'pay_bench_' || n
+                FROM generate_series(1, %s) AS n
+                """,
+                [consulta.cliente_id, consulta.id, total],
+            )
+            cursor.execute(f'ANALYZE {PagamentoConsultas._meta.db_table}')
+        self.stdout.write(f'Tabela populada em {time.perf_counter() - inicio:.1f}s')
+
+        factory = RequestFactory()
+        view = views.GerenciarPagamento.as_view()
+        tempos = []
+        with mock.patch.object(views, 'webhook_token', TOKEN_BENCHMARK):
+            for _ in range(options['requisicoes']):
+                corpo = {
+                    'event': 'PAYMENT_CONFIRMED',
+                    'payment': {'id': f'pay_bench_{random.randint(1, total)}'},
+                }
+                request = factory.post(
+                    '/clients/consultas/gerenciarpagamento/',
+                    data=json.dumps(corpo),
+                    content_type='application/json',
+                    HTTP_ASAAS_ACCESS_TOKEN=TOKEN_BENCHMARK,
+                )
+                inicio = time.perf_counter()
+                response = view(request)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                if response.status_code != 200:
+                    self.stderr.write(f'Resposta inesperada: {response.status_code}')
+
+        tempos.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f"{'sem' if options['sem_indice'] else 'com'} índice, {len(tempos)} webhooks: "
+            f"média {statistics.mean(tempos):.2f}ms | "
+            f"p50 {tempos[len(tempos) // 2]:.2f}ms | "
+            f"p95 {tempos[int(len(tempos) * 0.95) - 1]:.2f}ms | "
+            f"máx {tempos[-1]:.2f}ms"
+        ))
+
+    def criar_consulta(self):
+        cliente = CadastroClientes.objects.create(
+            nome_social='cliente benchmark', cpf='00000000000', email='benchmark@webhook.test',
+            contato='11999999999', logradouro='rua', numero='1', complemento='-', bairro='-', cep='00000000',
+        )
+        profissional = Profissionais.objects.create(
+            nome_social='Dr. Benchmark', profissao='Médico', endereco='rua', contato='11999999999',
+        )
+        return AgendamentosConsultas.objects.create(
+            profissional=profissional, cliente=cliente,
+            data_consulta=timezone.now(), status_consulta='agendada',
+        )
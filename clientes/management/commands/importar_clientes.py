@@ -0,0 +1,38 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from clientes.importacao import COLUNAS, TAMANHO_DO_LOTE, ArquivoInvalido, importar_clientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa clientes de um CSV (colunas: ' + ', '.join(COLUNAS) + ') em lotes, com bulk_create. '
+        'O cadastro no Asaas fica no outbox para o processar_outbox_asaas. Pode ser rodado de novo com o '
+        'mesmo arquivo: quem já foi importado sai como duplicado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='CSV em UTF-8, separado por vírgula ou ponto e vírgula')
+        parser.add_argument('--lote', type=int, default=TAMANHO_DO_LOTE, help='linhas gravadas por transação')
+        parser.add_argument('--relatorio', help='CSV com os erros por linha (padrão: stdout)')
+
+    def handle(self, *args, **options):
+        relatorio = open(options['relatorio'], 'w', newline='') if options['relatorio'] else self.stdout
+        escritor = csv.writer(relatorio)
+        escritor.writerow(['linha', 'status', 'erro'])
+        criados = com_erro = 0
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                for criados_do_lote, erros in importar_clientes(arquivo, options['lote']):
+                    criados += criados_do_lote
+                    com_erro += len(erros)
+                    for erro in erros:
+                        escritor.writerow([erro['linha'], erro['status'], self.descrever(erro['erro'])])
+        except (OSError, ArquivoInvalido, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(f'{e} ({criados} cliente(s) já importados)')
+        finally:
+            if options['relatorio']:
+                relatorio.close()
+        self.stderr.write(self.style.SUCCESS(f'{criados} cliente(s) importados, {com_erro} linha(s) com erro.'))
+
+    def descrever(self, mensagens):
+        return '; '.join(f"{campo}: {' '.join(erros)}" for campo, erros in mensagens.items())
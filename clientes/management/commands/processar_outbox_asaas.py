@@ -0,0 +1,34 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from clientes.outbox import processar_em_paralelo, processar_evento, reservar_eventos
+
+
+class Command(BaseCommand):
+    help = (
+        'Envia ao Asaas os eventos pendentes do outbox (cobranças criadas nos agendamentos). '
+        'Falhas voltam para a fila com backoff exponencial.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concorrencia', type=int, default=4, help='chamadas simultâneas ao Asaas')
+        parser.add_argument('--lote', type=int, default=50, help='eventos reservados por rodada')
+        parser.add_argument('--continuo', action='store_true', help='continua rodando e consultando a fila')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='espera (s) quando a fila está vazia')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['concorrencia']) as executor:
+            while True:
+                close_old_connections()
+                eventos = reservar_eventos(options['lote'])
+                if eventos:
+                    resultados = processar_em_paralelo(executor, options['concorrencia'], processar_evento, eventos)
+                    self.stdout.write(
+                        f'{resultados.count(True)} evento(s) enviados, {resultados.count(False)} com falha.'
+                    )
+                    continue
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from clientes.asaas import AsaasIndisponivel
+from clientes.sincronizacao import CONCORRENCIA, REQUISICOES_POR_SEGUNDO, TAMANHO_DO_LOTE, sincronizar_clientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Cria no Asaas os clientes que ainda não têm asaas_customer_id, com chamadas simultâneas e '
+        'uma taxa máxima de requisições, gravando os ids com um UPDATE por lote. Pode ser interrompido '
+        'e rodado de novo: só entra quem continua sem o id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concorrencia', type=int, default=CONCORRENCIA, help='chamadas simultâneas ao Asaas')
+        parser.add_argument('--taxa', type=float, default=REQUISICOES_POR_SEGUNDO, help='requisições por segundo (0 sem limite)')
+        parser.add_argument('--lote', type=int, default=TAMANHO_DO_LOTE, help='clientes gravados por UPDATE')
+        parser.add_argument('--apos-id', type=int, default=0, help='começa depois deste id (retoma uma rodada)')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        criados = falhas = 0
+        try:
+            for criados_do_lote, falhas_do_lote, ultimo_id in sincronizar_clientes(
+                options['concorrencia'], options['taxa'], options['lote'], options['apos_id'],
+            ):
+                criados += criados_do_lote
+                falhas += falhas_do_lote
+                self.stdout.write(
+                    f'até o id {ultimo_id}: {criados} cliente(s) criados, {falhas} com falha '
+                    f'({time.perf_counter() - inicio:.0f}s)'
+                )
+        except AsaasIndisponivel as e:
+            raise CommandError(f'{e} {criados} cliente(s) criados até aqui; rode de novo para continuar.')
+        self.stdout.write(self.style.SUCCESS(f'{criados} cliente(s) criados no Asaas, {falhas} com falha.'))
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.2 on 2026-10-18 07:02
+
+from django.db import IntegrityError, migrations, models
+
+INDICE = "pagamento_asaas_payment_id_unico"
+
+
+def criar_indice_unico(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        # um CREATE INDEX CONCURRENTLY que falhou deixa o índice INVALID: com IF NOT EXISTS ele
+        # ficaria no lugar e o ADD CONSTRAINT ... USING INDEX falharia
+        cursor.execute(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+            [INDICE],
+        )
+        indice = cursor.fetchone()
+        if indice and indice[0]:
+            return
+        if indice:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDICE}")
+
+        # dois pagamentos locais na mesma cobrança do Asaas: qual é o certo é decisão de quem opera
+        cursor.execute("""
+            SELECT asaas_payment_id, array_agg(id ORDER BY id)
+            FROM clientes_pagamentoconsultas
+            WHERE asaas_payment_id IS NOT NULL
+            GROUP BY asaas_payment_id
+            HAVING count(*) > 1
+            ORDER BY asaas_payment_id
+            """)
+        duplicados = cursor.fetchall()
+        if duplicados:
+            detalhes = "; ".join(
+                f"{asaas_id}: pagamentos {ids}" for asaas_id, ids in duplicados[:20]
+            )
+            raise IntegrityError(
+                f"{len(duplicados)} asaas_payment_id(s) em mais de um pagamento ({detalhes}). "
+                "Corrija ou limpe o asaas_payment_id dos pagamentos errados e rode a migração de novo."
+            )
+
+        cursor.execute(
+            f"CREATE UNIQUE INDEX CONCURRENTLY {INDICE} "
+            "ON clientes_pagamentoconsultas (asaas_payment_id)"
+        )
+
+
+class Migration(migrations.Migration):
+    # o índice é criado com CONCURRENTLY para não bloquear escritas na tabela de pagamentos,
+    # por isso a migração não pode rodar dentro de uma transação.
+    atomic = False
+
+    dependencies = [
+        ("clientes", "0011_alter_cadastroclientes_cpf"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(
+                    criar_indice_unico,
+                    reverse_code=migrations.RunPython.noop,
+                ),
+                # promove o índice já construído a constraint (lock curto, sem varrer a tabela de novo)
+                migrations.RunSQL(
+                    sql="""
+                        ALTER TABLE clientes_pagamentoconsultas
+                        ADD CONSTRAINT pagamento_asaas_payment_id_unico
+                        UNIQUE USING INDEX pagamento_asaas_payment_id_unico;
+                    """,
+                    # remover a constraint também remove o índice
+                    reverse_sql="""
+                        ALTER TABLE clientes_pagamentoconsultas
+                        DROP CONSTRAINT IF EXISTS pagamento_asaas_payment_id_unico;
+                    """,
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name="pagamentoconsultas",
+                    constraint=models.UniqueConstraint(
+                        fields=("asaas_payment_id",),
+                        name="pagamento_asaas_payment_id_unico",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.2 on 2026-10-18 06:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0012_pagamento_asaas_payment_id_unico"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventoOutboxAsaas",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.CharField(choices=[("cobranca", "Cobrança")], max_length=20),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("processando", "Processando"),
+                            ("concluido", "Concluído"),
+                            ("falhou", "Falhou"),
+                        ],
+                        default="pendente",
+                        max_length=20,
+                    ),
+                ),
+                ("tentativas", models.PositiveIntegerField(default=0)),
+                (
+                    "proxima_tentativa",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("ultimo_erro", models.TextField(blank=True, default="")),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                (
+                    "pagamento",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="clientes.pagamentoconsultas",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status__in", ["pendente", "processando"])),
+                        fields=["proxima_tentativa"],
+                        name="outbox_asaas_fila_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.2 on 2026-10-18 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0013_eventooutboxasaas"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CircuitoAsaas",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nome", models.CharField(max_length=50, unique=True)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("fechado", "Fechado"),
+                            ("aberto", "Aberto"),
+                            ("meio_aberto", "Meio aberto"),
+                        ],
+                        default="fechado",
+                        max_length=20,
+                    ),
+                ),
+                ("falhas_consecutivas", models.PositiveIntegerField(default=0)),
+                ("aberto_ate", models.DateTimeField(blank=True, null=True)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.2 on 2026-10-18 07:50
+
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# só os dígitos do cpf. clientes que já estavam duplicados com outra pontuação ficam sem o
+# cpf normalizado (o mais antigo fica com ele), para a constraint única poder ser criada.
+PREENCHER_CPF_NORMALIZADO = """
+UPDATE clientes_cadastroclientes AS c
+SET cpf_normalizado = s.digitos
+FROM (SELECT id, digitos, ROW_NUMBER() OVER (PARTITION BY digitos ORDER BY id) AS ordem
+      FROM (SELECT id, regexp_replace(cpf, '\\D', '', 'g') AS digitos FROM clientes_cadastroclientes) AS d
+     ) AS s
+WHERE s.id = c.id AND s.ordem = 1
+"""
+
+INDICES_TRIGRAMA = {
+    "cliente_nome_trgm_idx": "nome_social",
+    "cliente_email_trgm_idx": "email",
+}
+
+
+def criar_indices_trigrama(apps, schema_editor):
+    # busca aproximada por nome e email (clientes/busca.py). GiST, e não GIN, para ordenar pela
+    # distância (<->) no próprio índice. sem o pg_trgm no servidor, a busca fica só com os prefixos
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for nome, coluna in INDICES_TRIGRAMA.items():
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {nome} ON clientes_cadastroclientes USING gist ({coluna} gist_trgm_ops)"
+            )
+
+
+def remover_indices_trigrama(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for nome in INDICES_TRIGRAMA:
+            cursor.execute(f"DROP INDEX IF EXISTS {nome}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0014_circuitoasaas"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cadastroclientes",
+            name="cpf_normalizado",
+            field=models.CharField(
+                db_collation="C", editable=False, max_length=11, null=True
+            ),
+        ),
+        migrations.RunSQL(PREENCHER_CPF_NORMALIZADO, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="cadastroclientes",
+            index=models.Index(
+                django.db.models.functions.comparison.Collate(
+                    django.db.models.functions.text.Upper("nome_social"), "C"
+                ),
+                name="cliente_nome_prefixo_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cadastroclientes",
+            index=models.Index(
+                django.db.models.functions.comparison.Collate(
+                    django.db.models.functions.text.Upper("email"), "C"
+                ),
+                name="cliente_email_prefixo_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="cadastroclientes",
+            constraint=models.UniqueConstraint(
+                fields=("cpf_normalizado",), name="cliente_cpf_normalizado_unico"
+            ),
+        ),
+        migrations.RunPython(criar_indices_trigrama, remover_indices_trigrama),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.2 on 2026-10-18 07:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0015_cliente_cpf_normalizado_e_busca"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventooutboxasaas",
+            name="cliente",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="clientes.cadastroclientes",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="eventooutboxasaas",
+            name="tipo",
+            field=models.CharField(
+                choices=[("cobranca", "Cobrança"), ("cliente", "Cliente")],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -1,5 +1,17 @@
-from django.db import models
-from .validador_cpf import validar_cpf
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Collate, Upper
+from django.utils import timezone
+from .validador_cpf import normalizar_cpf, validar_cpf
+
+
+CONSTRAINT_CPF = 'cliente_cpf_normalizado_unico'
+
+
+def cpf_duplicado(erro):
+    #verifica se o IntegrityError veio da constraint do cpf normalizado
+    diag = getattr(erro.__cause__, 'diag', None)
+    return getattr(diag, 'constraint_name', None) == CONSTRAINT_CPF
 
 
 class CadastroClientes(models.Model):
@@ -10,6 +22,9 @@ class CadastroClientes(models.Model):
         unique=True,
         help_text='Pode ser digitado com ou sem pontuação.'
     )
+    # só os dígitos do cpf, preenchido no save(). '123.456.789-09' e '12345678909' são o mesmo cliente.
+    # com a collation "C" o índice único atende a igualdade, o prefixo (LIKE '123%') e a ordenação
+    cpf_normalizado = models.CharField(max_length=11, null=True, editable=False, db_collation='C')
     email = models.EmailField(unique=True)
     contato = models.CharField(max_length=11)
     logradouro = models.CharField(max_length=200)
@@ -19,6 +34,38 @@ class CadastroClientes(models.Model):
     cep = models.CharField(max_length=8)
     asaas_customer_id = models.CharField(max_length=30, null=True)
 
+    class Meta:
+        # prefixo de nome e email sem diferenciar maiúsculas (clientes/busca.py). a collation "C" deixa
+        # o mesmo índice filtrar o LIKE 'JO%' e devolver na ordem, parando nos primeiros resultados.
+        # os índices de trigrama (pg_trgm) são criados pela migration 0015, quando a extensão existe
+        constraints = [
+            models.UniqueConstraint(fields=['cpf_normalizado'], name=CONSTRAINT_CPF),
+        ]
+        indexes = [
+            models.Index(Collate(Upper('nome_social'), 'C'), name='cliente_nome_prefixo_idx'),
+            models.Index(Collate(Upper('email'), 'C'), name='cliente_email_prefixo_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'cpf' in update_fields:
+            anterior = self.cpf_normalizado
+            self.cpf_normalizado = normalizar_cpf(self.cpf)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'cpf_normalizado'}
+            # clientes antigos com o mesmo cpf em outra pontuação ficaram com cpf_normalizado NULL
+            # na migration 0015: salvar um deles de novo esbarra na constraint
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+            except IntegrityError as erro:
+                if not cpf_duplicado(erro):
+                    raise
+                self.cpf_normalizado = anterior
+                raise ValidationError({'cpf': 'Já existe um cliente com este CPF.'}, code='unique')
+            return
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"nome social:{self.nome_social} email{self.email}"
 
@@ -48,5 +95,70 @@ class PagamentoConsultas(models.Model):
         max_length=100,
         null=True,                 
     )
+
+    class Meta:
+        constraints = [
+            # usado pelo webhook do Asaas para achar o pagamento local (NULLs não conflitam)
+            models.UniqueConstraint(fields=['asaas_payment_id'], name='pagamento_asaas_payment_id_unico'),
+        ]
+
+    def __str__(self):
+        return f"Preço consulta:{self.preco_consulta}"
+
+
+class EventoOutboxAsaas(models.Model):
+    # chamadas ao Asaas gravadas na mesma transação do registro local e
+    # enviadas depois pelo comando processar_outbox_asaas.
+    tipo = models.CharField(max_length=20, choices=(
+        ('cobranca', 'Cobrança'),
+        ('cliente', 'Cliente'),
+    ))
+    pagamento = models.ForeignKey(
+        'clientes.PagamentoConsultas',
+        on_delete=models.CASCADE,
+        null=True)
+    cliente = models.ForeignKey(
+        'clientes.CadastroClientes',
+        on_delete=models.CASCADE,
+        null=True)
+    status = models.CharField(max_length=20, default='pendente', choices=(
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('falhou', 'Falhou'),
+    ))
+    tentativas = models.PositiveIntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True, default='')
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # fila do worker: só os eventos ainda não concluídos, pela ordem de execução
+            models.Index(
+                fields=['proxima_tentativa'],
+                condition=models.Q(status__in=['pendente', 'processando']),
+                name='outbox_asaas_fila_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Evento {self.tipo} ({self.status})"
+
+
+class CircuitoAsaas(models.Model):
+    # estado do circuit breaker das chamadas ao Asaas, compartilhado entre
+    # todos os processos (gunicorn e workers do outbox).
+    nome = models.CharField(max_length=50, unique=True)
+    estado = models.CharField(max_length=20, default='fechado', choices=(
+        ('fechado', 'Fechado'),
+        ('aberto', 'Aberto'),
+        ('meio_aberto', 'Meio aberto'),
+    ))
+    falhas_consecutivas = models.PositiveIntegerField(default=0)
+    # aberto: até quando recusar chamadas. meio_aberto: prazo da chamada de teste em andamento.
+    aberto_ate = models.DateTimeField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"Preço consulta:{self.preco_consulta}"        
+        return f"Circuito {self.nome} ({self.estado})"
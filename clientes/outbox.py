@@ -0,0 +1,192 @@
+from datetime import timedelta
+from django.conf import settings
+import threading
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .asaas import AsaasIndisponivel, ErroAsaas, obter_cliente_asaas
+from .models import EventoOutboxAsaas
+import logging
+
+MAX_TENTATIVAS = getattr(settings, 'OUTBOX_ASAAS_MAX_TENTATIVAS', 8)
+BACKOFF_BASE_SEGUNDOS = getattr(settings, 'OUTBOX_ASAAS_BACKOFF_BASE', 30)
+BACKOFF_MAXIMO_SEGUNDOS = 6 * 60 * 60
+# tempo que um evento fica reservado para um worker. se o worker morrer, outro assume depois disso.
+RESERVA_SEGUNDOS = 5 * 60
+
+
+def enfileirar_cobranca(pagamento):
+    #deve ser chamado na mesma transação que criou o pagamento
+    return EventoOutboxAsaas.objects.create(tipo='cobranca', pagamento=pagamento)
+
+
+def enfileirar_cobrancas(pagamentos):
+    #versão em lote, para os agendamentos em massa
+    return EventoOutboxAsaas.objects.bulk_create(
+        [EventoOutboxAsaas(tipo='cobranca', pagamento=pagamento) for pagamento in pagamentos]
+    )
+
+
+def enfileirar_clientes(clientes):
+    #clientes importados em massa: o cadastro no Asaas é feito depois, pelo worker
+    return EventoOutboxAsaas.objects.bulk_create(
+        [EventoOutboxAsaas(tipo='cliente', cliente=cliente) for cliente in clientes]
+    )
+
+
+def reservar_eventos(limite):
+    """
+    Reserva até 'limite' eventos prontos para execução.
+    SKIP LOCKED permite vários workers concorrentes sem pegar o mesmo evento.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EventoOutboxAsaas.objects.filter(
+                status__in=['pendente', 'processando'],
+                proxima_tentativa__lte=agora,
+            )
+            .order_by('proxima_tentativa')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:limite]
+        )
+        EventoOutboxAsaas.objects.filter(id__in=ids).update(
+            status='processando',
+            tentativas=F('tentativas') + 1,
+            proxima_tentativa=agora + timedelta(seconds=RESERVA_SEGUNDOS),
+        )
+    return list(
+        EventoOutboxAsaas.objects.filter(id__in=ids)
+        .select_related('pagamento__cliente', 'pagamento__consulta', 'cliente')
+        .order_by('id')
+    )
+
+
+def processar_em_paralelo(executor, concorrencia, funcao, itens):
+    """
+    Aplica 'funcao' aos itens em até 'concorrencia' threads do executor e devolve os resultados
+    na ordem dos itens. Cada thread pega o próximo item de uma fila comum e fecha a sua conexão
+    com o banco uma vez só, quando a fila acaba (e não a cada item).
+    """
+    resultados = [None] * len(itens)
+    fila = iter(enumerate(itens))
+    lock = threading.Lock()
+
+    def trabalhar():
+        try:
+            while True:
+                with lock:
+                    proximo = next(fila, None)
+                if proximo is None:
+                    return
+                indice, item = proximo
+                resultados[indice] = funcao(item)
+        finally:
+            # cada thread usa a sua conexão (o circuito do Asaas e os eventos gravam no banco)
+            connection.close()
+
+    for tarefa in [executor.submit(trabalhar) for _ in range(min(concorrencia, len(itens)))]:
+        tarefa.result()
+    return resultados
+
+
+def calcular_backoff(tentativas):
+    return min(BACKOFF_BASE_SEGUNDOS * 2 ** (tentativas - 1), BACKOFF_MAXIMO_SEGUNDOS)
+
+
+def processar_evento(evento):
+    try:
+        if evento.tipo == 'cobranca':
+            registrar_cobranca_no_asaas(evento.pagamento)
+        elif evento.tipo == 'cliente':
+            registrar_cliente_no_asaas(evento.cliente)
+        else:
+            raise ErroAsaas(f"Tipo de evento desconhecido: {evento.tipo}")
+
+    except AsaasIndisponivel as e:
+        # circuito aberto: o evento volta para a fila sem gastar uma das tentativas
+        evento.ultimo_erro = str(e)
+        evento.status = 'pendente'
+        evento.tentativas -= 1
+        evento.proxima_tentativa = timezone.now() + timedelta(seconds=settings.ASAAS_CIRCUITO_TEMPO_ABERTO)
+        evento.save(update_fields=['status', 'tentativas', 'ultimo_erro', 'proxima_tentativa'])
+        return False
+
+    except Exception as e:
+        # qualquer falha (rede, resposta do Asaas ou dados locais) volta para a fila com backoff
+        logging.debug(f"ERRO ao processar o evento {evento.id} do outbox do Asaas: {e}")
+        evento.ultimo_erro = str(e)
+        if evento.tentativas >= MAX_TENTATIVAS:
+            evento.status = 'falhou'
+        else:
+            evento.status = 'pendente'
+            evento.proxima_tentativa = timezone.now() + timedelta(seconds=calcular_backoff(evento.tentativas))
+        evento.save(update_fields=['status', 'ultimo_erro', 'proxima_tentativa'])
+        return False
+
+    evento.status = 'concluido'
+    evento.ultimo_erro = ''
+    evento.save(update_fields=['status', 'ultimo_erro'])
+    return True
+
+
+def registrar_cobranca_no_asaas(pagamento):
+    if pagamento.asaas_payment_id:
+        # cobrança já registrada (evento reprocessado depois de uma falha ao marcar como concluído)
+        return pagamento.asaas_payment_id
+
+    # Verifica se o ID do cliente no Asaas realmente existe
+    id_cliente_asaas = pagamento.cliente.asaas_customer_id
+    if not id_cliente_asaas:
+        raise ErroAsaas(f"O cliente {pagamento.cliente.id} não possui um asaas_customer_id registrado.")
+
+    asaas_payload = {
+        "billingType": pagamento.metodo_de_pagamento,
+        "value": float(pagamento.preco_consulta),
+        "dueDate": pagamento.data_vencimento.strftime('%Y-%m-%d'),
+        "customer": id_cliente_asaas,
+        "description": f"Pagamento da consulta ID {pagamento.consulta.id} para o cliente {pagamento.cliente.nome_social}",
+        "externalReference": f"PAGAMENTO_{pagamento.id}" # Referência externa para conciliação
+    }
+    logging.debug(f"Enviando para o Asaas o payload: {asaas_payload}")
+
+    response = obter_cliente_asaas().post('payments', json=asaas_payload)
+    if response.status_code != 200:
+        raise ErroAsaas(f"O Asaas retornou o status {response.status_code}: {response.text}")
+
+    #salva o id do novo pagamento registrado
+    id_pagamento_asaas = response.json().get('id')
+    pagamento.asaas_payment_id = id_pagamento_asaas
+    pagamento.save(update_fields=['asaas_payment_id'])
+    logging.debug(f"Pagamento {pagamento.id} criado com sucesso no Asaas ({id_pagamento_asaas}).")
+    return id_pagamento_asaas
+
+
+def registrar_cliente_no_asaas(cliente):
+    if cliente.asaas_customer_id:
+        return cliente.asaas_customer_id
+
+    response = obter_cliente_asaas().post('customers', json=payload_cliente_asaas(cliente))
+    if response.status_code != 200:
+        raise ErroAsaas(f"O Asaas retornou o status {response.status_code}: {response.text}")
+
+    cliente.asaas_customer_id = response.json().get('id')
+    cliente.save(update_fields=['asaas_customer_id'])
+    logging.debug(f"Cliente {cliente.id} criado com sucesso no Asaas ({cliente.asaas_customer_id}).")
+    return cliente.asaas_customer_id
+
+
+def payload_cliente_asaas(cliente):
+    return {
+        "name": cliente.nome_social,
+        "cpfCnpj": cliente.cpf,
+        "email": cliente.email,
+        "phone": cliente.contato,
+        "address": cliente.logradouro,
+        "addressNumber": cliente.numero,
+        "complement": cliente.complemento,
+        "province": cliente.bairro,
+        "postalCode": cliente.cep,
+        "notificationDisabled": True,
+        "externalReference": f"CLIENTE_{cliente.id}",  # para conciliar um cliente criado duas vezes
+    }
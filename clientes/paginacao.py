@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ClientesCursorPagination(CursorPagination):
+    """
+    Paginação por cursor da listagem de clientes, pelo id (chave primária): cada página é
+    id > cursor ORDER BY id LIMIT n, sem COUNT(*) nem OFFSET, por maior que seja a base.
+    """
+
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -1,7 +1,33 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from .models import CadastroClientes, PagamentoConsultas
+from .validador_cpf import normalizar_cpf
 
 class SerializerCadastroClientes(serializers.ModelSerializer):
+    def __init__(self, *args, campos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        #sparse fieldset (?fields= na listagem): só os campos pedidos
+        if campos is not None:
+            for nome in set(self.fields) - set(campos):
+                self.fields.pop(nome)
+
+    def validate_cpf(self, value):
+        #o mesmo CPF com outra pontuação também é duplicado
+        duplicados = CadastroClientes.objects.filter(cpf_normalizado=normalizar_cpf(value))
+        if self.instance is not None:
+            duplicados = duplicados.exclude(pk=self.instance.pk)
+        if duplicados.exists():
+            raise serializers.ValidationError('Já existe um cliente com este CPF.')
+        return value
+
+    def save(self, **kwargs):
+        #duplicado que passou pelo validate_cpf (cliente antigo ou cadastro concorrente): o save()
+        #do model levanta o ValidationError do Django, que vira 400 no campo cpf
+        try:
+            return super().save(**kwargs)
+        except DjangoValidationError as erro:
+            raise serializers.ValidationError(serializers.as_serializer_error(erro))
+
     class Meta:
         model = CadastroClientes
         fields = '__all__'
@@ -0,0 +1,102 @@
+"""
+Backfill dos clientes sem asaas_customer_id: falhas no cadastro síncrono do POST /clients/cadastro/
+e eventos de importação que desistiram. Sem o id do Asaas as cobranças desses clientes não saem.
+
+Os clientes são lidos em lotes pelo id (keyset, sem OFFSET), criados no Asaas por um pool de
+threads com uma taxa máxima de requisições por segundo e gravados com um UPDATE por lote.
+Pode ser interrompido e rodado de novo a qualquer momento: só entra quem ainda não tem o id.
+Quem falhou numa rodada só é tentado de novo na próxima (ou com --apos-id).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db.models import Case, Exists, OuterRef, Value, When
+from .asaas import AsaasIndisponivel, obter_cliente_asaas
+from .models import CadastroClientes, EventoOutboxAsaas
+from .outbox import payload_cliente_asaas, processar_em_paralelo
+import logging
+
+TAMANHO_DO_LOTE = 200
+CONCORRENCIA = 8
+REQUISICOES_POR_SEGUNDO = 10
+# só o que vai no payload do Asaas
+CAMPOS = ['id', 'nome_social', 'cpf', 'email', 'contato', 'logradouro', 'numero', 'complemento', 'bairro', 'cep']
+
+
+class LimiteDeTaxa:
+    # espaça o início das chamadas de todas as threads em 1/por_segundo
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self.proxima = time.monotonic()
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        with self.lock:
+            agora = time.monotonic()
+            espera = self.proxima - agora
+            self.proxima = max(self.proxima, agora) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+def clientes_sem_asaas(apos_id, limite):
+    #os que têm um evento de cadastro na fila do outbox ficam com o processar_outbox_asaas
+    na_fila = EventoOutboxAsaas.objects.filter(
+        cliente=OuterRef('pk'), tipo='cliente', status__in=['pendente', 'processando'],
+    )
+    return list(
+        CadastroClientes.objects.filter(~Exists(na_fila), asaas_customer_id__isnull=True, id__gt=apos_id)
+        .order_by('id')
+        .only(*CAMPOS)[:limite]
+    )
+
+
+def sincronizar_clientes(concorrencia=CONCORRENCIA, por_segundo=REQUISICOES_POR_SEGUNDO,
+                         tamanho_do_lote=TAMANHO_DO_LOTE, apos_id=0):
+    """
+    Gera, por lote: (criados, falhas, último id do lote). Com o circuito do Asaas aberto,
+    grava o que já foi criado e levanta AsaasIndisponivel.
+    """
+    limite = LimiteDeTaxa(por_segundo)
+    circuito_aberto = threading.Event()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        while clientes := clientes_sem_asaas(apos_id, tamanho_do_lote):
+            ids_asaas = processar_em_paralelo(
+                executor, concorrencia, lambda cliente: criar_no_asaas(cliente, limite, circuito_aberto), clientes,
+            )
+            criados = {cliente.id: asaas_id for cliente, asaas_id in zip(clientes, ids_asaas) if asaas_id}
+            gravar_ids(criados)
+            if circuito_aberto.is_set():
+                raise AsaasIndisponivel(
+                    f"Circuito do Asaas aberto depois de {len(criados)} cliente(s) do lote após o id {apos_id}."
+                )
+            apos_id = clientes[-1].id
+            yield len(criados), len(clientes) - len(criados), apos_id
+
+
+def criar_no_asaas(cliente, limite, circuito_aberto):
+    if circuito_aberto.is_set():
+        return None
+    try:
+        limite.aguardar()
+        response = obter_cliente_asaas().post('customers', json=payload_cliente_asaas(cliente))
+        if response.status_code != 200:
+            logging.debug(f"ERRO ao criar o cliente {cliente.id} no Asaas: {response.status_code} {response.text}")
+            return None
+        return response.json().get('id')
+    except AsaasIndisponivel:
+        #o resto do lote nem é enviado
+        circuito_aberto.set()
+        return None
+    except Exception as e:
+        logging.debug(f"ERRO ao criar o cliente {cliente.id} no Asaas: {e}")
+        return None
+
+
+def gravar_ids(criados):
+    #um UPDATE para o lote inteiro. quem ganhou um id por outro caminho nesse meio tempo fica com ele
+    if not criados:
+        return 0
+    return CadastroClientes.objects.filter(id__in=criados, asaas_customer_id__isnull=True).update(
+        asaas_customer_id=Case(*[When(id=cliente_id, then=Value(asaas_id)) for cliente_id, asaas_id in criados.items()])
+    )
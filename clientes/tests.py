@@ -1,15 +1,27 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from django.utils import timezone
 from datetime import  timedelta
-from .models import PagamentoConsultas, CadastroClientes
+from .models import PagamentoConsultas, CadastroClientes, EventoOutboxAsaas, CircuitoAsaas
+from .asaas import AsaasIndisponivel, ClienteAsaas, ErroAsaas
+from .circuito import Circuito
+from .sincronizacao import LimiteDeTaxa
+from .outbox import enfileirar_cobranca, enfileirar_clientes, processar_em_paralelo, reservar_eventos, processar_evento, MAX_TENTATIVAS
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.uploadedfile import SimpleUploadedFile
 from consultas.models import AgendamentosConsultas
 from profissionais.models import Profissionais
 from unittest.mock import patch, MagicMock
-import json
+import json, os, requests, tempfile, time
 
 import json
 
@@ -53,13 +65,59 @@ class CadastroClientesTests(TestCase):
         response = self.client.get(self.base_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    @patch('clientes.views.CadastroClientesCreate.registrar_cliente_no_asaas')
+    def test_cpf_duplicado_que_passa_pela_validacao_vira_400(self, mock_asaas):
+        CadastroClientes.objects.create(**dict(self.valid_payload, cpf='136.789.820-00', email='antigo@teste.com'))
+        #simula o cadastro concorrente: a checagem do serializer não enxergou o outro cliente
+        with patch('clientes.serializers.SerializerCadastroClientes.validate_cpf', lambda serializer, value: value):
+            response = self.client.post(self.base_url, data=json.dumps(self.valid_payload), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cpf', response.data)
+        self.assertEqual(CadastroClientes.objects.count(), 1)
+        mock_asaas.assert_not_called()
+
+    def criar_clientes(self, total):
+        CadastroClientes.objects.bulk_create(
+            CadastroClientes(**dict(self.valid_payload, cpf=f'{n:011d}', email=f'cliente{n}@teste.com'))
+            for n in range(total)
+        )
+
+    def test_listagem_paginada_por_cursor(self):
+        self.criar_clientes(5)
+
+        primeira = self.client.get(self.base_url, {'page_size': 3})
+        self.assertEqual(primeira.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(primeira.data['results']), 3)
+        segunda = self.client.get(primeira.data['next'])
+        self.assertIsNone(segunda.data['next'])
+        ids = [c['id'] for c in primeira.data['results'] + segunda.data['results']]
+        self.assertEqual(ids, list(CadastroClientes.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_fields_limita_os_campos_e_as_colunas_lidas(self):
+        self.criar_clientes(2)
+        self.assertEqual(self.client.get('/users/user/').status_code, 200)  # aquece o cache do token
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.base_url, {'fields': 'nome_social,email'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'nome_social', 'email'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('"email"', sql)
+        self.assertNotIn('"logradouro"', sql)
+
+    def test_fields_invalido(self):
+        response = self.client.get(self.base_url, {'fields': 'nome_social,senha'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('senha', response.data['erro'])
+
     def test_criar_cliente_sem_autenticacao(self):
         self.client.cookies['access_token'] = None 
         response = self.client.post(self.base_url, self.valid_payload, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
     
-    @patch('clientes.views.asaas_token', 'mock_token_de_teste')
-    @patch('clientes.views.requests.post')
+    @override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')
+    @patch('clientes.asaas.requests.Session.request')
     def test_cria_cliente_e_registra_no_asaas_com_sucesso(self, mock_requests_post):
         """
         Testa o "caminho feliz": o cliente é criado localmente e o ID do Asaas
@@ -88,8 +146,8 @@ class CadastroClientesTests(TestCase):
         mock_requests_post.assert_called_once()
         print("\n[SUCESSO] Teste 'test_cria_cliente_e_registra_no_asaas_com_sucesso' passou.")
 
-    @patch('clientes.views.asaas_token', 'mock_token_de_teste')
-    @patch('clientes.views.requests.post')
+    @override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')
+    @patch('clientes.asaas.requests.Session.request')
     def test_cria_cliente_localmente_mesmo_com_falha_no_asaas(self, mock_requests_post):
         """
         Testa o cenário de falha: o cliente é criado localmente com sucesso,
@@ -118,6 +176,23 @@ class CadastroClientesTests(TestCase):
         mock_requests_post.assert_called_once()
         print("\n[SUCESSO] Teste 'test_cria_cliente_localmente_mesmo_com_falha_no_asaas' passou.")
 
+    @override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')
+    @patch('clientes.asaas.requests.Session.request')
+    def test_repeticao_com_idempotency_key_nao_chama_o_asaas_de_novo(self, mock_requests_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"id": "cus_000000000001", "object": "customer"}
+        mock_requests_post.return_value = mock_response
+
+        primeira = self.client.post(self.base_url, self.valid_payload, format='json', HTTP_IDEMPOTENCY_KEY='cliente-1')
+        repeticao = self.client.post(self.base_url, self.valid_payload, format='json', HTTP_IDEMPOTENCY_KEY='cliente-1')
+
+        self.assertEqual(primeira.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeticao.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeticao.json(), primeira.json())
+        self.assertEqual(CadastroClientes.objects.count(), 1)
+        mock_requests_post.assert_called_once()
+
     def test_criar_cliente_cpf_invalidos(self):
         invalid_payload = {
             "nome_social": "cliente teste",
@@ -171,6 +246,188 @@ class CadastroClientesTests(TestCase):
         self.assertIsNone(cliente.asaas_customer_id)
 
 
+class BuscaClientesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='recepcao@example.com', password='testpass123', nome_social='Recepção')
+        token = AccessToken.for_user(self.user)
+        token['id'] = self.user.id
+        self.client.cookies['access_token'] = str(token)
+        self.url = '/clients/busca/'
+
+        endereco = dict(contato='11222223333', logradouro='rua', numero='1', complemento='-', bairro='centro', cep='01000000')
+        self.joana = CadastroClientes.objects.create(
+            nome_social='Joana Silva', cpf='136.789.820-00', email='joana@teste.com', **endereco,
+        )
+        self.joao = CadastroClientes.objects.create(
+            nome_social='João Souza', cpf='52998224725', email='souza@teste.com', **endereco,
+        )
+
+    def buscar(self, termo):
+        response = self.client.get(self.url, {'q': termo})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [cliente['id'] for cliente in response.data['results']]
+
+    def test_cpf_normalizado_no_save(self):
+        self.assertEqual(self.joana.cpf_normalizado, '13678982000')
+        self.joana.cpf = '111.444.777-35'
+        self.joana.save(update_fields=['cpf'])
+        self.joana.refresh_from_db()
+        self.assertEqual(self.joana.cpf_normalizado, '11144477735')
+
+    def test_cpf_duplicado_antigo_no_save_vira_erro_de_validacao(self):
+        #como a migration 0015 deixou os duplicados antigos: outra pontuação e cpf_normalizado NULL
+        CadastroClientes.objects.filter(id=self.joao.id).update(cpf='13678982000', cpf_normalizado=None)
+        self.joao.refresh_from_db()
+
+        self.joao.nome_social = 'João Souza Filho'
+        with self.assertRaises(ValidationError) as erro:
+            self.joao.save()
+        self.assertIn('cpf', erro.exception.message_dict)
+        self.assertIsNone(self.joao.cpf_normalizado)
+
+        #alterações que não mexem no cpf continuam funcionando
+        self.joao.save(update_fields=['nome_social'])
+        self.joao.refresh_from_db()
+        self.assertEqual(self.joao.nome_social, 'João Souza Filho')
+
+    def test_busca_por_cpf_com_ou_sem_pontuacao(self):
+        self.assertEqual(self.buscar('13678982000'), [self.joana.id])
+        self.assertEqual(self.buscar('136.789.820-00'), [self.joana.id])
+        self.assertEqual(self.buscar('529.98'), [self.joao.id])
+
+    def test_busca_por_prefixo_do_nome_ou_email(self):
+        self.assertEqual(self.buscar('jo'), [self.joana.id, self.joao.id])
+        self.assertEqual(self.buscar('JOANA'), [self.joana.id])
+        self.assertEqual(self.buscar('souza@'), [self.joao.id])
+        self.assertEqual(self.buscar('maria'), [])
+
+    def test_resposta_so_com_os_campos_da_busca(self):
+        response = self.client.get(self.url, {'q': 'joana'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'nome_social', 'cpf', 'email', 'contato'})
+
+    def test_com_pg_trgm_completa_com_os_parecidos(self):
+        from . import busca
+        with patch.object(busca, 'trigrama_disponivel', return_value=True):
+            criterios = busca.criterios_de_busca('Joana Slva')
+        self.assertEqual(len(criterios), 4)
+        sql = str(criterios[2].query)
+        self.assertIn('"nome_social" % Joana Slva', sql)
+        self.assertIn('"nome_social" <-> Joana Slva', sql)
+
+    def test_prefixo_na_ordem_do_indice(self):
+        from . import busca
+        sql = str(busca.criterios_de_busca('jo')[0][:20].query)
+        self.assertIn('COLLATE "C"', sql)
+        self.assertIn('LIMIT 20', sql)
+
+    def test_termo_curto_e_sem_autenticacao(self):
+        self.assertEqual(self.client.get(self.url, {'q': 'j'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.cookies['access_token'] = None
+        self.assertEqual(self.client.get(self.url, {'q': 'joana'}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @patch('clientes.views.CadastroClientesCreate.registrar_cliente_no_asaas')
+    def test_cadastro_recusa_cpf_com_outra_pontuacao(self, mock_asaas):
+        response = self.client.post('/clients/cadastro/', {
+            'nome_social': 'Joana de novo', 'cpf': '13678982000', 'email': 'outra@teste.com', 'contato': '11222223333',
+            'logradouro': 'rua', 'numero': '1', 'complemento': '-', 'bairro': 'centro', 'cep': '01000000',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cpf', response.data)
+        mock_asaas.assert_not_called()
+
+
+class ImportarClientesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='onboarding@example.com', password='testpass123', nome_social='Onboarding')
+        token = AccessToken.for_user(self.user)
+        token['id'] = self.user.id
+        self.client.cookies['access_token'] = str(token)
+        self.url = '/clients/importar/'
+        self.cabecalho = 'nome_social,cpf,email,contato,logradouro,numero,complemento,bairro,cep\n'
+        CadastroClientes.objects.create(
+            nome_social='Já Cadastrada', cpf='136.789.820-00', email='cadastrada@teste.com', contato='11222223333',
+            logradouro='rua', numero='1', complemento='-', bairro='centro', cep='01000000',
+        )
+
+    def cpf(self, n):
+        #gera um CPF válido a partir de 9 dígitos
+        digitos = [int(d) for d in f'{n:09d}']
+        for peso in (10, 11):
+            resto = sum(d * (peso - i) for i, d in enumerate(digitos)) * 10 % 11
+            digitos.append(0 if resto == 10 else resto)
+        return ''.join(map(str, digitos))
+
+    def linha(self, n, cpf=None, email=None):
+        return (f'Cliente {n},{cpf or self.cpf(n)},{email or f"cliente{n}@parceira.com"},'
+                f'11999999999,rua da clínica,{n % 1000},sala 1,centro,01000000\n')
+
+    def enviar(self, conteudo, nome='clientes.csv'):
+        arquivo = SimpleUploadedFile(nome, conteudo.encode('utf-8'), content_type='text/csv')
+        return self.client.post(self.url, {'arquivo': arquivo}, format='multipart')
+
+    def test_importa_e_relata_erros_por_linha(self):
+        conteudo = (self.cabecalho + self.linha(1) + self.linha(2, cpf='123.456.789-00')
+                    + self.linha(3, cpf='13678982000') + self.linha(4, email='cadastrada@teste.com')
+                    + self.linha(5, cpf=self.cpf(1)) + self.linha(6))
+        response = self.enviar(conteudo)
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['resumo'], {'criado': 2, 'duplicado': 3, 'invalido': 1})
+        self.assertEqual(
+            [(erro['linha'], erro['status'], list(erro['erro'])) for erro in response.data['erros']],
+            [(3, 'invalido', ['cpf']), (4, 'duplicado', ['cpf']), (5, 'duplicado', ['email']), (6, 'duplicado', ['cpf'])],
+        )
+        importados = CadastroClientes.objects.filter(email__endswith='@parceira.com')
+        self.assertEqual(sorted(importados.values_list('cpf_normalizado', flat=True)), [self.cpf(1), self.cpf(6)])
+        #o Asaas fica para o worker do outbox
+        self.assertEqual(
+            set(EventoOutboxAsaas.objects.filter(tipo='cliente').values_list('cliente_id', flat=True)),
+            set(importados.values_list('id', flat=True)),
+        )
+
+    def test_queries_por_lote_nao_crescem_com_as_linhas(self):
+        from .importacao import importar_lote, ler_csv
+        linhas = list(enumerate(ler_csv(StringIO(self.cabecalho + self.linha(7))), 2))
+        with CaptureQueriesContext(connection) as poucas:
+            importar_lote(linhas)
+        conteudo = ''.join(self.linha(n) for n in range(100, 150))
+        linhas = list(enumerate(ler_csv(StringIO(self.cabecalho + conteudo)), 2))
+        with CaptureQueriesContext(connection) as muitas:
+            criados, erros = importar_lote(linhas)
+        self.assertEqual((criados, erros), (50, []))
+        self.assertEqual(len(muitas), len(poucas))
+
+    def test_aceita_ponto_e_virgula_e_bom(self):
+        conteudo = '\ufeff' + self.cabecalho.replace(',', ';') + self.linha(8).replace(',', ';')
+        response = self.enviar(conteudo)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['resumo']['criado'], 1)
+
+    def test_arquivo_sem_colunas_obrigatorias(self):
+        response = self.enviar('nome_social,cpf\nCliente,13678982000\n')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data['erro'])
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_comando_importa_em_lotes_e_pode_ser_repetido(self):
+        caminho = os.path.join(tempfile.mkdtemp(), 'clientes.csv')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(self.cabecalho + ''.join(self.linha(n) for n in range(10, 35)))
+
+        saida = StringIO()
+        call_command('importar_clientes', caminho, lote=10, stdout=saida, stderr=StringIO())
+        self.assertEqual(CadastroClientes.objects.filter(email__endswith='@parceira.com').count(), 25)
+        self.assertEqual(saida.getvalue().splitlines(), ['linha,status,erro'])
+
+        saida = StringIO()
+        call_command('importar_clientes', caminho, lote=10, stdout=saida, stderr=StringIO())
+        self.assertEqual(CadastroClientes.objects.filter(email__endswith='@parceira.com').count(), 25)
+        self.assertEqual(len(saida.getvalue().splitlines()), 26)
+        self.assertIn('2,duplicado,cpf: Já existe um cliente com este CPF.', saida.getvalue())
+
+
 @patch('clientes.views.webhook_token', 'meu-token-secreto-de-teste')
 class GerenciarPagamentoWebhookTests(TestCase):
 
@@ -342,4 +599,358 @@ class GerenciarPagamentoWebhookTests(TestCase):
         self.consulta.refresh_from_db()
         
         self.assertEqual(self.pagamento.status_pagamento, 'pago')
-        self.assertEqual(self.consulta.status_consulta, 'confirmada')
\ No newline at end of file
+        self.assertEqual(self.consulta.status_consulta, 'confirmada')
+
+    def test_asaas_payment_id_e_unico(self):
+        """
+        Garante que dois pagamentos locais não podem apontar para a mesma cobrança do Asaas.
+        """
+        with self.assertRaises(IntegrityError):
+            PagamentoConsultas.objects.create(
+                consulta_id=self.consulta.id,
+                preco_consulta=100.00,
+                cliente_id=self.cliente.id,
+                metodo_de_pagamento='pix',
+                status_pagamento='pendente',
+                asaas_payment_id='pay_1234567890'
+            )
+
+    def test_migracao_do_indice_unico_recusa_duplicados(self):
+        from importlib import import_module
+        migracao = import_module('clientes.migrations.0012_pagamento_asaas_payment_id_unico')
+        with connection.cursor() as cursor:
+            #desfeito no rollback do teste
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute('ALTER TABLE clientes_pagamentoconsultas DROP CONSTRAINT pagamento_asaas_payment_id_unico')
+        PagamentoConsultas.objects.create(
+            consulta_id=self.consulta.id, preco_consulta=100.00, cliente_id=self.cliente.id,
+            metodo_de_pagamento='pix', status_pagamento='pendente', asaas_payment_id='pay_1234567890',
+        )
+
+        with self.assertRaisesMessage(IntegrityError, 'pay_1234567890: pagamentos'):
+            migracao.criar_indice_unico(None, connection.schema_editor())
+
+
+class OutboxAsaasMixin:
+    def criar_pagamento(self, n=1):
+        cliente = CadastroClientes.objects.create(
+            nome_social = f'cliente outbox {n}',
+            cpf = f'1234567890{n}',
+            email = f'outbox{n}@cliente.com',
+            contato = '11222223333',
+            logradouro = 'alameda dos clientes',
+            numero = '11',
+            complemento = 'apartamento 02',
+            bairro = 'saude',
+            cep = '11222333',
+            asaas_customer_id = f'cus_00000{n}',
+        )
+        profissional = Profissionais.objects.create(
+            nome_social=f"Dr. Outbox {n}",
+            profissao="Médico",
+            endereco="alameda dos testes",
+            contato="99888887777",
+        )
+        consulta = AgendamentosConsultas.objects.create(
+            profissional=profissional,
+            data_consulta=timezone.now() + timedelta(days=1),
+            cliente=cliente,
+            status_consulta='agendada',
+        )
+        return PagamentoConsultas.objects.create(
+            cliente=cliente,
+            consulta=consulta,
+            metodo_de_pagamento='pix',
+            preco_consulta=80,
+            data_vencimento=timezone.localdate(),
+            status_pagamento='pendente',
+        )
+
+    def resposta_asaas(self, status_code=200, corpo=None):
+        resposta = MagicMock()
+        resposta.status_code = status_code
+        resposta.json.return_value = corpo or {}
+        resposta.text = json.dumps(corpo or {})
+        return resposta
+
+
+@override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')
+class OutboxAsaasTests(OutboxAsaasMixin, TestCase):
+    def setUp(self):
+        self.pagamento = self.criar_pagamento()
+        self.evento = enfileirar_cobranca(self.pagamento)
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_evento_processado_preenche_asaas_payment_id(self, mock_post):
+        mock_post.return_value = self.resposta_asaas(corpo={'id': 'pay_outbox_1'})
+
+        eventos = reservar_eventos(10)
+        self.assertEqual(len(eventos), 1)
+        self.assertTrue(processar_evento(eventos[0]))
+
+        self.pagamento.refresh_from_db()
+        self.evento.refresh_from_db()
+        self.assertEqual(self.pagamento.asaas_payment_id, 'pay_outbox_1')
+        self.assertEqual(self.evento.status, 'concluido')
+        self.assertEqual(mock_post.call_args.kwargs['json']['customer'], 'cus_000001')
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_falha_reagenda_com_backoff(self, mock_post):
+        mock_post.return_value = self.resposta_asaas(status_code=503)
+
+        evento = reservar_eventos(10)[0]
+        self.assertFalse(processar_evento(evento))
+
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.status, 'pendente')
+        self.assertEqual(self.evento.tentativas, 1)
+        self.assertGreater(self.evento.proxima_tentativa, timezone.now())
+        self.assertIn('503', self.evento.ultimo_erro)
+        # ainda não está pronto para uma nova tentativa
+        self.assertEqual(reservar_eventos(10), [])
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_evento_desiste_apos_max_tentativas(self, mock_post):
+        mock_post.side_effect = requests.exceptions.ConnectionError('sem conexão')
+        EventoOutboxAsaas.objects.filter(id=self.evento.id).update(tentativas=MAX_TENTATIVAS - 1)
+
+        evento = reservar_eventos(10)[0]
+        self.assertFalse(processar_evento(evento))
+
+        self.evento.refresh_from_db()
+        self.assertEqual(self.evento.status, 'falhou')
+
+    def test_evento_reservado_nao_e_entregue_a_outro_worker(self):
+        self.assertEqual(len(reservar_eventos(10)), 1)
+        self.assertEqual(reservar_eventos(10), [])
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_evento_de_cliente_preenche_asaas_customer_id(self, mock_post):
+        cliente = self.pagamento.cliente
+        CadastroClientes.objects.filter(id=cliente.id).update(asaas_customer_id=None)
+        EventoOutboxAsaas.objects.all().delete()
+        enfileirar_clientes([cliente])
+        mock_post.return_value = self.resposta_asaas(corpo={'id': 'cus_importado'})
+
+        self.assertTrue(processar_evento(reservar_eventos(10)[0]))
+
+        cliente.refresh_from_db()
+        self.assertEqual(cliente.asaas_customer_id, 'cus_importado')
+        self.assertEqual(mock_post.call_args.args[1].rsplit('/', 1)[1], 'customers')
+        self.assertEqual(mock_post.call_args.kwargs['json']['externalReference'], f'CLIENTE_{cliente.id}')
+
+
+@override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')
+class ProcessarOutboxAsaasCommandTests(OutboxAsaasMixin, TransactionTestCase):
+    @patch('clientes.asaas.requests.Session.request')
+    def test_comando_envia_eventos_pendentes(self, mock_post):
+        for n in range(5):
+            enfileirar_cobranca(self.criar_pagamento(n))
+        mock_post.side_effect = lambda metodo, url, **kwargs: self.resposta_asaas(
+            corpo={'id': f"pay_{kwargs['json']['externalReference']}"}
+        )
+
+        call_command('processar_outbox_asaas', concorrencia=3, stdout=StringIO())
+
+        self.assertEqual(EventoOutboxAsaas.objects.filter(status='concluido').count(), 5)
+        self.assertEqual(PagamentoConsultas.objects.filter(asaas_payment_id__isnull=True).count(), 0)
+
+
+class ProcessarEmParaleloTests(SimpleTestCase):
+    @patch('clientes.outbox.connection')
+    def test_resultados_na_ordem_e_uma_conexao_por_thread(self, mock_connection):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            resultados = processar_em_paralelo(executor, 3, lambda n: n * 2, list(range(40)))
+        self.assertEqual(resultados, [n * 2 for n in range(40)])
+        # fechada uma vez por thread, e não a cada item
+        self.assertEqual(mock_connection.close.call_count, 3)
+
+
+@override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')
+class SincronizarClientesAsaasCommandTests(TransactionTestCase):
+    def criar_cliente(self, n, asaas_customer_id=None):
+        return CadastroClientes.objects.create(
+            nome_social=f'cliente backfill {n}', cpf=f'5550000000{n}', email=f'backfill{n}@cliente.com',
+            contato='11222223333', logradouro='rua', numero='1', complemento='-', bairro='centro', cep='01000000',
+            asaas_customer_id=asaas_customer_id,
+        )
+
+    def responder(self, metodo, url, **kwargs):
+        referencia = kwargs['json']['externalReference']
+        resposta = MagicMock(status_code=500 if referencia in self.falham else 200)
+        resposta.json.return_value = {'id': f'cus_{referencia}'}
+        return resposta
+
+    def setUp(self):
+        self.falham = set()
+        self.sem_id = [self.criar_cliente(n) for n in range(6)]
+        self.com_id = self.criar_cliente(7, asaas_customer_id='cus_antigo')
+        self.na_fila = self.criar_cliente(8)
+        enfileirar_clientes([self.na_fila])
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_cria_os_clientes_sem_id_em_lotes(self, mock_request):
+        self.falham = {f'CLIENTE_{self.sem_id[2].id}'}
+        mock_request.side_effect = self.responder
+
+        saida = StringIO()
+        call_command('sincronizar_clientes_asaas', concorrencia=3, taxa=0, lote=4, stdout=saida)
+
+        self.assertIn('5 cliente(s) criados no Asaas, 1 com falha.', saida.getvalue())
+        self.assertEqual(mock_request.call_count, 6)
+        ids = dict(CadastroClientes.objects.values_list('id', 'asaas_customer_id'))
+        for cliente in self.sem_id:
+            esperado = None if cliente == self.sem_id[2] else f'cus_CLIENTE_{cliente.id}'
+            self.assertEqual(ids[cliente.id], esperado)
+        self.assertEqual(ids[self.com_id.id], 'cus_antigo')
+        self.assertIsNone(ids[self.na_fila.id])
+
+        #rodar de novo só tenta quem continua sem o id
+        self.falham = set()
+        call_command('sincronizar_clientes_asaas', taxa=0, stdout=StringIO())
+        self.assertEqual(mock_request.call_count, 7)
+        self.assertEqual(CadastroClientes.objects.filter(asaas_customer_id__isnull=True).count(), 1)
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_circuito_aberto_grava_o_que_foi_criado_e_para(self, mock_request):
+        def responder(metodo, url, **kwargs):
+            if kwargs['json']['externalReference'] == f'CLIENTE_{self.sem_id[3].id}':
+                raise AsaasIndisponivel('circuito aberto')
+            return self.responder(metodo, url, **kwargs)
+        mock_request.side_effect = responder
+
+        with self.assertRaises(CommandError):
+            call_command('sincronizar_clientes_asaas', concorrencia=1, taxa=0, lote=10, stdout=StringIO())
+
+        self.assertEqual(mock_request.call_count, 4)
+        self.assertEqual(
+            set(CadastroClientes.objects.filter(asaas_customer_id__startswith='cus_CLIENTE').values_list('id', flat=True)),
+            {cliente.id for cliente in self.sem_id[:3]},
+        )
+
+    def test_limite_de_taxa_espaca_as_chamadas(self):
+        limite = LimiteDeTaxa(50)
+        inicio = time.monotonic()
+        for _ in range(5):
+            limite.aguardar()
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.079)
+
+class ClienteAsaasTests(TestCase):
+    def setUp(self):
+        self.cliente = ClienteAsaas('https://asaas.test/v3', tamanho_pool=5, tentativas=3,
+                                    timeout_conexao=1, timeout_leitura=7)
+
+    def test_sessao_usa_pool_e_timeouts_configurados(self):
+        adaptador = self.cliente.sessao.get_adapter('https://asaas.test/v3/payments')
+        self.assertEqual(adaptador._pool_maxsize, 5)
+        self.assertEqual(self.cliente.timeout, (1, 7))
+
+    def test_post_nao_e_repetido_automaticamente(self):
+        retry = self.cliente.sessao.get_adapter('https://asaas.test/').max_retries
+        self.assertTrue(retry.is_retry('GET', 503))
+        self.assertFalse(retry.is_retry('POST', 503))
+
+    @override_settings(ASAAS_ACCESS_TOKEN=None)
+    def test_falha_sem_token_configurado(self):
+        with self.assertRaises(ErroAsaas):
+            self.cliente.post('payments', json={})
+
+    @override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')
+    @patch('clientes.asaas.requests.Session.request')
+    def test_requisicao_envia_token_e_timeout(self, mock_request):
+        mock_request.return_value = MagicMock(status_code=200)
+        self.cliente.get('customers')
+
+        metodo, url = mock_request.call_args.args
+        self.assertEqual((metodo, url), ('GET', 'https://asaas.test/v3/customers'))
+        self.assertEqual(mock_request.call_args.kwargs['headers']['access_token'], 'mock_token_de_teste')
+        self.assertEqual(mock_request.call_args.kwargs['timeout'], (1, 7))
+
+
+@override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')
+class CircuitoAsaasTests(OutboxAsaasMixin, TestCase):
+    def setUp(self):
+        self.circuito = Circuito('asaas_teste', limite_falhas=3, tempo_aberto=30)
+        self.cliente = ClienteAsaas('https://asaas.test/v3', tentativas=0, circuito=self.circuito)
+
+    def abrir_circuito(self, mock_request):
+        mock_request.side_effect = requests.exceptions.ConnectTimeout('timeout')
+        for _ in range(3):
+            with self.assertRaises(requests.exceptions.ConnectTimeout):
+                self.cliente.post('payments', json={})
+
+    def vencer_prazo(self):
+        CircuitoAsaas.objects.filter(nome='asaas_teste').update(aberto_ate=timezone.now() - timedelta(seconds=1))
+        self.circuito._aberto_ate = None
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_abre_apos_falhas_seguidas_e_recusa_sem_chamar_a_api(self, mock_request):
+        self.abrir_circuito(mock_request)
+        self.assertEqual(CircuitoAsaas.objects.get(nome='asaas_teste').estado, 'aberto')
+
+        # enquanto aberto, falha sem rede e sem consultar o banco
+        with self.assertNumQueries(0), self.assertRaises(AsaasIndisponivel):
+            self.cliente.post('payments', json={})
+        self.assertEqual(mock_request.call_count, 3)
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_outro_processo_ve_o_circuito_aberto(self, mock_request):
+        self.abrir_circuito(mock_request)
+        outro_processo = ClienteAsaas('https://asaas.test/v3', circuito=Circuito('asaas_teste'))
+
+        with self.assertRaises(AsaasIndisponivel):
+            outro_processo.get('customers')
+        self.assertEqual(mock_request.call_count, 3)
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_chamada_de_teste_com_sucesso_fecha_o_circuito(self, mock_request):
+        self.abrir_circuito(mock_request)
+        self.vencer_prazo()
+        mock_request.side_effect = None
+        mock_request.return_value = self.resposta_asaas()
+
+        self.cliente.get('customers')
+
+        circuito = CircuitoAsaas.objects.get(nome='asaas_teste')
+        self.assertEqual((circuito.estado, circuito.falhas_consecutivas), ('fechado', 0))
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_so_uma_chamada_de_teste_por_vez(self, mock_request):
+        self.abrir_circuito(mock_request)
+        self.vencer_prazo()
+
+        self.assertTrue(self.circuito.permitir())
+        self.assertFalse(Circuito('asaas_teste').permitir())
+        self.assertEqual(CircuitoAsaas.objects.get(nome='asaas_teste').estado, 'meio_aberto')
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_falha_na_chamada_de_teste_reabre(self, mock_request):
+        self.abrir_circuito(mock_request)
+        self.vencer_prazo()
+        mock_request.side_effect = None
+        mock_request.return_value = self.resposta_asaas(status_code=503)
+
+        self.cliente.get('customers')
+
+        self.assertEqual(CircuitoAsaas.objects.get(nome='asaas_teste').estado, 'aberto')
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_erro_do_cliente_nao_conta_como_falha(self, mock_request):
+        mock_request.return_value = self.resposta_asaas(status_code=400)
+        for _ in range(5):
+            self.cliente.post('payments', json={})
+        self.assertEqual(CircuitoAsaas.objects.get(nome='asaas_teste').estado, 'fechado')
+
+    def test_evento_recusado_pelo_circuito_nao_gasta_tentativa(self):
+        evento = enfileirar_cobranca(self.criar_pagamento())
+        evento = reservar_eventos(10)[0]
+        with patch('clientes.outbox.registrar_cobranca_no_asaas', side_effect=AsaasIndisponivel('aberto')):
+            self.assertFalse(processar_evento(evento))
+
+        evento.refresh_from_db()
+        self.assertEqual((evento.status, evento.tentativas), ('pendente', 0))
+
+    def test_estado_exportado_no_metrics(self):
+        self.circuito.registrar_falha()
+        response = self.client.get('/metrics')
+        self.assertContains(response, 'asaas_circuito_estado{circuito="asaas_teste"} 0.0')
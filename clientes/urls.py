@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import CadastroClientesCreate, GerenciarPagamento
+from .views import BuscaClientes, CadastroClientesCreate, GerenciarPagamento, ImportarClientes
 
 
 urlpatterns = [
     path('cadastro/', CadastroClientesCreate.as_view(), name='clientes-list-create'),
+    path('busca/', BuscaClientes.as_view(), name='clientes-busca'),
+    path('importar/', ImportarClientes.as_view(), name='clientes-importar'),
     path('consultas/gerenciarpagamento/', GerenciarPagamento.as_view(), name='gerenciar-pagamento-detail'),
 ]
\ No newline at end of file
@@ -1,10 +1,13 @@
 from django.core.exceptions import ValidationError
 import re
 
+def normalizar_cpf(value):
+    # Remove caracteres não numéricos
+    return ''.join(re.findall(r'\d', str(value)))
+
 def validar_cpf(value):
 
-    # Remove caracteres não numéricos
-    cpf = ''.join(re.findall(r'\d', str(value)))
+    cpf = normalizar_cpf(value)
 
     if len(cpf) != 11:
         raise ValidationError('O CPF deve ter 11 dígitos.', code='invalid_length')
@@ -1,16 +1,21 @@
 from django.shortcuts import render
 from django.conf import settings
+from django.db.models import F
 from .models import CadastroClientes, PagamentoConsultas
 from .serializers import SerializerCadastroClientes
-from consultas.views import check_login
+from .paginacao import ClientesCursorPagination
+from .busca import CAMPOS, TAMANHO_MINIMO, buscar_clientes
+from .importacao import ArquivoInvalido, importar_clientes
 from rest_framework import generics, status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .validador_cpf import validar_cpf
-import requests, json, os, logging, sys
+from .asaas import ErroAsaas, obter_cliente_asaas
+from users.idempotencia import IdempotenciaMixin
+import requests, json, os, logging, sys, csv, io
 
-asaas_token = settings.ASAAS_ACCESS_TOKEN
-url_asaas = "https://api-sandbox.asaas.com/v3/customers"
 webhook_token = settings.TOKEN_ASAAS_ACESSO_API
 
 logging.basicConfig(
@@ -19,23 +24,40 @@ logging.basicConfig(
     stream=sys.stdout  # Direciona a saída para stdout
 )
 
-class CadastroClientesCreate(generics.ListCreateAPIView):
+class CadastroClientesCreate(IdempotenciaMixin, generics.ListCreateAPIView):
     queryset = CadastroClientes.objects.all()
     serializer_class = SerializerCadastroClientes
-    
+    permission_classes = [IsAuthenticated] #só lista e cria clientes se o usuário estiver logado.
+    pagination_class = ClientesCursorPagination
+    campos = None  # ?fields= da listagem, None para todos
+
     def list(self, request, *args, **kwargs):
-        #verifica se o usuario está autenticado para exibir os profissionais.
-        
-        payload, error = check_login(request)
-        if error:
-            return error
+        fields = request.query_params.get('fields')
+        if fields:
+            campos = [campo.strip() for campo in fields.split(',') if campo.strip()]
+            invalidos = set(campos) - set(self.get_serializer().fields)
+            if invalidos:
+                logging.debug(f'campos inválidos na listagem de clientes: {invalidos}')
+                return Response(
+                    {"erro": f"Campo(s) inválido(s) em 'fields': {', '.join(sorted(invalidos))}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            self.campos = campos
         return super().list(request, *args, **kwargs)
-    
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.campos:
+            #as colunas que não foram pedidas (endereço...) nem saem do banco. o id é o cursor da paginação
+            queryset = queryset.only('id', *self.campos)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.campos:
+            kwargs['campos'] = self.campos
+        return super().get_serializer(*args, **kwargs)
+
     def create(self, request, *args, **kwargs):
-        #só criar o novo cliente se o usuário estiver logado.
-        payload, error = check_login(request)
-        if error:
-            return error        
         response = super().create(request, *args, **kwargs)
         if response.status_code == status.HTTP_201_CREATED:
            novo_cliente_data = response.data
@@ -44,11 +66,6 @@ class CadastroClientesCreate(generics.ListCreateAPIView):
 
         return response
     def registrar_cliente_no_asaas(self, cliente_data):
-    
-        if not asaas_token:
-            logging.debug("ERRO: A variável de ambiente ASAAS_ACCESS_TOKEN não está configurada.")
-            return
-
         # 5. Mapeia os campos do seu modelo para os campos esperados pela API do Asaas
         asaas_payload = {
             "name": cliente_data.get("nome_social"),
@@ -62,15 +79,9 @@ class CadastroClientesCreate(generics.ListCreateAPIView):
             "postalCode": cliente_data.get("cep"),
             "notificationDisabled": True,
         }
-        
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "access_token": asaas_token
-        }
 
         try:
-            asaas_response = requests.post(url_asaas, json=asaas_payload, headers=headers, timeout=15)
+            asaas_response = obter_cliente_asaas().post('customers', json=asaas_payload)
             
             #Verifica se o cliente foi criado com sucesso no Asaas
             if asaas_response.status_code == 200:
@@ -91,10 +102,65 @@ class CadastroClientesCreate(generics.ListCreateAPIView):
                 logging.debug(f"ERRO ao registrar cliente no Asaas. Status: {asaas_response.status_code}")
                 logging.debug(f"Resposta do Asaas: {asaas_response.text}")
 
+        except ErroAsaas as e:
+            logging.debug(f"ERRO: {e}")
+
         except requests.exceptions.RequestException as e:
             # Erro de conexão com a API do Asaas
             logging.debug(f"ERRO de conexão com a API do Asaas: {e}")
 
+class BuscaClientes(APIView):
+    #busca da recepção por CPF (com ou sem pontuação), nome ou email: ?q=
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        termo = request.query_params.get('q', '').strip()
+        if len(termo) < TAMANHO_MINIMO:
+            return Response(
+                {"erro": f"Informe 'q' com pelo menos {TAMANHO_MINIMO} caracteres."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = SerializerCadastroClientes(buscar_clientes(termo), many=True, campos=CAMPOS)
+        return Response({'results': serializer.data})
+
+
+class ImportarClientes(APIView):
+    #onboarding das clínicas parceiras: CSV com milhares de clientes no campo 'arquivo' (clientes/importacao.py)
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        arquivo = request.FILES.get('arquivo')
+        if arquivo is None:
+            return Response(
+                {"erro": "Envie o CSV dos clientes no campo 'arquivo'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resumo = {situacao: 0 for situacao in ('criado', 'duplicado', 'invalido')}
+        erros = []
+        try:
+            #uploads grandes ficam em arquivo temporário; o CSV é lido e gravado em lotes
+            texto = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', newline='')
+            for criados, erros_do_lote in importar_clientes(texto):
+                resumo['criado'] += criados
+                for erro in erros_do_lote:
+                    resumo[erro['status']] += 1
+                erros.extend(erros_do_lote)
+        except (ArquivoInvalido, UnicodeDecodeError, csv.Error) as e:
+            logging.debug(f'importação de clientes interrompida: {e}')
+            return Response(
+                {"erro": f"Arquivo inválido: {e}", 'resumo': resumo},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        logging.debug(f'importação de clientes processada: {resumo}')
+        return Response(
+            {'resumo': resumo, 'erros': erros},
+            status=status.HTTP_201_CREATED if not erros else status.HTTP_207_MULTI_STATUS
+        )
+
+
 class GerenciarPagamento(APIView):
     authentication_classes = []
     permission_classes = []
@@ -124,7 +190,10 @@ class GerenciarPagamento(APIView):
 
             #ENCONTRAR NOSSO PAGAMENTO LOCAL USANDO O ID DO ASAAS
             try:
-                pagamento_consulta = PagamentoConsultas.objects.get(asaas_payment_id=asaas_payment_id)
+                # busca pelo índice único de asaas_payment_id, já trazendo a consulta no mesmo select
+                pagamento_consulta = PagamentoConsultas.objects.select_related('consulta').get(
+                    asaas_payment_id=asaas_payment_id
+                )
             except PagamentoConsultas.DoesNotExist:
                 logging.debug(f"ERRO: Pagamento com ID Asaas {asaas_payment_id} não encontrado no nosso sistema.")
                 # Retornamos 200 OK mesmo assim para que o Asaas não tente reenviar o webhook
@@ -133,7 +202,7 @@ class GerenciarPagamento(APIView):
             #ATUALIZAR OS STATUS
             # Atualiza o status do pagamento para 'pago'
             pagamento_consulta.status_pagamento = 'pago'
-            pagamento_consulta.save()
+            pagamento_consulta.save(update_fields=['status_pagamento'])
             logging.debug(f"Pagamento {pagamento_consulta.id} atualizado para PAGO.")
 
             #Atualiza o status da consulta para 'confirmada'
@@ -141,7 +210,8 @@ class GerenciarPagamento(APIView):
                 agendamento = pagamento_consulta.consulta
                 if agendamento:
                     agendamento.status_consulta = 'confirmada'
-                    agendamento.save()
+                    agendamento.versao = F('versao') + 1
+                    agendamento.save(update_fields=['status_consulta', 'versao'])
                     logging.debug(f"Agendamento {agendamento.id} atualizado para CONFIRMADA.")
             except Exception as e:
                 logging.debug(f"Erro ao tentar atualizar o agendamento relacionado: {e}")
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ConsultasConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "consultas"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from lacreisaude.invalidacao import assinar
+        from .cache_agenda import limpar_agendas, trocar_versao
+        assinar('consultas.agenda', trocar_versao, limpar_agendas)
@@ -0,0 +1,83 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from prometheus_client import Counter
+from lacreisaude.invalidacao import publicar
+
+# taxa de acerto: rate(agenda_cache_consultas_total{resultado="hit"}[5m]) / rate(agenda_cache_consultas_total[5m])
+CONSULTAS_CACHE_AGENDA = Counter(
+    'agenda_cache_consultas',
+    'Leituras do cache de páginas da agenda por profissional',
+    ['resultado'],
+)
+
+
+# parte da chave de todas as páginas, de todos os profissionais: trocada para descartar tudo de uma vez
+CHAVE_GERACAO = 'agenda:geracao'
+
+
+def chave_versao(profissional_id):
+    return f'agenda:{profissional_id}:versao'
+
+
+def versao_da_agenda(profissional_id):
+    """
+    Versão atual da agenda do profissional (com a geração), parte da chave de todas as páginas dela.
+    Começa (ou recomeça, se o cache descartar a chave) em um valor que nunca foi usado,
+    para uma página antiga não voltar a valer.
+    """
+    chaves = [CHAVE_GERACAO, chave_versao(profissional_id)]
+    valores = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in valores:
+            cache.add(chave, time.time_ns(), timeout=None)
+            valores[chave] = cache.get(chave)
+    return f'{valores[CHAVE_GERACAO]}.{valores[chaves[1]]}'
+
+
+def chave_da_pagina(profissional_id, request):
+    #host, cursor, tamanho da página e filtros mudam a resposta (os links next/previous são absolutos)
+    parametros = sorted(request.query_params.lists())
+    resumo = hashlib.sha1(f'{request.get_host()}?{parametros}'.encode()).hexdigest()
+    return f'agenda:{profissional_id}:{versao_da_agenda(profissional_id)}:{resumo}'
+
+
+def ler_pagina(chave):
+    dados = cache.get(chave)
+    CONSULTAS_CACHE_AGENDA.labels(resultado='miss' if dados is None else 'hit').inc()
+    return dados
+
+
+def gravar_pagina(chave, dados):
+    cache.set(chave, dados, timeout=settings.AGENDA_CACHE_TIMEOUT)
+
+
+def trocar_versao(profissional_id):
+    try:
+        cache.incr(chave_versao(profissional_id))
+    except ValueError:
+        cache.set(chave_versao(profissional_id), time.time_ns(), timeout=None)
+
+
+def limpar_agendas():
+    #o ouvinte de invalidação reconectou e pode ter perdido trocas de versão: nenhuma página vale mais
+    cache.set(CHAVE_GERACAO, time.time_ns(), timeout=None)
+
+
+def invalidar_agendas(*profissionais_ids):
+    """
+    Troca a versão da agenda dos profissionais depois do commit: as páginas antigas deixam de
+    ser lidas e expiram sozinhas. Antes do commit, uma leitura concorrente ainda veria a agenda
+    antiga e a gravaria com a versão nova. Os outros nós trocam a versão pelo barramento de
+    invalidação (caches locais, como o LocMemCache).
+    """
+    profissionais_ids = set(profissionais_ids) - {None}
+    publicar('consultas.agenda', profissionais_ids)
+
+    def trocar_versoes():
+        for profissional_id in profissionais_ids:
+            trocar_versao(profissional_id)
+
+    transaction.on_commit(trocar_versoes)
@@ -0,0 +1,198 @@
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from profissionais.models import Profissionais
+from .models import AgendamentosConsultas, OcupacaoAgenda
+
+# agenda em grade de 15 minutos: um dia cabe em um inteiro de 96 bits (12 bytes no banco)
+MINUTOS_POR_CELULA = 15
+CELULAS_POR_DIA = 24 * 60 // MINUTOS_POR_CELULA
+BYTES_POR_DIA = CELULAS_POR_DIA // 8
+
+
+def minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def faixa(inicio, quantidade):
+    #bits [inicio, inicio + quantidade)
+    return ((1 << max(quantidade, 0)) - 1) << inicio
+
+
+def para_bytes(mascara):
+    return mascara.to_bytes(BYTES_POR_DIA, 'little')
+
+
+def de_bytes(dados):
+    return int.from_bytes(dados, 'little') if dados else 0
+
+
+def inicio_do_dia(dia, tz):
+    return timezone.make_aware(datetime.combine(dia, time.min), tz)
+
+
+def dias_da_consulta(inicio, fim, tz=None):
+    #dias locais que a consulta [inicio, fim) toca: o que passa da meia-noite ocupa o dia seguinte
+    tz = tz or timezone.get_current_timezone()
+    dia = timezone.localtime(inicio, tz).date()
+    ultimo = timezone.localtime(max(fim, inicio + timedelta(microseconds=1)) - timedelta(microseconds=1), tz).date()
+    dias = []
+    while dia <= ultimo:
+        dias.append(dia)
+        dia += timedelta(days=1)
+    return dias
+
+
+def dias_ocupados(profissional_id, inicio, fim):
+    return {(profissional_id, dia) for dia in dias_da_consulta(inicio, fim)}
+
+
+def mascara_ocupacao(horarios, duracao_minutos, dia, tz):
+    duracao = timedelta(minutes=duracao_minutos)
+    return mascara_das_consultas([(horario, horario + duracao) for horario in horarios], dia, tz)
+
+
+def mascara_das_consultas(consultas, dia, tz):
+    #cada consulta (inicio, fim) ocupa as células que toca, só a parte dentro de 'dia'
+    comeco_do_dia = inicio_do_dia(dia, tz)
+    fim_do_dia = inicio_do_dia(dia + timedelta(days=1), tz)
+    mascara = 0
+    for inicio, fim in consultas:
+        inicio, fim = max(inicio, comeco_do_dia), min(fim, fim_do_dia)
+        if fim <= inicio:
+            continue
+        inicio = timezone.localtime(inicio, tz)
+        primeira = minutos(inicio) // MINUTOS_POR_CELULA
+        fim_em_minutos = minutos(inicio) + (fim - inicio) // timedelta(minutes=1)
+        ultima = min(-(-fim_em_minutos // MINUTOS_POR_CELULA), CELULAS_POR_DIA)
+        mascara |= faixa(primeira, ultima - primeira)
+    return mascara
+
+
+def celulas_do_expediente(profissional):
+    #só as células inteiras dentro do expediente
+    primeira = -(-minutos(profissional.inicio_expediente) // MINUTOS_POR_CELULA)
+    ultima = minutos(profissional.fim_expediente) // MINUTOS_POR_CELULA
+    return primeira, ultima
+
+
+def atende_no_dia(profissional, dia):
+    return bool(profissional.dias_atendimento >> dia.weekday() & 1)
+
+
+def reconstruir_ocupacao(profissional_id, dia):
+    return reconstruir_ocupacoes([(profissional_id, dia)])
+
+
+def reconstruir_ocupacoes(dias):
+    """
+    Recalcula a ocupação dos pares (profissional_id, dia) a partir das consultas ativas,
+    com um número fixo de queries para qualquer quantidade de dias.
+
+    O upsert trava as linhas de OcupacaoAgenda (sempre na mesma ordem) antes de ler as
+    consultas: duas transações agendando no mesmo dia esperam uma pela outra, e a segunda
+    já enxerga a consulta da primeira (READ COMMITTED), então nenhuma sobrescreve a outra.
+    """
+    dias = sorted(set(dias))
+    if not dias:
+        return []
+    profissionais_ids = {profissional_id for profissional_id, _ in dias}
+
+    tz = timezone.get_current_timezone()
+    primeiro_dia = min(dia for _, dia in dias)
+    ultimo_dia = max(dia for _, dia in dias)
+    with transaction.atomic():
+        # ON CONFLICT DO UPDATE: cria as linhas que faltam e trava todas, devolvendo os ids
+        ocupacoes = OcupacaoAgenda.objects.bulk_create(
+            [OcupacaoAgenda(profissional_id=profissional_id, dia=dia, ocupacao=para_bytes(0))
+             for profissional_id, dia in dias],
+            update_conflicts=True,
+            unique_fields=['profissional', 'dia'],
+            update_fields=['dia'],
+        )
+        consultas = AgendamentosConsultas.objects.ativas().filter(
+            profissional_id__in=profissionais_ids,
+            data_consulta__lt=inicio_do_dia(ultimo_dia + timedelta(days=1), tz),
+            fim_consulta__gt=inicio_do_dia(primeiro_dia, tz),
+        ).values_list('profissional_id', 'data_consulta', 'fim_consulta')
+        horarios = {chave: [] for chave in dias}
+        for profissional_id, data_consulta, fim_consulta in consultas:
+            for dia in dias_da_consulta(data_consulta, fim_consulta, tz):
+                if (profissional_id, dia) in horarios:
+                    horarios[(profissional_id, dia)].append((data_consulta, fim_consulta))
+
+        for ocupacao in ocupacoes:
+            ocupacao.ocupacao = para_bytes(
+                mascara_das_consultas(horarios[(ocupacao.profissional_id, ocupacao.dia)], ocupacao.dia, tz)
+            )
+        OcupacaoAgenda.objects.bulk_update(ocupacoes, ['ocupacao'])
+    return ocupacoes
+
+
+def horarios_livres_no_dia(profissional, dia, ocupacao, agora, inicio_dia, janela=None):
+    """
+    Horários livres de um dia: expediente menos as células ocupadas, em passos
+    da duração da consulta. 'janela' (primeira, ultima célula) restringe o resultado.
+    """
+    if not atende_no_dia(profissional, dia):
+        return []
+    primeira, ultima = celulas_do_expediente(profissional)
+    celulas_consulta = profissional.duracao_consulta // MINUTOS_POR_CELULA
+    bloco = faixa(0, celulas_consulta)
+    livres = faixa(primeira, ultima - primeira) & ~de_bytes(ocupacao)
+    if janela:
+        livres &= faixa(janela[0], janela[1] - janela[0])
+
+    horarios = []
+    for celula in range(primeira, ultima - celulas_consulta + 1, celulas_consulta):
+        if livres >> celula & bloco == bloco:
+            horario = inicio_dia + timedelta(minutes=celula * MINUTOS_POR_CELULA)
+            if horario > agora:
+                horarios.append(horario)
+    return horarios
+
+
+def horarios_livres(profissional, primeiro_dia, ultimo_dia):
+    #horários livres de 'profissional' entre dois dias (inclusive), em uma única query
+    tz = timezone.get_current_timezone()
+    agora = timezone.now()
+    ocupacoes = dict(
+        OcupacaoAgenda.objects.filter(
+            profissional=profissional, dia__range=(primeiro_dia, ultimo_dia),
+        ).values_list('dia', 'ocupacao')
+    )
+    dias = []
+    dia = primeiro_dia
+    while dia <= ultimo_dia:
+        horarios = horarios_livres_no_dia(profissional, dia, ocupacoes.get(dia), agora, inicio_do_dia(dia, tz))
+        dias.append({'dia': dia, 'horarios': horarios})
+        dia += timedelta(days=1)
+    return dias
+
+
+def profissionais_livres(profissao, inicio, fim):
+    """
+    Profissionais ativos de 'profissao' com algum horário livre entre 'inicio' e 'fim'
+    (mesmo dia). Uma única query: a ocupação do dia vem junto de cada profissional.
+    """
+    tz = timezone.get_current_timezone()
+    inicio, fim = timezone.localtime(inicio, tz), timezone.localtime(fim, tz)
+    dia = inicio.date()
+    janela = (-(-minutos(inicio) // MINUTOS_POR_CELULA), minutos(fim) // MINUTOS_POR_CELULA)
+    profissionais = Profissionais.objects.filter(
+        ativo=True, profissao__iexact=profissao,
+    ).annotate(
+        ocupacao_do_dia=Subquery(
+            OcupacaoAgenda.objects.filter(profissional=OuterRef('pk'), dia=dia).values('ocupacao')[:1]
+        ),
+    ).order_by('nome_social', 'id')
+
+    agora = timezone.now()
+    inicio_dia = inicio_do_dia(dia, tz)
+    livres = []
+    for profissional in profissionais:
+        horarios = horarios_livres_no_dia(profissional, dia, profissional.ocupacao_do_dia, agora, inicio_dia, janela)
+        if horarios:
+            livres.append((profissional, horarios))
+    return livres
@@ -0,0 +1,91 @@
+"""
+Exportação das consultas com os pagamentos para o fechamento do mês (CSV ou NDJSON).
+
+As linhas são lidas por um cursor do lado do servidor (iterator com chunk_size) e escritas em
+blocos, então a memória fica estável mesmo com milhões de consultas: nada do queryset inteiro
+é carregado de uma vez, nem instâncias dos models (values_list).
+"""
+import csv
+import io
+from datetime import date, datetime, time, timedelta
+import orjson
+from django.utils import timezone
+from .models import AgendamentosConsultas
+
+# coluna exportada -> campo (cliente e profissional no mesmo join; consultas sem pagamento saem com os campos vazios)
+COLUNAS = {
+    'consulta_id': 'id',
+    'data_consulta': 'data_consulta',
+    'fim_consulta': 'fim_consulta',
+    'status_consulta': 'status_consulta',
+    'consulta_ativa': 'consulta_ativa',
+    'profissional_id': 'profissional_id',
+    'profissional': 'profissional__nome_social',
+    'cliente_id': 'cliente_id',
+    'cliente': 'cliente__nome_social',
+    'cliente_cpf': 'cliente__cpf',
+    'pagamento_id': 'pagamentoconsultas__id',
+    'metodo_pagamento': 'pagamentoconsultas__metodo_de_pagamento',
+    'preco_consulta': 'pagamentoconsultas__preco_consulta',
+    'data_vencimento': 'pagamentoconsultas__data_vencimento',
+    'status_pagamento': 'pagamentoconsultas__status_pagamento',
+    'asaas_payment_id': 'pagamentoconsultas__asaas_payment_id',
+}
+FORMATOS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+TAMANHO_DO_LOTE = 2000
+# texto que começa com um destes vira fórmula quando o CSV é aberto numa planilha
+INICIO_DE_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def consultas_para_exportar(inicio=None, fim=None):
+    #pelo id, que segue o índice da chave primária e começa a devolver linhas na hora (sem ordenar tudo antes)
+    queryset = AgendamentosConsultas.objects.order_by('id', 'pagamentoconsultas__id')
+    fuso = timezone.get_current_timezone()
+    if inicio:
+        queryset = queryset.filter(data_consulta__gte=datetime.combine(inicio, time.min, fuso))
+    if fim:
+        queryset = queryset.filter(data_consulta__lt=datetime.combine(fim + timedelta(days=1), time.min, fuso))
+    return queryset.values_list(*COLUNAS.values())
+
+
+def exportar(queryset, formato, tamanho_do_lote=TAMANHO_DO_LOTE):
+    """Gera o arquivo em blocos de bytes, um por lote de linhas lidas do cursor."""
+    linhas = queryset.iterator(chunk_size=tamanho_do_lote)
+    if formato == 'csv':
+        return _csv(linhas, tamanho_do_lote)
+    return _ndjson(linhas, tamanho_do_lote)
+
+
+def celula(valor):
+    if isinstance(valor, date):
+        return valor.isoformat()
+    #nomes e demais textos digitados pelos usuários saem com ' na frente, sem virar fórmula
+    if isinstance(valor, str) and valor.startswith(INICIO_DE_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def _csv(linhas, tamanho_do_lote):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS)
+    for numero, linha in enumerate(linhas, 1):
+        escritor.writerow([celula(valor) for valor in linha])
+        if numero % tamanho_do_lote == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _ndjson(linhas, tamanho_do_lote):
+    nomes = tuple(COLUNAS)
+    bloco = []
+    for linha in linhas:
+        #Decimal como string, sem perder centavos
+        bloco.append(orjson.dumps(dict(zip(nomes, linha)), default=str))
+        if len(bloco) == tamanho_do_lote:
+            yield b'\n'.join(bloco) + b'\n'
+            bloco = []
+    if bloco:
+        yield b'\n'.join(bloco) + b'\n'
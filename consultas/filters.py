@@ -0,0 +1,23 @@
+import django_filters
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from .models import AgendamentosConsultas
+
+
+class AgendaFilter(django_filters.FilterSet):
+    # inicio/fim são datas AAAA-MM-DD no fuso local, 'fim' inclusivo (como na exportação e na disponibilidade).
+    # viram uma faixa em data_consulta, resolvida no índice (profissional_id, data_consulta)
+    inicio = django_filters.DateFilter(method='filtrar_inicio')
+    fim = django_filters.DateFilter(method='filtrar_fim')
+
+    class Meta:
+        model = AgendamentosConsultas
+        fields = ['inicio', 'fim', 'status_consulta']
+
+    def filtrar_inicio(self, queryset, name, value):
+        fuso = timezone.get_current_timezone()
+        return queryset.filter(data_consulta__gte=datetime.combine(value, time.min, fuso))
+
+    def filtrar_fim(self, queryset, name, value):
+        fuso = timezone.get_current_timezone()
+        return queryset.filter(data_consulta__lt=datetime.combine(value + timedelta(days=1), time.min, fuso))
@@ -0,0 +1,177 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from clientes.models import CadastroClientes, PagamentoConsultas
+from clientes.outbox import enfileirar_cobrancas
+from profissionais.models import Profissionais
+from .cache_agenda import invalidar_agendas
+from .disponibilidade import dias_ocupados, reconstruir_ocupacoes
+from .models import AgendamentosConsultas, conflito_de_horario
+import logging
+
+METODOS_PAGAMENTO = ('pix', 'boleto', 'credit_card')
+STATUS_INICIAIS = ('agendada', 'confirmada')
+MAXIMO_ITENS = 5000
+# um agendamento concorrente entre a checagem e o insert faz o lote inteiro ser refeito
+TENTATIVAS_INSERCAO = 3
+
+
+def agendar_em_lote(itens):
+    """
+    Agenda uma lista de consultas com um número fixo de queries:
+    valida tudo, detecta conflitos (com a agenda e dentro do próprio lote) em uma
+    query só e grava consultas, pagamentos e eventos do outbox com bulk_create.
+    Devolve um resultado por item, na ordem recebida.
+    """
+    resultados = [None] * len(itens)
+    pendentes = validar_itens(itens, resultados)
+    pendentes = verificar_cadastros(pendentes, resultados)
+
+    for tentativa in range(TENTATIVAS_INSERCAO):
+        livres = separar_conflitos(pendentes, resultados)
+        try:
+            with transaction.atomic():
+                gravar(livres, resultados)
+            break
+        except IntegrityError as erro:
+            if not conflito_de_horario(erro) or tentativa == TENTATIVAS_INSERCAO - 1:
+                raise
+            logging.debug('agendamento concorrente durante o lote, refazendo a checagem de conflitos.')
+            pendentes = livres
+    return resultados
+
+
+def erro(resultados, item, status, mensagem):
+    resultados[item['indice']] = {'indice': item['indice'], 'status': status, 'erro': mensagem}
+
+
+def validar_itens(itens, resultados):
+    agora = timezone.now()
+    validos = []
+    for indice, dados in enumerate(itens):
+        item = {'indice': indice}
+        if not isinstance(dados, dict):
+            erro(resultados, item, 'invalida', "Cada consulta deve ser um objeto.")
+            continue
+        try:
+            item['profissional_id'] = int(dados.get('profissional'))
+            item['cliente_id'] = int(dados.get('cliente'))
+        except (TypeError, ValueError):
+            erro(resultados, item, 'invalida', "Informe 'profissional' e 'cliente'.")
+            continue
+        try:
+            item['data_consulta'] = timezone.make_aware(
+                datetime.strptime(str(dados.get('data_consulta')), '%Y-%m-%d %H:%M')
+            )
+        except ValueError:
+            erro(resultados, item, 'invalida', "Formato de data inválido.")
+            continue
+        if item['data_consulta'] <= agora:
+            erro(resultados, item, 'invalida', "Não é possível agendar consultas em datas ou horários passados.")
+            continue
+        item['metodo_pagamento'] = dados.get('metodo_pagamento')
+        if item['metodo_pagamento'] not in METODOS_PAGAMENTO:
+            erro(resultados, item, 'invalida', f"Método de pagamento '{item['metodo_pagamento']}' é inválido.")
+            continue
+        item['status_consulta'] = dados.get('status_consulta', 'agendada')
+        if item['status_consulta'] not in STATUS_INICIAIS:
+            erro(resultados, item, 'invalida', "O status da consulta informado não existe.")
+            continue
+        validos.append(item)
+    return validos
+
+
+def verificar_cadastros(itens, resultados):
+    #uma query para os profissionais e outra para os clientes do lote inteiro
+    profissionais = {
+        profissional_id: (preco, duracao)
+        for profissional_id, preco, duracao in Profissionais.objects.filter(
+            id__in={item['profissional_id'] for item in itens}
+        ).values_list('id', 'preco_consulta', 'duracao_consulta')
+    }
+    clientes = set(
+        CadastroClientes.objects.filter(id__in={item['cliente_id'] for item in itens})
+        .values_list('id', flat=True)
+    )
+    validos = []
+    for item in itens:
+        if item['profissional_id'] not in profissionais:
+            erro(resultados, item, 'invalida', "O profissional não foi encontrado nos registros.")
+            continue
+        preco, duracao = profissionais[item['profissional_id']]
+        if item['cliente_id'] not in clientes:
+            erro(resultados, item, 'invalida', "O cliente associado não foi encontrado.")
+        elif preco is None or preco < 0:
+            erro(resultados, item, 'invalida', "O profissional não tem um preço de consulta válido configurado.")
+        else:
+            item['preco_consulta'] = preco
+            item['fim_consulta'] = item['data_consulta'] + timedelta(minutes=duracao)
+            validos.append(item)
+    return validos
+
+
+def separar_conflitos(itens, resultados):
+    """
+    Horários já ocupados na agenda em uma query; no próprio lote, o primeiro item leva o horário.
+    A agenda de cada profissional fica ordenada pelo início e sem sobreposições (a constraint
+    garante isso no banco), então cada item só precisa ser comparado com a consulta anterior a ele.
+    """
+    agendas = {}
+    if itens:
+        ocupados = AgendamentosConsultas.objects.ativas().filter(
+            profissional_id__in={item['profissional_id'] for item in itens},
+            data_consulta__lt=max(item['fim_consulta'] for item in itens),
+            fim_consulta__gt=min(item['data_consulta'] for item in itens),
+        ).order_by('data_consulta').values_list('profissional_id', 'data_consulta', 'fim_consulta')
+        for profissional_id, inicio, fim in ocupados:
+            agendas.setdefault(profissional_id, []).append((inicio, fim))
+
+    livres = []
+    for item in itens:
+        agenda = agendas.setdefault(item['profissional_id'], [])
+        anterior = bisect_left(agenda, item['fim_consulta'], key=lambda horario: horario[0]) - 1
+        if anterior >= 0 and agenda[anterior][1] > item['data_consulta']:
+            erro(resultados, item, 'conflito', "Este profissional já possui uma consulta agendada para este horário.")
+        else:
+            insort(agenda, (item['data_consulta'], item['fim_consulta']), key=lambda horario: horario[0])
+            livres.append(item)
+    return livres
+
+
+def gravar(itens, resultados):
+    consultas = AgendamentosConsultas.objects.bulk_create([
+        AgendamentosConsultas(
+            profissional_id=item['profissional_id'],
+            cliente_id=item['cliente_id'],
+            data_consulta=item['data_consulta'],
+            fim_consulta=item['fim_consulta'],
+            status_consulta=item['status_consulta'],
+        )
+        for item in itens
+    ])
+    pagamentos = PagamentoConsultas.objects.bulk_create([
+        PagamentoConsultas(
+            cliente_id=item['cliente_id'],
+            consulta=consulta,
+            metodo_de_pagamento=item['metodo_pagamento'],
+            preco_consulta=item['preco_consulta'],
+            data_vencimento=timezone.localdate(),
+            status_pagamento='pendente',
+        )
+        for item, consulta in zip(itens, consultas)
+    ])
+    enfileirar_cobrancas(pagamentos)
+    # bulk_create não dispara os signals da agenda
+    reconstruir_ocupacoes({
+        dia for consulta in consultas
+        for dia in dias_ocupados(consulta.profissional_id, consulta.data_consulta, consulta.fim_consulta)
+    })
+    invalidar_agendas(*{consulta.profissional_id for consulta in consultas})
+    for item, consulta, pagamento in zip(itens, consultas, pagamentos):
+        resultados[item['indice']] = {
+            'indice': item['indice'],
+            'status': 'criada',
+            'id': consulta.id,
+            'pagamento_id': pagamento.id,
+        }
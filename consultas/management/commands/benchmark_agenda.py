@@ -0,0 +1,119 @@
+import statistics, time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from clientes.models import CadastroClientes
+from consultas.cache_agenda import chave_versao
+from consultas.models import AgendamentosConsultas
+from consultas.views import ConsultasPorProfissional
+from profissionais.models import Profissionais
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara payload e latência da agenda de um profissional movimentado: a agenda inteira '
+        '(todas as páginas, filtrada no cliente) contra inicio/fim/status_consulta na API. '
+        'Tudo roda em uma transação que é desfeita no final, nada fica gravado no banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consultas', type=int, default=50_000, help='consultas do profissional')
+        parser.add_argument('--requisicoes', type=int, default=20)
+        parser.add_argument('--dias', type=int, default=7, help='tamanho da faixa filtrada')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.executar(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def executar(self, options):
+        total = options['consultas']
+        self.stdout.write(f'Populando {total} consultas...')
+        inicio = time.perf_counter()
+        profissional = self.popular(total)
+        self.stdout.write(f'Tabela populada em {time.perf_counter() - inicio:.1f}s')
+
+        self.factory = APIRequestFactory(HTTP_HOST='127.0.0.1')
+        self.view = ConsultasPorProfissional.as_view()
+        self.usuario = get_user_model().objects.create_user(
+            email='benchmark@agenda.test', password='benchmark', nome_social='benchmark',
+        )
+        self.profissional_id = profissional.id
+        url = f'/consultas/profissional/{profissional.id}/'
+        hoje = timezone.localdate()
+        filtros = {
+            'inicio': hoje.isoformat(),
+            'fim': (hoje + timedelta(days=options['dias'])).isoformat(),
+            'status_consulta': 'agendada',
+        }
+
+        self.medir('agenda inteira', url, {'page_size': 200}, 1)
+        self.medir(f"filtrada ({options['dias']} dias, agendada)", url, filtros, options['requisicoes'])
+        self.medir('filtrada, do cache', url, filtros, options['requisicoes'], com_cache=True)
+
+    def popular(self, total):
+        cliente = CadastroClientes.objects.create(
+            nome_social='cliente benchmark', cpf='00000000000', email='benchmark@agenda.test',
+            contato='11999999999', logradouro='rua', numero='1', complemento='-', bairro='-', cep='00000000',
+        )
+        profissional = Profissionais.objects.create(
+            nome_social='Dr. Agenda Cheia', profissao='Médico', endereco='rua', contato='11999999999',
+        )
+        tabela = AgendamentosConsultas._meta.db_table
+        with connection.cursor() as cursor:
+            # uma consulta a cada 30 minutos, metade no passado e metade no futuro
+            cursor.execute(
+                f"""
+                INSERT INTO {tabela} (profissional_id, cliente_id, data_consulta, fim_consulta,
+                                      status_consulta, consulta_ativa, versao)
+                SELECT %s, %s, inicio, inicio + interval '30 minutes',
+                       (ARRAY['agendada', 'confirmada', 'completa'])[n %% 3 + 1], true, 1
+                FROM generate_series(1, %s) AS n,
+                     LATERAL (SELECT now() - (%s / 2) * interval '30 minutes' + n * interval '30 minutes' AS inicio) AS h
+                """,
+                [profissional.id, cliente.id, total, total],
+            )
+            cursor.execute(f'ANALYZE {tabela}')
+        return profissional
+
+    def medir(self, nome, url, params, repeticoes, com_cache=False):
+        tempos, tamanho, paginas = [], 0, 0
+        if com_cache:
+            self.percorrer(url, params)  # a primeira passada grava as páginas
+        for _ in range(repeticoes):
+            if not com_cache:
+                #sem apagar o cache todo: uma versão nova da agenda descarta só as páginas dela
+                cache.delete(chave_versao(self.profissional_id))
+            inicio = time.perf_counter()
+            tamanho, paginas = self.percorrer(url, params)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{nome}: {paginas} página(s), {tamanho / 1024:.1f} KiB | "
+            f"média {statistics.mean(tempos):.2f}ms | máx {max(tempos):.2f}ms"
+        ))
+
+    def percorrer(self, url, params):
+        #segue o cursor até a última página, como o front faria para filtrar localmente
+        tamanho, paginas = 0, 0
+        request = self.factory.get(url, params)
+        while request is not None:
+            force_authenticate(request, user=self.usuario)
+            response = self.view(request, profissional_id=self.profissional_id)
+            response.render()
+            tamanho += len(response.content)
+            paginas += 1
+            proxima = response.data.get('next') if response.status_code == 200 else None
+            request = self.factory.get(proxima) if proxima else None
+        return tamanho, paginas
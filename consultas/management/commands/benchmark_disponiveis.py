@@ -0,0 +1,175 @@
+import random, statistics, time
+from datetime import datetime, timedelta
+from itertools import groupby
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from clientes.models import CadastroClientes
+from consultas.disponibilidade import mascara_ocupacao, para_bytes
+from consultas.models import AgendamentosConsultas, OcupacaoAgenda
+from consultas.views import ConsultasPorProfissional, ProfissionaisDisponiveis
+from profissionais.models import Profissionais
+
+PROFISSOES = [
+    'Médico', 'Psicólogo', 'Dentista', 'Nutricionista', 'Fisioterapeuta',
+    'Enfermeiro', 'Fonoaudiólogo', 'Terapeuta Ocupacional', 'Ginecologista', 'Endocrinologista',
+]
+CONSULTAS_POR_DIA = 10  # de 20 meias horas no expediente das 08:00 às 18:00
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a busca de profissionais livres por profissão (consultas/disponiveis/) contra a '
+        'alternativa de consultar a agenda de cada profissional. Tudo roda em uma transação '
+        'que é desfeita no final, nada fica gravado no banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profissionais', type=int, default=5_000)
+        parser.add_argument('--consultas', type=int, default=10_000_000)
+        parser.add_argument('--requisicoes', type=int, default=50)
+        parser.add_argument('--requisicoes-agenda', type=int, default=3,
+                            help='buscas feitas profissional a profissional (bem mais lentas)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.executar(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def executar(self, options):
+        total_profissionais = options['profissionais']
+        dias = max(options['consultas'] // (total_profissionais * CONSULTAS_POR_DIA), 1)
+        self.amanha = timezone.localdate() + timedelta(days=1)
+        self.dias = dias
+
+        inicio = time.perf_counter()
+        self.stdout.write(f'Populando {total_profissionais} profissionais e '
+                          f'{total_profissionais * dias * CONSULTAS_POR_DIA} consultas ({dias} dias)...')
+        self.popular(total_profissionais, dias)
+        self.stdout.write(f'Consultas gravadas em {time.perf_counter() - inicio:.1f}s')
+
+        inicio = time.perf_counter()
+        total = self.montar_ocupacao()
+        self.stdout.write(f'{total} dias de ocupação montados em {time.perf_counter() - inicio:.1f}s')
+
+        self.factory = APIRequestFactory(HTTP_HOST='127.0.0.1')
+        self.usuario = get_user_model().objects.create_user(
+            email='benchmark@disponiveis.test', password='benchmark', nome_social='benchmark',
+        )
+        self.medir('busca por profissão', self.buscar, options['requisicoes'])
+        self.medir('agenda de cada profissional', self.buscar_agenda_por_agenda, options['requisicoes_agenda'])
+
+    def popular(self, total_profissionais, dias):
+        cliente = CadastroClientes.objects.create(
+            nome_social='cliente benchmark', cpf='00000000000', email='benchmark@disponiveis.test',
+            contato='11999999999', logradouro='rua', numero='1', complemento='-', bairro='-', cep='00000000',
+        )
+        profissionais = Profissionais._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {profissionais} (nome_social, profissao, endereco, contato, preco_consulta, ativo,
+                                             inicio_expediente, fim_expediente, duracao_consulta, dias_atendimento)
+                SELECT 'Bench ' || n, (%s::text[])[n %% %s + 1], 'rua', '11999999999', 80, true,
+                       '08:00', '18:00', 30, 127
+                FROM generate_series(1, %s) AS n
+                """,
+                [PROFISSOES, len(PROFISSOES), total_profissionais],
+            )
+            # horários distintos por dia: (k * 7 + p + d) %% 20 percorre 10 meias horas diferentes
+            cursor.execute(
+                f"""
+                INSERT INTO {AgendamentosConsultas._meta.db_table}
+                    (profissional_id, cliente_id, data_consulta, fim_consulta, status_consulta, consulta_ativa, versao)
+                SELECT p.id, %s, h.inicio, h.inicio + interval '30 minutes', 'agendada', true, 1
+                FROM {profissionais} p, generate_series(0, %s - 1) AS d, generate_series(0, %s - 1) AS k,
+                     LATERAL (SELECT %s::timestamptz + d * interval '1 day' + interval '8 hours'
+                                  + ((k * 7 + p.id + d) %% 20) * interval '30 minutes' AS inicio) AS h
+                WHERE p.nome_social LIKE 'Bench %%'
+                """,
+                [cliente.id, dias, CONSULTAS_POR_DIA, self.inicio_do_dia(self.amanha)],
+            )
+            cursor.execute(f'ANALYZE {profissionais}')
+            cursor.execute(f'ANALYZE {AgendamentosConsultas._meta.db_table}')
+
+    def montar_ocupacao(self):
+        #o INSERT direto não passa pelos signals, então a ocupação é montada aqui como na migration
+        tz = timezone.get_current_timezone()
+        consultas = (
+            AgendamentosConsultas.objects.ativas()
+            .filter(profissional__nome_social__startswith='Bench ')
+            .order_by('profissional_id', 'data_consulta')
+            .values_list('profissional_id', 'data_consulta')
+            .iterator(chunk_size=50_000)
+        )
+        chave = lambda consulta: (consulta[0], timezone.localtime(consulta[1], tz).date())
+        lote, total = [], 0
+        for (profissional_id, dia), grupo in groupby(consultas, key=chave):
+            horarios = [data_consulta for _, data_consulta in grupo]
+            lote.append(OcupacaoAgenda(
+                profissional_id=profissional_id, dia=dia, ocupacao=para_bytes(mascara_ocupacao(horarios, 30, dia, tz)),
+            ))
+            if len(lote) >= 10_000:
+                OcupacaoAgenda.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+        OcupacaoAgenda.objects.bulk_create(lote)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {OcupacaoAgenda._meta.db_table}')
+        return total + len(lote)
+
+    def janela_aleatoria(self):
+        dia = self.amanha + timedelta(days=random.randrange(self.dias))
+        inicio = self.inicio_do_dia(dia) + timedelta(hours=random.choice([8, 10, 13, 15]))
+        return random.choice(PROFISSOES), inicio, inicio + timedelta(hours=2)
+
+    def buscar(self):
+        profissao, inicio, fim = self.janela_aleatoria()
+        request = self.factory.get('/consultas/disponiveis/', {
+            'profissao': profissao, 'inicio': inicio.isoformat(), 'fim': fim.isoformat(),
+        })
+        force_authenticate(request, user=self.usuario)
+        response = ProfissionaisDisponiveis.as_view()(request)
+        response.render()
+        return len(response.data['profissionais'])
+
+    def buscar_agenda_por_agenda(self):
+        #o que o front faz hoje: a agenda da janela de cada profissional ativo da profissão
+        profissao, inicio, fim = self.janela_aleatoria()
+        view = ConsultasPorProfissional.as_view()
+        livres = 0
+        ids = Profissionais.objects.filter(ativo=True, profissao=profissao).values_list('id', flat=True)
+        for profissional_id in ids:
+            request = self.factory.get(f'/consultas/profissional/{profissional_id}/', {
+                'inicio': inicio.isoformat(), 'fim': (fim - timedelta(minutes=1)).isoformat(),
+            })
+            force_authenticate(request, user=self.usuario)
+            response = view(request, profissional_id=profissional_id)
+            response.render()
+            if response.status_code == 404 or len(response.data['results']) < 4:
+                livres += 1
+        return livres
+
+    def medir(self, nome, funcao, repeticoes):
+        tempos, encontrados = [], []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            encontrados.append(funcao())
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f"{nome}, {len(tempos)} buscas (~{statistics.mean(encontrados):.0f} profissionais livres): "
+            f"média {statistics.mean(tempos):.2f}ms | p50 {tempos[len(tempos) // 2]:.2f}ms | máx {tempos[-1]:.2f}ms"
+        ))
+
+    def inicio_do_dia(self, dia):
+        return timezone.make_aware(datetime.combine(dia, datetime.min.time()))
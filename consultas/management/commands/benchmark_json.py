@@ -0,0 +1,116 @@
+import statistics, time
+from io import BytesIO
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from clientes.models import CadastroClientes
+from clientes.views import CadastroClientesCreate
+from consultas.models import AgendamentosConsultas
+from consultas.views import ConsultasPorProfissional
+from lacreisaude.renderers import OrjsonParser, OrjsonRenderer
+from profissionais.models import Profissionais
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o JSONRenderer/JSONParser do DRF com os do orjson (lacreisaude/renderers.py) nos '
+        'payloads da agenda por profissional (todas as páginas) e da listagem de clientes. '
+        'Tudo roda em uma transação que é desfeita no final, nada fica gravado no banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consultas', type=int, default=10_000, help='consultas do profissional')
+        parser.add_argument('--clientes', type=int, default=10_000)
+        parser.add_argument('--repeticoes', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.executar(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def executar(self, options):
+        self.stdout.write(f"Populando {options['clientes']} clientes e {options['consultas']} consultas...")
+        profissional = self.popular(options['clientes'], options['consultas'])
+        self.factory = APIRequestFactory(HTTP_HOST='127.0.0.1')
+        self.usuario = get_user_model().objects.create_user(
+            email='benchmark@json.test', password='benchmark', nome_social='benchmark',
+        )
+
+        #os dados saem das views de verdade, só a serialização para JSON é medida
+        agenda = self.paginas(
+            ConsultasPorProfissional.as_view(), f'/consultas/profissional/{profissional.id}/', 200,
+            profissional_id=profissional.id,
+        )
+        clientes = self.paginas(CadastroClientesCreate.as_view(), '/clients/cadastro/', 500)
+
+        for nome, paginas in ((f'agenda ({len(agenda)} páginas de 200)', agenda),
+                              (f'listagem de clientes ({len(clientes)} páginas de 500)', clientes)):
+            self.comparar(nome, paginas, options['repeticoes'])
+
+    def popular(self, total_clientes, total_consultas):
+        profissional = Profissionais.objects.create(
+            nome_social='Dr. JSON', profissao='Médico', endereco='rua', contato='11999999999',
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {CadastroClientes._meta.db_table} (nome_social, cpf, cpf_normalizado, email, contato,
+                                                               logradouro, numero, complemento, bairro, cep)
+                SELECT 'cliente ' || n, lpad(n::text, 11, '0'), lpad(n::text, 11, '0'), 'cliente' || n || '@json.test',
+                       '11999999999', 'rua das consultas', '100', 'apartamento 12', 'saúde', '04000000'
+                FROM generate_series(1, %s) AS n
+                """,
+                [total_clientes],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {AgendamentosConsultas._meta.db_table} (profissional_id, cliente_id, data_consulta,
+                                                                    fim_consulta, status_consulta, consulta_ativa, versao)
+                SELECT %s, (SELECT min(id) FROM {CadastroClientes._meta.db_table}), inicio,
+                       inicio + interval '30 minutes', 'agendada', true, 1
+                FROM generate_series(1, %s) AS n,
+                     LATERAL (SELECT now() + n * interval '30 minutes' AS inicio) AS h
+                """,
+                [profissional.id, total_consultas],
+            )
+        return profissional
+
+    def paginas(self, view, url, page_size, **kwargs):
+        paginas = []
+        request = self.factory.get(url, {'page_size': page_size})
+        while request is not None:
+            force_authenticate(request, user=self.usuario)
+            data = view(request, **kwargs).data
+            paginas.append(data)
+            request = self.factory.get(data['next']) if data.get('next') else None
+        return paginas
+
+    def comparar(self, nome, paginas, repeticoes):
+        for renderer, parser in ((JSONRenderer(), JSONParser()), (OrjsonRenderer(), OrjsonParser())):
+            render, parse, tamanho = [], [], 0
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                corpos = [renderer.render(pagina) for pagina in paginas]
+                render.append((time.perf_counter() - inicio) * 1000)
+
+                inicio = time.perf_counter()
+                for corpo in corpos:
+                    parser.parse(BytesIO(corpo))
+                parse.append((time.perf_counter() - inicio) * 1000)
+                tamanho = sum(len(corpo) for corpo in corpos)
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{nome}, {type(renderer).__name__}: {tamanho / 1024:.1f} KiB | "
+                f"render: média {statistics.mean(render):.2f}ms | "
+                f"parse: média {statistics.mean(parse):.2f}ms"
+            ))
@@ -0,0 +1,38 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from consultas.exportacao import FORMATOS, TAMANHO_DO_LOTE, consultas_para_exportar, exportar
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta as consultas com os pagamentos (fechamento do mês) em CSV ou NDJSON, lendo por um '
+        'cursor do lado do servidor: a memória não cresce com o tamanho da tabela.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--inicio', help='AAAA-MM-DD, data da consulta')
+        parser.add_argument('--fim', help='AAAA-MM-DD, inclusive')
+        parser.add_argument('--saida', help='arquivo de saída (padrão: stdout)')
+        parser.add_argument('--lote', type=int, default=TAMANHO_DO_LOTE, help='linhas lidas do cursor por vez')
+
+    def handle(self, *args, **options):
+        queryset = consultas_para_exportar(self.ler_data(options, 'inicio'), self.ler_data(options, 'fim'))
+        saida = open(options['saida'], 'wb') if options['saida'] else sys.stdout.buffer
+        try:
+            for bloco in exportar(queryset, options['formato'], options['lote']):
+                saida.write(bloco)
+        finally:
+            if options['saida']:
+                saida.close()
+            else:
+                saida.flush()
+
+    def ler_data(self, options, parametro):
+        if not options[parametro]:
+            return None
+        data = parse_date(options[parametro])
+        if data is None:
+            raise CommandError(f"--{parametro} inválido, use AAAA-MM-DD.")
+        return data
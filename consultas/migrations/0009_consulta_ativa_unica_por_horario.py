@@ -0,0 +1,42 @@
+# Generated by Django 5.2.2 on 2026-10-18 06:25
+
+from django.db import migrations, models
+
+
+def cancelar_consultas_duplicadas(apps, schema_editor):
+    # mantém apenas a consulta ativa mais recente de cada horário (mesmo efeito do 'substituir=true')
+    AgendamentosConsultas = apps.get_model("consultas", "AgendamentosConsultas")
+    duplicadas = (
+        AgendamentosConsultas.objects.filter(consulta_ativa=True)
+        .values("profissional_id", "data_consulta")
+        .annotate(total=models.Count("id"), mais_recente=models.Max("id"))
+        .filter(total__gt=1)
+    )
+    for grupo in duplicadas:
+        AgendamentosConsultas.objects.filter(
+            profissional_id=grupo["profissional_id"],
+            data_consulta=grupo["data_consulta"],
+            consulta_ativa=True,
+            id__lt=grupo["mais_recente"],
+        ).update(consulta_ativa=False, status_consulta="cancelada")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0011_alter_cadastroclientes_cpf"),
+        ("consultas", "0008_alter_agendamentosconsultas_status_consulta"),
+        ("profissionais", "0003_profissionais_preco_consulta"),
+    ]
+
+    operations = [
+        migrations.RunPython(cancelar_consultas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="agendamentosconsultas",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("consulta_ativa", True)),
+                fields=("profissional", "data_consulta"),
+                name="consulta_ativa_unica_por_horario",
+            ),
+        ),
+    ]
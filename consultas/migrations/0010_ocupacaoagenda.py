@@ -0,0 +1,110 @@
+# Generated by Django 5.2.2 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from django.db import migrations, models
+from django.utils import timezone
+
+# cópia da grade de consultas/disponibilidade.py na época desta migration: 15 minutos por célula, 96 por dia
+MINUTOS_POR_CELULA = 15
+CELULAS_POR_DIA = 24 * 60 // MINUTOS_POR_CELULA
+
+
+def inicio_do_dia(dia, tz):
+    return timezone.make_aware(datetime.combine(dia, time.min), tz)
+
+
+def marcar(mascaras, inicio, fim, tz):
+    # marca as células que [inicio, fim) toca em cada dia, o que passa da meia-noite vai para o dia seguinte
+    dia = timezone.localtime(inicio, tz).date()
+    while inicio < fim:
+        proximo_dia = inicio_do_dia(dia + timedelta(days=1), tz)
+        ate = min(fim, proximo_dia)
+        local = timezone.localtime(inicio, tz)
+        primeira = (local.hour * 60 + local.minute) // MINUTOS_POR_CELULA
+        fim_em_minutos = (
+            local.hour * 60 + local.minute + (ate - inicio) // timedelta(minutes=1)
+        )
+        ultima = min(-(-fim_em_minutos // MINUTOS_POR_CELULA), CELULAS_POR_DIA)
+        mascaras[dia] = (
+            mascaras.get(dia, 0) | ((1 << max(ultima - primeira, 0)) - 1) << primeira
+        )
+        inicio, dia = proximo_dia, dia + timedelta(days=1)
+
+
+def preencher_ocupacao(apps, schema_editor):
+    # monta a grade de ocupação a partir das consultas ativas já existentes
+    AgendamentosConsultas = apps.get_model("consultas", "AgendamentosConsultas")
+    OcupacaoAgenda = apps.get_model("consultas", "OcupacaoAgenda")
+    Profissionais = apps.get_model("profissionais", "Profissionais")
+
+    tz = timezone.get_current_timezone()
+    duracoes = dict(Profissionais.objects.values_list("id", "duracao_consulta"))
+    consultas = (
+        AgendamentosConsultas.objects.filter(consulta_ativa=True)
+        .order_by("profissional_id", "data_consulta")
+        .values_list("profissional_id", "data_consulta")
+        .iterator(chunk_size=5000)
+    )
+    lote = []
+    for profissional_id, grupo in groupby(consultas, key=lambda consulta: consulta[0]):
+        duracao = timedelta(minutes=duracoes[profissional_id])
+        mascaras = {}
+        for _, data_consulta in grupo:
+            marcar(mascaras, data_consulta, data_consulta + duracao, tz)
+        for dia, mascara in mascaras.items():
+            lote.append(
+                OcupacaoAgenda(
+                    profissional_id=profissional_id,
+                    dia=dia,
+                    ocupacao=mascara.to_bytes(CELULAS_POR_DIA // 8, "little"),
+                )
+            )
+        if len(lote) >= 1000:
+            OcupacaoAgenda.objects.bulk_create(lote)
+            lote = []
+    OcupacaoAgenda.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0009_consulta_ativa_unica_por_horario"),
+        ("profissionais", "0004_profissionais_expediente"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OcupacaoAgenda",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dia", models.DateField()),
+                ("ocupacao", models.BinaryField(max_length=12)),
+                (
+                    "profissional",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="profissionais.profissionais",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("profissional", "dia"),
+                        name="ocupacao_agenda_unica_por_dia",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(preencher_ocupacao, migrations.RunPython.noop),
+    ]
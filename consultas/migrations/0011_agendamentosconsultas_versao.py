@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0010_ocupacaoagenda"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agendamentosconsultas",
+            name="versao",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
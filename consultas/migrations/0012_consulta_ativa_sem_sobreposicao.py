@@ -0,0 +1,77 @@
+# Generated by Django 5.2.2 on 2026-10-18 07:30
+
+import consultas.models
+import django.contrib.postgres.constraints
+from django.db import migrations, models
+
+# o fim de cada consulta é o início mais a duração atual do profissional. consultas ativas que
+# já se sobrepunham (10:00 e 10:15) terminam no início da seguinte, para a constraint poder ser criada.
+PREENCHER_FIM_CONSULTA = """
+UPDATE consultas_agendamentosconsultas AS c
+SET fim_consulta = LEAST(
+    c.data_consulta + p.duracao_consulta * interval '1 minute',
+    COALESCE(s.proxima, 'infinity')
+)
+FROM profissionais_profissionais AS p,
+     (SELECT id,
+             CASE WHEN consulta_ativa THEN
+                 LEAD(data_consulta) OVER (PARTITION BY profissional_id, consulta_ativa ORDER BY data_consulta)
+             END AS proxima
+      FROM consultas_agendamentosconsultas) AS s
+WHERE p.id = c.profissional_id AND s.id = c.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("consultas", "0011_agendamentosconsultas_versao"),
+        ("profissionais", "0005_profissional_profissao_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agendamentosconsultas",
+            name="fim_consulta",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunSQL(PREENCHER_FIM_CONSULTA, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name="agendamentosconsultas",
+            name="fim_consulta",
+            field=models.DateTimeField(),
+        ),
+        migrations.RemoveConstraint(
+            model_name="agendamentosconsultas",
+            name="consulta_ativa_unica_por_horario",
+        ),
+        migrations.AddIndex(
+            model_name="agendamentosconsultas",
+            index=models.Index(
+                condition=models.Q(("consulta_ativa", True)),
+                fields=["profissional", "data_consulta"],
+                name="consulta_ativa_agenda_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="agendamentosconsultas",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("consulta_ativa", True)),
+                expressions=[
+                    (
+                        consultas.models.Int8Range(
+                            "profissional", "profissional", models.Value("[]")
+                        ),
+                        "&&",
+                    ),
+                    (
+                        consultas.models.TsTzRange(
+                            "data_consulta", "fim_consulta", models.Value("[)")
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="consulta_ativa_sem_sobreposicao",
+            ),
+        ),
+    ]
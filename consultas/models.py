@@ -1,10 +1,53 @@
+from datetime import timedelta
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import BigIntegerRangeField, DateTimeRangeField, RangeOperators
 from django.db import models
+from django.db.models.signals import post_save
 from django.utils import timezone
 
+CONSTRAINT_HORARIO = 'consulta_ativa_sem_sobreposicao'
+
+
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class Int8Range(models.Func):
+    function = 'INT8RANGE'
+    output_field = BigIntegerRangeField()
+
+
+def conflito_de_horario(erro):
+    #verifica se o IntegrityError veio da constraint de horário do profissional
+    diag = getattr(erro.__cause__, 'diag', None)
+    return getattr(diag, 'constraint_name', None) == CONSTRAINT_HORARIO
+
+
+class AgendamentosQuerySet(models.QuerySet):
+    # consultas mais usadas da agenda. o índice parcial (profissional_id, data_consulta) WHERE consulta_ativa
+    # consulta_ativa_agenda_idx atende todas elas (ver PlanoDeExecucaoTestCase).
+
+    def ativas(self):
+        return self.filter(consulta_ativa=True)
+
+    def agenda_do_profissional(self, profissional_id):
+        return self.ativas().filter(profissional_id=profissional_id).order_by('data_consulta', 'id')
+
+    def futuras_do_profissional(self, profissional_id):
+        return self.ativas().filter(profissional_id=profissional_id, data_consulta__gte=timezone.now())
+
+    def sobrepostas(self, profissional_id, inicio, fim):
+        #consultas ativas que ocupam algum momento de [inicio, fim)
+        return self.ativas().filter(profissional_id=profissional_id, data_consulta__lt=fim, fim_consulta__gt=inicio)
+
+
 class AgendamentosConsultas(models.Model):
     data_consulta = models.DateTimeField(
         null=False,
         default=timezone.now)
+    # fim do horário reservado: a duração da consulta é a do profissional no momento do agendamento
+    fim_consulta = models.DateTimeField()
     profissional = models.ForeignKey(
     'profissionais.Profissionais',  
     on_delete=models.CASCADE)
@@ -18,7 +61,100 @@ class AgendamentosConsultas(models.Model):
         ('completa', 'Realizada'),
     ))
     consulta_ativa = models.BooleanField(default=True)
+    # incrementada a cada alteração, vira o ETag da consulta (controle de concorrência otimista)
+    versao = models.PositiveIntegerField(default=1)
+
+    objects = AgendamentosQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        #posição original na agenda, para atualizar também os dias antigos quando a consulta muda de horário
+        instancia._agenda_original = (
+            instancia.__dict__.get('profissional_id'),
+            instancia.__dict__.get('data_consulta'),
+            instancia.__dict__.get('fim_consulta'),
+        )
+        if instancia.__dict__.get('fim_consulta') and instancia.__dict__.get('data_consulta'):
+            instancia._duracao = instancia.fim_consulta - instancia.data_consulta
+        return instancia
+
+    def ajustar_fim_consulta(self):
+        #consulta nova reserva a duração atual do profissional; remarcar mantém a duração reservada
+        if self.fim_consulta is None:
+            self._duracao = timedelta(minutes=self.profissional.duracao_consulta)
+        elif not hasattr(self, '_duracao'):
+            self._duracao = self.fim_consulta - self.data_consulta
+        self.fim_consulta = self.data_consulta + self._duracao
+
+    def save(self, *args, **kwargs):
+        self.ajustar_fim_consulta()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'data_consulta' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'fim_consulta'}
+        super().save(*args, **kwargs)
+
+    def salvar_na_versao(self, versao, campos):
+        """
+        Grava 'campos' em um único UPDATE ... WHERE versao = 'versao', incrementando a versão.
+        Devolve False, sem gravar nada, quando outra edição já mudou a consulta.
+        """
+        if 'data_consulta' in campos:
+            self.ajustar_fim_consulta()
+            campos = {*campos, 'fim_consulta'}
+        atributos = [self._meta.get_field(campo).attname for campo in campos]
+        valores = {atributo: getattr(self, atributo) for atributo in atributos}
+        atualizadas = type(self).objects.filter(pk=self.pk, versao=versao).update(
+            versao=models.F('versao') + 1, **valores
+        )
+        if not atualizadas:
+            return False
+        self.versao = versao + 1
+        #o update() não dispara o post_save, que mantém a ocupação da agenda
+        post_save.send(
+            sender=type(self), instance=self, created=False, raw=False,
+            using=self._state.db, update_fields=frozenset(campos) | {'versao'},
+        )
+        return True
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['profissional', 'data_consulta'],
+                condition=models.Q(consulta_ativa=True),
+                name='consulta_ativa_agenda_idx',
+            ),
+        ]
+        constraints = [
+            # impede que o mesmo profissional tenha duas consultas ativas com horários sobrepostos.
+            # o profissional entra como int8range [id, id] com &&, que o GiST indexa sem a extensão btree_gist.
+            ExclusionConstraint(
+                name=CONSTRAINT_HORARIO,
+                expressions=[
+                    (Int8Range('profissional', 'profissional', models.Value('[]')), RangeOperators.OVERLAPS),
+                    (TsTzRange('data_consulta', 'fim_consulta', models.Value('[)')), RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(consulta_ativa=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Data da consulta:{self.data_consulta} Profissional{self.profissional}"
+
+
+class OcupacaoAgenda(models.Model):
+    # grade de 15 minutos de um dia do profissional (96 bits): bit n = n*15 min, 1 = ocupado.
+    # mantida por consultas/signals.py a cada mudança na agenda.
+    profissional = models.ForeignKey(
+    'profissionais.Profissionais',
+    on_delete=models.CASCADE)
+    dia = models.DateField()
+    ocupacao = models.BinaryField(max_length=12)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profissional', 'dia'], name='ocupacao_agenda_unica_por_dia'),
+        ]
 
     def __str__(self):
-        return f"Data da consulta:{self.data_consulta} Profissional{self.profissional}"
\ No newline at end of file
+        return f"Ocupação {self.dia} Profissional{self.profissional_id}"
@@ -0,0 +1,45 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+import json
+
+
+def contagem_aproximada(queryset):
+    #estimativa do planejador (estatísticas do ANALYZE), sem percorrer a tabela como o COUNT(*)
+    plano = json.loads(queryset.explain(format='json'))
+    return plano[0]['Plan']['Plan Rows']
+
+
+class AgendaCursorPagination(CursorPagination):
+    """
+    Paginação por cursor da agenda: cada página é uma única consulta indexada
+    (data_consulta > cursor ORDER BY data_consulta, id LIMIT n), sem COUNT(*) nem OFFSET.
+    Um profissional não tem duas consultas ativas no mesmo horário, então data_consulta
+    já marca a posição do cursor e o id só desempata a ordenação.
+
+    ?contagem=aproximada inclui o total estimado pelo Postgres na resposta.
+    """
+
+    ordering = ('data_consulta', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    contagem_query_param = 'contagem'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.contagem = None
+        if request.query_params.get(self.contagem_query_param) == 'aproximada':
+            self.contagem = contagem_aproximada(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def primeira_pagina(self):
+        return self.cursor is None
+
+    def get_paginated_response(self, data):
+        corpo = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.contagem is not None:
+            corpo['contagem_aproximada'] = self.contagem
+        return Response(corpo)
@@ -1,7 +1,23 @@
 from rest_framework import serializers
 from .models import AgendamentosConsultas
 
+
+class RelacionadoCarregado(serializers.PrimaryKeyRelatedField):
+    #usa a instância que a view já carregou (context['relacionados']) em vez de um SELECT por campo
+    def to_internal_value(self, data):
+        instancia = self.context.get('relacionados', {}).get(self.field_name)
+        if instancia is not None and str(instancia.pk) == str(data):
+            return instancia
+        return super().to_internal_value(data)
+
+
 class SerializerConsultas(serializers.ModelSerializer):
+    serializer_related_field = RelacionadoCarregado
+
     class Meta:
         model = AgendamentosConsultas
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['versao', 'fim_consulta']
+        # o conflito de horário é garantido pela constraint do banco e tratado na view (409),
+        # sem a consulta prévia que o UniqueTogetherValidator faria.
+        validators = []
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from profissionais.models import Profissionais
+from .models import AgendamentosConsultas
+from .cache_agenda import invalidar_agendas
+from .disponibilidade import dias_ocupados, reconstruir_ocupacoes
+
+CAMPOS_DA_AGENDA = {'profissional', 'profissional_id', 'data_consulta', 'fim_consulta', 'consulta_ativa'}
+
+
+def dias_afetados(instance):
+    #os dias atuais da consulta e, se ela mudou de horário ou de profissional, os dias antigos
+    dias = dias_ocupados(instance.profissional_id, instance.data_consulta, instance.fim_consulta)
+    profissional_id, data_consulta, fim_consulta = getattr(instance, '_agenda_original', (None, None, None))
+    if profissional_id and data_consulta:
+        dias |= dias_ocupados(profissional_id, data_consulta, fim_consulta or data_consulta)
+    return dias
+
+
+@receiver(post_save, sender=AgendamentosConsultas)
+def atualizar_agenda_ao_salvar(sender, instance, update_fields=None, **kwargs):
+    #qualquer campo aparece nas páginas da agenda em cache; a ocupação só depende dos horários
+    dias = dias_afetados(instance)
+    invalidar_agendas(*{profissional_id for profissional_id, _ in dias})
+    if update_fields is not None and not CAMPOS_DA_AGENDA & set(update_fields):
+        return
+    reconstruir_ocupacoes(dias)
+    instance._agenda_original = (instance.profissional_id, instance.data_consulta, instance.fim_consulta)
+
+
+@receiver(post_delete, sender=AgendamentosConsultas)
+def atualizar_agenda_ao_excluir(sender, instance, origin=None, **kwargs):
+    #exclusão em cascata do profissional já apaga a ocupação dele junto
+    if isinstance(origin, Profissionais) or getattr(origin, 'model', None) is Profissionais:
+        return
+    dias = dias_afetados(instance)
+    invalidar_agendas(*{profissional_id for profissional_id, _ in dias})
+    reconstruir_ocupacoes(dias)
+
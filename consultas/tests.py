@@ -1,17 +1,29 @@
 import json
 import jwt  
 from django.conf import settings  
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from prometheus_client import REGISTRY
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from rest_framework.test import APIClient
-from datetime import  timedelta
+from datetime import  datetime, time, timedelta
 from rest_framework_simplejwt.tokens import AccessToken
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from .models import AgendamentosConsultas
 from profissionais.models import Profissionais
-from clientes.models import CadastroClientes, PagamentoConsultas
+from clientes.models import CadastroClientes, PagamentoConsultas, EventoOutboxAsaas
+from users.utils.jwt_utils import criar_token
+from users.models import ChaveIdempotencia
 from unittest.mock import patch, MagicMock
+from django.core.management import call_command
+import csv, io, os, tempfile
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import json
 
 import json
@@ -19,6 +31,8 @@ import json
 User = get_user_model()  # Isso pegará seu CustomUser
 
 class CadastroConsultasTestCase(TestCase):
+    ORCAMENTO_QUERIES = 12
+
     def setUp(self):
         self.client = APIClient()
         
@@ -98,6 +112,107 @@ class CadastroConsultasTestCase(TestCase):
         consulta = AgendamentosConsultas.objects.first()
         self.assertEqual(consulta.id, pagamento_data.consulta.id)
 
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_repeticao_com_idempotency_key_devolve_a_resposta_original(self, mock_registrar):
+        primeira = self.client.post(self.url, data=json.dumps(self.valid_payload),
+                                    content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+        repeticao = self.client.post(self.url, data=json.dumps(self.valid_payload),
+                                     content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+
+        self.assertEqual(primeira.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeticao.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeticao.json(), primeira.json())
+        self.assertEqual(repeticao['Idempotent-Replayed'], 'true')
+        self.assertEqual(AgendamentosConsultas.objects.count(), 1)
+        mock_registrar.assert_called_once()
+
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_idempotency_key_reutilizada_com_outro_corpo(self, mock_registrar):
+        self.client.post(self.url, data=json.dumps(self.valid_payload),
+                         content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+        outro = dict(self.valid_payload, metodo_pagamento='boleto')
+        response = self.client.post(self.url, data=json.dumps(outro),
+                                    content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(AgendamentosConsultas.objects.count(), 1)
+
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_idempotency_key_expirada_executa_de_novo(self, mock_registrar):
+        self.client.post(self.url, data=json.dumps(self.valid_payload),
+                         content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+        ChaveIdempotencia.objects.update(expira_em=timezone.now())
+        response = self.client.post(self.url, data=json.dumps(self.valid_payload),
+                                    content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+
+        #o horário já está ocupado pela primeira consulta
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_idempotency_key_em_andamento(self, mock_registrar):
+        def em_andamento(request, *args, **kwargs):
+            #durante a view a marca já está gravada, sem resposta
+            chave = ChaveIdempotencia.objects.get(chave='agendamento-1')
+            self.assertIsNone(chave.status_resposta)
+            repeticao = self.client.post(self.url, data=json.dumps(self.valid_payload),
+                                         content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+            self.assertEqual(repeticao.status_code, status.HTTP_409_CONFLICT)
+            self.assertEqual(repeticao['Retry-After'], '1')
+            return Response({'id': 1}, status=status.HTTP_201_CREATED)
+
+        with patch('consultas.views.CadastroConsultas.create', side_effect=em_andamento, autospec=True):
+            response = self.client.post(self.url, data=json.dumps(self.valid_payload),
+                                        content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ChaveIdempotencia.objects.get().status_resposta, status.HTTP_201_CREATED)
+
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_erro_de_validacao_libera_a_idempotency_key(self, mock_registrar):
+        with patch('consultas.views.CadastroConsultas.create', side_effect=ValidationError({'cliente': ['inválido']})):
+            response = self.client.post(self.url, data=json.dumps(self.valid_payload),
+                                        content_type='application/json', HTTP_IDEMPOTENCY_KEY='agendamento-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ChaveIdempotencia.objects.exists())
+
+    @patch('clientes.asaas.requests.Session.request')
+    def test_criar_consulta_enfileira_cobranca_sem_chamar_o_asaas(self, mock_post):
+        response = self.client.post(
+            self.url,
+            data=json.dumps(self.valid_payload),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        pagamento = PagamentoConsultas.objects.get()
+        evento = EventoOutboxAsaas.objects.get()
+        self.assertEqual(evento.pagamento, pagamento)
+        self.assertEqual(evento.status, 'pendente')
+        mock_post.assert_not_called()
+
+    def test_criar_consulta_dentro_do_orcamento_de_queries(self):
+        #profissional e cliente (uma query), insert da consulta, ocupação da agenda (3),
+        #pagamento, evento do outbox e o pg_notify da agenda, mais os 4 savepoints das transações
+        self.assertEqual(self.client.get('/users/user/').status_code, 200)  # aquece o cache do token
+        with self.assertNumQueries(self.ORCAMENTO_QUERIES):
+            response = self.client.post(self.url, data=json.dumps(self.valid_payload), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        consulta = AgendamentosConsultas.objects.get()
+        self.assertEqual((consulta.profissional_id, consulta.cliente_id), (self.profissional.id, self.cliente.id))
+
+    def test_cliente_inexistente_continua_sendo_erro_de_validacao(self):
+        payload = {**self.valid_payload, 'cliente': 9999}
+        response = self.client.post(self.url, data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cliente', response.data)
+
+    def test_metodo_de_pagamento_invalido_nao_grava_a_consulta(self):
+        payload = self.valid_payload.copy()
+        payload['metodo_pagamento'] = 'dinheiro'
+        response = self.client.post(self.url, data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AgendamentosConsultas.objects.count(), 0)
+
     def test_criar_consulta_data_passado(self):
         payload = self.valid_payload.copy()
         payload['data_consulta'] = (timezone.now() - timedelta(days=1)).strftime('%Y-%m-%d %H:%M')
@@ -126,6 +241,20 @@ class CadastroConsultasTestCase(TestCase):
         self.assertEqual(response.status_code, 409)
         self.assertTrue(response.data['conflito'])
 
+    def test_criar_consulta_sobreposta(self):
+        #consultas de 30 minutos: 10:15 cai dentro da consulta das 10:00, 10:30 não
+        inicio = timezone.localtime() + timedelta(days=1)
+        horarios = [inicio, inicio + timedelta(minutes=15), inicio + timedelta(minutes=30)]
+        respostas = []
+        for horario in horarios:
+            payload = {**self.valid_payload, 'data_consulta': horario.strftime('%Y-%m-%d %H:%M')}
+            respostas.append(self.client.post(self.url, data=json.dumps(payload), content_type='application/json'))
+
+        self.assertEqual([r.status_code for r in respostas], [201, 409, 201])
+        self.assertTrue(respostas[1].data['conflito'])
+        consulta = AgendamentosConsultas.objects.get(id=respostas[0].data['id'])
+        self.assertEqual(consulta.fim_consulta - consulta.data_consulta, timedelta(minutes=30))
+
     def test_criar_consulta_substituir_existente(self):
         # Cria primeira consulta
         self.client.post(
@@ -146,6 +275,25 @@ class CadastroConsultasTestCase(TestCase):
         # Verifica se a consulta anterior foi desativada
         self.assertEqual(AgendamentosConsultas.objects.filter(consulta_ativa=True).count(), 1)
 
+    def test_criar_consulta_conflito_nao_substitui_em_caso_de_erro(self):
+        self.client.post(
+            self.url,
+            data=json.dumps(self.valid_payload),
+            content_type='application/json'
+        )
+
+        # substituição com dados inválidos: a consulta original continua ativa
+        payload = self.valid_payload.copy()
+        payload['substituir'] = 'true'
+        payload['status_consulta'] = 'inexistente'
+        response = self.client.post(
+            self.url,
+            data=json.dumps(payload),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AgendamentosConsultas.objects.filter(consulta_ativa=True).count(), 1)
+
     def test_criar_consulta_profissional_inexistente(self):
         payload = self.valid_payload.copy()
         payload['profissional'] = 9999 
@@ -217,8 +365,8 @@ class EditarConsultasTestCase(TestCase):
         )
         self.url = f'/consultas/{self.consulta.id}/'
         
-    @patch('clientes.views.asaas_token', 'mock_token_de_teste')    
-    @patch('clientes.views.requests.post')
+    @override_settings(ASAAS_ACCESS_TOKEN='mock_token_de_teste')    
+    @patch('clientes.asaas.requests.Session.request')
     def test_editar_consulta_com_sucesso(self,mock_asaas_post):
         """
         Testa se uma consulta pode ser editada com sucesso, mockando a chamada
@@ -294,6 +442,7 @@ class EditarConsultasTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.consulta.refresh_from_db()
         self.assertEqual(self.consulta.data_consulta.strftime('%Y-%m-%d %H:%M'), nova_data)
+        self.assertEqual(self.consulta.fim_consulta - self.consulta.data_consulta, timedelta(minutes=30))
 
     def test_editar_data_para_passado(self):
         payload = {
@@ -307,8 +456,89 @@ class EditarConsultasTestCase(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn('Não é possível alterar a consulta com data ou horário passado.', str(response.data))
 
+    def test_get_devolve_etag_da_versao(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"1"')
+        self.assertEqual(response.data['versao'], 1)
+
+    def test_editar_com_if_match_atual(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(
+            self.url, data=json.dumps({'status_consulta': 'confirmada'}),
+            content_type='application/json', HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"2"')
+        self.consulta.refresh_from_db()
+        self.assertEqual((self.consulta.status_consulta, self.consulta.versao), ('confirmada', 2))
+
+    def test_editar_com_if_match_desatualizado(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, data=json.dumps({'status_consulta': 'confirmada'}),
+                          content_type='application/json', HTTP_IF_MATCH=etag)
+        response = self.client.patch(
+            self.url, data=json.dumps({'status_consulta': 'cancelada'}),
+            content_type='application/json', HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 412)
+        self.consulta.refresh_from_db()
+        self.assertEqual(self.consulta.status_consulta, 'confirmada')
+        self.assertTrue(self.consulta.consulta_ativa)
+
+    def test_if_match_invalido(self):
+        response = self.client.patch(
+            self.url, data=json.dumps({'status_consulta': 'confirmada'}),
+            content_type='application/json', HTTP_IF_MATCH='"abc"',
+        )
+        self.assertEqual(response.status_code, 412)
+
+    def test_editar_para_horario_ocupado_nao_sugere_substituir(self):
+        horario = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=2), time(10, 0)))
+        AgendamentosConsultas.objects.create(
+            profissional=self.profissional, cliente=self.cliente, status_consulta='agendada', data_consulta=horario,
+        )
+        response = self.client.patch(
+            self.url, data=json.dumps({'data_consulta': horario.strftime('%Y-%m-%d %H:%M')}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertTrue(response.data['conflito'])
+        self.assertNotIn('substituir', response.data['detalhes'])
+
+    def test_patch_sem_mudancas_nao_muda_a_versao(self):
+        self.client.get(self.url)  # aquece o cache do token
+        for payload in [{}, {'status_consulta': 'agendada', 'cliente': self.cliente.id}]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.patch(self.url, data=json.dumps(payload), content_type='application/json',
+                                             HTTP_IF_MATCH='"1"')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['ETag'], '"1"')
+            self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE')])
+        self.consulta.refresh_from_db()
+        self.assertEqual(self.consulta.versao, 1)
+
+        #com If-Match desatualizado continua sendo 412, mesmo sem mudanças
+        response = self.client.patch(self.url, data=json.dumps({}), content_type='application/json',
+                                     HTTP_IF_MATCH='"7"')
+        self.assertEqual(response.status_code, 412)
+
+    def test_edicao_em_um_unico_update_condicional(self):
+        self.client.get(self.url)  # aquece o cache do token
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                self.url, data=json.dumps({'status_consulta': 'confirmada'}),
+                content_type='application/json', HTTP_IF_MATCH='"1"',
+            )
+        self.assertEqual(response.status_code, 200)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "consultas_agendamentosconsultas"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"versao" = 1', updates[0])
+
+
 class ConsultasPorProfissionalTestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
 
 
@@ -380,7 +610,7 @@ class ConsultasPorProfissionalTestCase(TestCase):
         url = f'/consultas/profissional/{self.profissional.id}/'
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
 
     def test_listar_consultas_profissional_inexistente(self):
         url = '/consultas/profissional/9999/'
@@ -395,5 +625,713 @@ class ConsultasPorProfissionalTestCase(TestCase):
     def test_ordenacao_consultas_por_data(self):
         url = f'/consultas/profissional/{self.profissional.id}/'
         response = self.client.get(url)
-        datas = [item['data_consulta'] for item in response.data]
-        self.assertTrue(datas == sorted(datas))        
\ No newline at end of file
+        datas = [item['data_consulta'] for item in response.data['results']]
+        self.assertTrue(datas == sorted(datas))
+
+    def test_pagina_seguinte_pelo_cursor(self):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        primeira = self.client.get(url, {'page_size': 1})
+        self.assertEqual(len(primeira.data['results']), 1)
+        self.assertIsNone(primeira.data['previous'])
+
+        segunda = self.client.get(primeira.data['next'])
+        self.assertEqual(len(segunda.data['results']), 1)
+        self.assertGreater(segunda.data['results'][0]['data_consulta'], primeira.data['results'][0]['data_consulta'])
+        self.assertIsNone(segunda.data['next'])
+
+    def test_listagem_sem_exists_nem_count(self):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        self.client.get(url, {'page_size': 10})  # aquece o cache do token (a página é outra)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1, [q['sql'] for q in queries])
+        self.assertNotIn('COUNT', queries[0]['sql'])
+
+    def test_pagina_repetida_vem_do_cache(self):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        acertos = REGISTRY.get_sample_value('agenda_cache_consultas_total', {'resultado': 'hit'}) or 0
+        primeira = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            segunda = self.client.get(url)
+        self.assertEqual(segunda.data, primeira.data)
+        self.assertFalse([q for q in queries if 'consultas_agendamentosconsultas' in q['sql']])
+        self.assertEqual(REGISTRY.get_sample_value('agenda_cache_consultas_total', {'resultado': 'hit'}), acertos + 1)
+
+    def test_reconexao_do_ouvinte_descarta_as_paginas(self):
+        from lacreisaude.invalidacao import limpar_caches
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        self.client.get(url)
+        #uma mudança perdida enquanto o ouvinte estava desconectado
+        AgendamentosConsultas.objects.filter(profissional=self.profissional).update(status_consulta='confirmada')
+        limpar_caches()
+        response = self.client.get(url)
+        self.assertEqual({c['status_consulta'] for c in response.data['results']}, {'confirmada'})
+
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_agendar_e_editar_invalidam_a_agenda(self, mock_registrar):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        self.assertEqual(len(self.client.get(url).data['results']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nova = self.client.post('/consultas/', data=json.dumps({
+                'profissional': self.profissional.id,
+                'cliente': self.cliente.id,
+                'data_consulta': (timezone.now() + timedelta(days=5)).strftime('%Y-%m-%d %H:%M'),
+                'status_consulta': 'agendada',
+                'metodo_pagamento': 'pix',
+            }), content_type='application/json')
+        self.assertEqual(nova.status_code, 201)
+        self.assertEqual(len(self.client.get(url).data['results']), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/consultas/{nova.data['id']}/", data=json.dumps({'status_consulta': 'cancelada'}),
+                              content_type='application/json')
+        self.assertEqual(len(self.client.get(url).data['results']), 2)
+
+    def test_filtra_por_faixa_de_datas_e_status(self):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        amanha = timezone.localdate() + timedelta(days=1)
+        response = self.client.get(url, {
+            'inicio': amanha.isoformat(),
+            'fim': (amanha + timedelta(days=3)).isoformat(),
+            'status_consulta': 'confirmada',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['status_consulta'] for c in response.data['results']], ['confirmada'])
+
+    def test_filtro_sem_resultados_nao_e_404(self):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        response = self.client.get(url, {'inicio': (timezone.localdate() + timedelta(days=30)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+        response = self.client.get('/consultas/profissional/9999/', {'status_consulta': 'agendada'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_filtro_por_um_unico_dia_inclui_o_dia_inteiro(self):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        dia = timezone.localdate() + timedelta(days=10)
+        AgendamentosConsultas.objects.create(
+            profissional=self.profissional, cliente=self.cliente, status_consulta='agendada',
+            data_consulta=timezone.make_aware(datetime.combine(dia, time(14, 0))),
+        )
+        response = self.client.get(url, {'inicio': dia.isoformat(), 'fim': dia.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+        response = self.client.get(url, {'fim': (dia - timedelta(days=1)).isoformat(), 'inicio': dia.isoformat()})
+        self.assertEqual(response.data['results'], [])
+
+    def test_filtro_invalido(self):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        self.assertEqual(self.client.get(url, {'status_consulta': 'inexistente'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'inicio': 'ontem'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'fim': timezone.now().isoformat()}).status_code, 400)
+
+    def test_contagem_aproximada_opcional(self):
+        url = f'/consultas/profissional/{self.profissional.id}/'
+        self.assertNotIn('contagem_aproximada', self.client.get(url).data)
+
+        response = self.client.get(url, {'contagem': 'aproximada'})
+        self.assertIsInstance(response.data['contagem_aproximada'], int)
+
+
+class AgendamentoConcorrenteTestCase(TransactionTestCase):
+    """Dispara agendamentos em paralelo para o mesmo horário do mesmo profissional."""
+
+    TOTAL_REQUISICOES = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='concorrencia@example.com',
+            password='testpass123',
+            nome_social='Usuário Concorrência'
+        )
+        self.token = criar_token(self.user)['access']
+        self.cliente = CadastroClientes.objects.create(
+            nome_social = 'cliente concorrente',
+            cpf = '12345678900',
+            email = 'concorrente@cliente.com',
+            contato = '11222223333',
+            logradouro = 'alameda dos clientes',
+            numero = '11',
+            complemento = 'apartamento 02',
+            bairro = 'saude',
+            cep = '11222333',
+        )
+        self.profissional = Profissionais.objects.create(
+            nome_social="Dr. Concorrido",
+            profissao="Médico",
+            endereco="alameda dos testes",
+            contato="99888887777",
+            ativo=True
+        )
+        self.payload = {
+            'profissional': self.profissional.id,
+            'data_consulta': (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M'),
+            'cliente': self.cliente.id,
+            'status_consulta': 'agendada',
+            'metodo_pagamento': 'pix'
+        }
+
+    def _disparar(self, payload, **headers):
+        barreira = threading.Barrier(self.TOTAL_REQUISICOES)
+
+        def agendar(_):
+            client = APIClient()
+            client.cookies['access_token'] = self.token
+            try:
+                barreira.wait()
+                response = client.post('/consultas/', data=json.dumps(payload), content_type='application/json', **headers)
+                return response.status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.TOTAL_REQUISICOES) as executor:
+            return list(executor.map(agendar, range(self.TOTAL_REQUISICOES)))
+
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_agendamentos_paralelos_no_mesmo_horario(self, mock_registrar):
+        resultados = self._disparar(self.payload)
+
+        self.assertEqual(resultados.count(201), 1)
+        self.assertEqual(resultados.count(409), self.TOTAL_REQUISICOES - 1)
+        self.assertEqual(
+            AgendamentosConsultas.objects.filter(profissional=self.profissional, consulta_ativa=True).count(), 1
+        )
+        self.assertEqual(PagamentoConsultas.objects.count(), 1)
+
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_repeticoes_paralelas_com_a_mesma_idempotency_key(self, mock_registrar):
+        resultados = self._disparar(self.payload, HTTP_IDEMPOTENCY_KEY='agendamento-paralelo')
+
+        # quem chega durante a primeira recebe 409 (em andamento), quem chega depois recebe a mesma resposta
+        self.assertGreaterEqual(resultados.count(201), 1)
+        self.assertEqual(resultados.count(201) + resultados.count(409), self.TOTAL_REQUISICOES)
+        self.assertEqual(AgendamentosConsultas.objects.count(), 1)
+        mock_registrar.assert_called_once()
+
+    @patch('consultas.views.CadastroConsultas.registrar_pagamento_no_asaas')
+    def test_substituicoes_paralelas_no_mesmo_horario(self, mock_registrar):
+        payload = dict(self.payload, substituir='true')
+        resultados = self._disparar(payload)
+
+        self.assertGreaterEqual(resultados.count(201), 1)
+        self.assertEqual(resultados.count(201) + resultados.count(409), self.TOTAL_REQUISICOES)
+        # independente da ordem, só uma consulta fica ativa no horário
+        self.assertEqual(
+            AgendamentosConsultas.objects.filter(profissional=self.profissional, consulta_ativa=True).count(), 1
+        )
+
+
+class PlanoDeExecucaoTestCase(TestCase):
+    """
+    Roda EXPLAIN nas consultas quentes da agenda contra uma tabela volumosa
+    e falha se alguma delas voltar a fazer Seq Scan em AgendamentosConsultas.
+    """
+
+    TOTAL_PROFISSIONAIS = 200
+    CONSULTAS_POR_PROFISSIONAL = 100
+    TABELA = AgendamentosConsultas._meta.db_table
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = CadastroClientes.objects.create(
+            nome_social = 'cliente volumoso',
+            cpf = '12345678900',
+            email = 'volume@cliente.com',
+            contato = '11222223333',
+            logradouro = 'alameda dos clientes',
+            numero = '11',
+            complemento = 'apartamento 02',
+            bairro = 'saude',
+            cep = '11222333',
+        )
+        profissionais = Profissionais.objects.bulk_create([
+            Profissionais(
+                nome_social=f"Dr. {i}",
+                profissao="Médico",
+                endereco="alameda dos testes",
+                contato="99888887777",
+            )
+            for i in range(cls.TOTAL_PROFISSIONAIS)
+        ])
+        inicio = timezone.now() - timedelta(days=30)
+        AgendamentosConsultas.objects.bulk_create([
+            AgendamentosConsultas(
+                profissional=profissional,
+                cliente=cliente,
+                data_consulta=inicio + timedelta(hours=j),
+                fim_consulta=inicio + timedelta(hours=j, minutes=30),
+                status_consulta='agendada',
+                consulta_ativa=j % 4 != 0,
+            )
+            for profissional in profissionais
+            for j in range(cls.CONSULTAS_POR_PROFISSIONAL)
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {cls.TABELA}')
+        cls.profissional = profissionais[len(profissionais) // 2]
+
+    def assertSemSeqScan(self, queryset):
+        plano = queryset.explain()
+        self.assertNotIn(f'Seq Scan on {self.TABELA}', plano, plano)
+        self.assertIn('Index', plano, plano)
+
+    def test_agenda_do_profissional(self):
+        from .views import ConsultasPorProfissional
+        view = ConsultasPorProfissional(kwargs={'profissional_id': self.profissional.id})
+        self.assertSemSeqScan(view.get_queryset())
+
+    def test_pagina_da_agenda_pelo_cursor(self):
+        from .views import ConsultasPorProfissional
+        view = ConsultasPorProfissional(kwargs={'profissional_id': self.profissional.id})
+        posicao = timezone.now() - timedelta(days=10)
+        self.assertSemSeqScan(view.get_queryset().filter(data_consulta__gt=posicao)[:51])
+
+    def test_agenda_filtrada_por_faixa_de_datas(self):
+        from .views import ConsultasPorProfissional
+        from .filters import AgendaFilter
+        view = ConsultasPorProfissional(kwargs={'profissional_id': self.profissional.id})
+        inicio = timezone.localdate() - timedelta(days=10)
+        filtro = AgendaFilter(
+            {'inicio': inicio.isoformat(), 'fim': (inicio + timedelta(days=2)).isoformat(), 'status_consulta': 'agendada'},
+            queryset=view.get_queryset(),
+        )
+        plano = filtro.qs.explain()
+        self.assertSemSeqScan(filtro.qs)
+        self.assertIn('data_consulta >=', plano)
+
+    def test_consultas_futuras_do_profissional(self):
+        self.assertSemSeqScan(AgendamentosConsultas.objects.futuras_do_profissional(self.profissional.id))
+
+    def test_consultas_sobrepostas(self):
+        data_consulta = AgendamentosConsultas.objects.ativas().filter(
+            profissional=self.profissional
+        ).values_list('data_consulta', flat=True).first()
+        self.assertSemSeqScan(AgendamentosConsultas.objects.sobrepostas(
+            self.profissional.id, data_consulta, data_consulta + timedelta(minutes=30),
+        ))
+
+
+class DisponibilidadeTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            nome_social='Usuário Teste'
+        )
+        token = AccessToken.for_user(self.user)
+        token['id'] = self.user.id
+        self.client.cookies['access_token'] = str(token)
+
+        self.cliente = CadastroClientes.objects.create(
+            nome_social = 'cliente primario',
+            cpf = '12345678900',
+            email = 'email@cliente.com',
+            contato = '11222223333',
+            logradouro = 'alameda dos clientes',
+            numero = '11',
+            complemento = 'apartamento 02',
+            bairro = 'saude',
+            cep = '11222333',
+        )
+        self.profissional = Profissionais.objects.create(
+            nome_social="Dr. Agenda",
+            profissao="Médico",
+            endereco="alameda dos testes",
+            contato="99888887777",
+            inicio_expediente=time(8, 0),
+            fim_expediente=time(12, 0),
+            duracao_consulta=30,
+            dias_atendimento=0b1111111,
+        )
+        self.amanha = timezone.localdate() + timedelta(days=1)
+        self.url = f'/consultas/profissional/{self.profissional.id}/disponibilidade/'
+
+    def horario(self, hora, minuto=0, dia=None):
+        return timezone.make_aware(datetime.combine(dia or self.amanha, time(hora, minuto)))
+
+    def livres(self, dia=None):
+        dia = dia or self.amanha
+        response = self.client.get(self.url, {'inicio': dia.isoformat(), 'fim': dia.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return [timezone.localtime(h).strftime('%H:%M') for h in response.data['dias'][0]['horarios']]
+
+    def agendar(self, hora, minuto=0, dia=None):
+        return AgendamentosConsultas.objects.create(
+            profissional=self.profissional,
+            cliente=self.cliente,
+            data_consulta=self.horario(hora, minuto, dia),
+            status_consulta='agendada',
+        )
+
+    def test_expediente_livre(self):
+        self.assertEqual(self.livres(), ['08:00', '08:30', '09:00', '09:30', '10:00', '10:30', '11:00', '11:30'])
+
+    def test_consulta_ocupa_as_celulas_que_toca(self):
+        self.agendar(9, 10)  # 09:10-09:40 toca as meias horas das 09:00 e das 09:30
+        self.assertEqual(self.livres(), ['08:00', '08:30', '10:00', '10:30', '11:00', '11:30'])
+
+    def test_cancelamento_libera_o_horario(self):
+        consulta = self.agendar(9)
+        consulta.status_consulta = 'cancelada'
+        consulta.consulta_ativa = False
+        consulta.save()
+        self.assertIn('09:00', self.livres())
+
+    def test_remarcar_libera_o_dia_antigo(self):
+        consulta = AgendamentosConsultas.objects.get(id=self.agendar(9).id)
+        depois = self.amanha + timedelta(days=1)
+        consulta.data_consulta = self.horario(10, dia=depois)
+        consulta.save()
+
+        self.assertIn('09:00', self.livres())
+        self.assertNotIn('10:00', self.livres(depois))
+
+    def test_mudanca_de_duracao_vale_para_novas_consultas(self):
+        self.agendar(9)  # reservada com 30 minutos
+        self.profissional.duracao_consulta = 45
+        self.profissional.save()
+        #em passos de 45 minutos só o das 08:45 encosta na consulta das 09:00-09:30
+        self.assertEqual(self.livres(), ['08:00', '09:30', '10:15', '11:00'])
+        nova = self.agendar(10, 15)
+        self.assertEqual(nova.fim_consulta, self.horario(11))
+
+    def ocupacao(self, dia):
+        from .disponibilidade import de_bytes
+        from .models import OcupacaoAgenda
+        return de_bytes(OcupacaoAgenda.objects.get(profissional=self.profissional, dia=dia).ocupacao)
+
+    def test_consulta_que_passa_da_meia_noite_ocupa_os_dois_dias(self):
+        Profissionais.objects.filter(id=self.profissional.id).update(duracao_consulta=60)
+        self.profissional.refresh_from_db()
+        depois = self.amanha + timedelta(days=1)
+        consulta = self.agendar(23, 30)  # 23:30-00:30
+        self.assertEqual(self.ocupacao(self.amanha), 0b11 << 94)
+        self.assertEqual(self.ocupacao(depois), 0b11)
+
+        #remarcar para o meio do dia libera a madrugada do dia seguinte
+        consulta = AgendamentosConsultas.objects.get(id=consulta.id)
+        consulta.data_consulta = self.horario(9)
+        consulta.save()
+        self.assertEqual(self.ocupacao(self.amanha), 0b1111 << 36)
+        self.assertEqual(self.ocupacao(depois), 0)
+
+    def test_migracao_da_ocupacao_divide_na_meia_noite(self):
+        from importlib import import_module
+        migracao = import_module('consultas.migrations.0010_ocupacaoagenda')
+        tz = timezone.get_current_timezone()
+        mascaras = {}
+        migracao.marcar(mascaras, self.horario(23, 30), self.horario(0, 30, dia=self.amanha + timedelta(days=1)), tz)
+        self.assertEqual(mascaras, {self.amanha: 0b11 << 94, self.amanha + timedelta(days=1): 0b11})
+
+    def test_dias_sem_atendimento(self):
+        Profissionais.objects.filter(id=self.profissional.id).update(dias_atendimento=0)
+        self.assertEqual(self.livres(), [])
+
+    def test_mes_inteiro_em_poucas_queries(self):
+        for dia in range(1, 29):
+            self.agendar(9, dia=self.amanha + timedelta(days=dia))
+        self.client.get(self.url)  # aquece o cache do token
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {
+                'inicio': self.amanha.isoformat(),
+                'fim': (self.amanha + timedelta(days=30)).isoformat(),
+            })
+        self.assertEqual(len(response.data['dias']), 31)
+        self.assertEqual(len(queries), 2)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url, {'inicio': 'amanha'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {
+            'inicio': self.amanha.isoformat(), 'fim': (self.amanha + timedelta(days=90)).isoformat(),
+        }).status_code, 400)
+        self.assertEqual(self.client.get('/consultas/profissional/9999/disponibilidade/').status_code, 404)
+
+    def buscar_livres(self, profissao, inicio, fim):
+        response = self.client.get('/consultas/disponiveis/', {
+            'profissao': profissao, 'inicio': inicio.isoformat(), 'fim': fim.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        return {p['nome_social']: [timezone.localtime(h).strftime('%H:%M') for h in p['horarios']]
+                for p in response.data['profissionais']}
+
+    def test_busca_profissionais_livres_por_profissao(self):
+        ocupado = Profissionais.objects.create(
+            nome_social="Dr. Ocupado", profissao="Médico", endereco="rua", contato="99888887777",
+            dias_atendimento=0b1111111,
+        )
+        Profissionais.objects.create(
+            nome_social="Dr. Inativo", profissao="Médico", endereco="rua", contato="99888887777",
+            dias_atendimento=0b1111111, ativo=False,
+        )
+        Profissionais.objects.create(
+            nome_social="Dra. Dentista", profissao="Dentista", endereco="rua", contato="99888887777",
+            dias_atendimento=0b1111111,
+        )
+        for hora, minuto in [(9, 0), (9, 30)]:
+            AgendamentosConsultas.objects.create(
+                profissional=ocupado, cliente=self.cliente,
+                data_consulta=self.horario(hora, minuto), status_consulta='agendada',
+            )
+        self.agendar(9)
+
+        livres = self.buscar_livres('médico', self.horario(9), self.horario(10))
+        self.assertEqual(livres, {'Dr. Agenda': ['09:30']})
+
+    def test_busca_em_uma_unica_query(self):
+        for n in range(20):
+            Profissionais.objects.create(
+                nome_social=f"Dr. {n}", profissao="Médico", endereco="rua", contato="99888887777",
+                dias_atendimento=0b1111111,
+            )
+        self.client.get(self.url)  # aquece o cache do token
+        with CaptureQueriesContext(connection) as queries:
+            livres = self.buscar_livres('Médico', self.horario(8), self.horario(12))
+        self.assertEqual(len(livres), 21)
+        self.assertEqual(len(queries), 1)
+
+    def test_busca_com_janela_invalida(self):
+        url = '/consultas/disponiveis/'
+        self.assertEqual(self.client.get(url, {'profissao': 'Médico'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {
+            'profissao': 'Médico',
+            'inicio': self.horario(10).isoformat(),
+            'fim': self.horario(10, dia=self.amanha + timedelta(days=1)).isoformat(),
+        }).status_code, 400)
+
+
+class ConsultasEmLoteTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            nome_social='Usuário Teste'
+        )
+        token = AccessToken.for_user(self.user)
+        token['id'] = self.user.id
+        self.client.cookies['access_token'] = str(token)
+
+        self.cliente = CadastroClientes.objects.create(
+            nome_social = 'cliente primario',
+            cpf = '12345678900',
+            email = 'email@cliente.com',
+            contato = '11222223333',
+            logradouro = 'alameda dos clientes',
+            numero = '11',
+            complemento = 'apartamento 02',
+            bairro = 'saude',
+            cep = '11222333',
+        )
+        self.profissional = Profissionais.objects.create(
+            nome_social="Dr. Lote",
+            profissao="Médico",
+            endereco="alameda dos testes",
+            contato="99888887777",
+            dias_atendimento=0b1111111,
+        )
+        self.url = '/consultas/lote/'
+        self.amanha = timezone.localdate() + timedelta(days=1)
+
+    def item(self, hora, dia=0, **extra):
+        data = datetime.combine(self.amanha + timedelta(days=dia), time(8)) + timedelta(minutes=30 * hora)
+        return {
+            'profissional': self.profissional.id,
+            'cliente': self.cliente.id,
+            'data_consulta': data.strftime('%Y-%m-%d %H:%M'),
+            'metodo_pagamento': 'pix',
+            **extra,
+        }
+
+    def test_cria_consultas_pagamentos_e_eventos(self):
+        response = self.client.post(self.url, {'consultas': [self.item(0), self.item(1), self.item(0, dia=1)]}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['resumo'], {'criada': 3, 'conflito': 0, 'invalida': 0})
+        ids = [r['id'] for r in response.data['resultados']]
+        self.assertEqual(PagamentoConsultas.objects.filter(consulta_id__in=ids, preco_consulta=80).count(), 3)
+        self.assertEqual(EventoOutboxAsaas.objects.filter(pagamento__consulta_id__in=ids).count(), 3)
+
+        disponiveis = self.client.get(f'/consultas/profissional/{self.profissional.id}/disponibilidade/', {
+            'inicio': self.amanha.isoformat(), 'fim': self.amanha.isoformat(),
+        })
+        primeiros = [timezone.localtime(h).strftime('%H:%M') for h in disponiveis.data['dias'][0]['horarios']][:2]
+        self.assertEqual(primeiros, ['09:00', '09:30'])
+
+    def test_conflitos_com_a_agenda_e_dentro_do_lote(self):
+        AgendamentosConsultas.objects.create(
+            profissional=self.profissional, cliente=self.cliente, status_consulta='agendada',
+            data_consulta=timezone.make_aware(datetime.combine(self.amanha, time(8))),
+        )
+        response = self.client.post(self.url, {'consultas': [self.item(0), self.item(1), self.item(1)]}, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r['status'] for r in response.data['resultados']], ['conflito', 'criada', 'conflito'])
+
+    def test_sobreposicao_com_a_agenda_e_dentro_do_lote(self):
+        AgendamentosConsultas.objects.create(
+            profissional=self.profissional, cliente=self.cliente, status_consulta='agendada',
+            data_consulta=timezone.make_aware(datetime.combine(self.amanha, time(9))),
+        )
+        horarios = ['08:00', '08:15', '08:45', '09:30']
+        consultas = [{**self.item(0), 'data_consulta': f'{self.amanha} {horario}'} for horario in horarios]
+        response = self.client.post(self.url, {'consultas': consultas}, format='json')
+
+        self.assertEqual([r['status'] for r in response.data['resultados']], ['criada', 'conflito', 'conflito', 'criada'])
+
+    def test_itens_invalidos(self):
+        ontem = (timezone.localdate() - timedelta(days=1)).strftime('%Y-%m-%d 10:00')
+        response = self.client.post(self.url, {'consultas': [
+            self.item(0, data_consulta='amanhã'),
+            self.item(1, data_consulta=ontem),
+            self.item(2, metodo_pagamento='dinheiro'),
+            self.item(3, profissional=9999),
+            self.item(4, cliente=None),
+            self.item(5),
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['resumo'], {'criada': 1, 'conflito': 0, 'invalida': 5})
+        self.assertEqual(response.data['resultados'][0]['erro'], "Formato de data inválido.")
+        self.assertEqual(response.data['resultados'][3]['erro'], "O profissional não foi encontrado nos registros.")
+
+    def test_numero_de_queries_nao_cresce_com_o_lote(self):
+        def queries_do_lote(dia, tamanho):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    self.url, {'consultas': [self.item(h, dia=dia) for h in range(tamanho)]}, format='json'
+                )
+            self.assertEqual(response.data['resumo']['criada'], tamanho)
+            return len(queries)
+
+        queries_do_lote(0, 1)  # aquece o cache do token
+        self.assertEqual(queries_do_lote(1, 2), queries_do_lote(2, 40))
+
+    def test_agendamento_concorrente_refaz_a_checagem(self):
+        from . import lote
+        separar_conflitos = lote.separar_conflitos
+        chamadas = []
+
+        def sem_ver_o_concorrente(itens, resultados):
+            chamadas.append(len(itens))
+            if len(chamadas) == 1:
+                AgendamentosConsultas.objects.create(
+                    profissional=self.profissional, cliente=self.cliente, status_consulta='agendada',
+                    data_consulta=timezone.make_aware(datetime.combine(self.amanha, time(8, 30))),
+                )
+                return list(itens)
+            return separar_conflitos(itens, resultados)
+
+        with patch.object(lote, 'separar_conflitos', side_effect=sem_ver_o_concorrente):
+            response = self.client.post(self.url, {'consultas': [self.item(0), self.item(1)]}, format='json')
+
+        self.assertEqual(len(chamadas), 2)
+        self.assertEqual([r['status'] for r in response.data['resultados']], ['criada', 'conflito'])
+
+    def test_lote_vazio_ou_grande_demais(self):
+        self.assertEqual(self.client.post(self.url, {'consultas': []}, format='json').status_code, 400)
+        with patch('consultas.views.MAXIMO_ITENS', 2):
+            response = self.client.post(self.url, {'consultas': [self.item(h) for h in range(3)]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportarConsultasTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='export@example.com', password='testpass123', nome_social='Export')
+        token = AccessToken.for_user(self.user)
+        token['id'] = self.user.id
+        self.client.cookies['access_token'] = str(token)
+
+        self.cliente = CadastroClientes.objects.create(
+            nome_social='cliente exportado', cpf='12345678900', email='export@cliente.com', contato='11222223333',
+            logradouro='alameda', numero='11', complemento='-', bairro='saude', cep='11222333',
+        )
+        self.profissional = Profissionais.objects.create(
+            nome_social='Dr. Fechamento', profissao='Médico', endereco='rua', contato='99888887777',
+        )
+        self.paga = AgendamentosConsultas.objects.create(
+            profissional=self.profissional, cliente=self.cliente, status_consulta='completa',
+            data_consulta=timezone.make_aware(datetime(2026, 9, 30, 14, 0)),
+        )
+        self.pagamento = PagamentoConsultas.objects.create(
+            cliente=self.cliente, consulta=self.paga, metodo_de_pagamento='pix', preco_consulta='150.50',
+            status_pagamento='pago', asaas_payment_id='pay_1',
+        )
+        self.sem_pagamento = AgendamentosConsultas.objects.create(
+            profissional=self.profissional, cliente=self.cliente, status_consulta='agendada',
+            data_consulta=timezone.make_aware(datetime(2026, 10, 1, 9, 0)),
+        )
+        self.url = '/consultas/exportar/'
+
+    def ler_csv(self, response):
+        return list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_csv_com_consultas_e_pagamentos(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="consultas.csv"')
+        paga, sem_pagamento = self.ler_csv(response)
+        self.assertEqual(paga['consulta_id'], str(self.paga.id))
+        self.assertEqual(paga['data_consulta'], '2026-09-30T14:00:00+00:00')
+        self.assertEqual(paga['fim_consulta'], '2026-09-30T14:30:00+00:00')
+        self.assertEqual(paga['profissional'], 'Dr. Fechamento')
+        self.assertEqual(paga['preco_consulta'], '150.50')
+        self.assertEqual(paga['status_pagamento'], 'pago')
+        self.assertEqual(sem_pagamento['consulta_id'], str(self.sem_pagamento.id))
+        self.assertEqual(sem_pagamento['pagamento_id'], '')
+
+    def test_csv_nao_exporta_formulas(self):
+        for nome in ['+1', '-1', '\tcliente', '\rcliente']:
+            self.assertEqual(self.exportar_cliente(nome), "'" + nome)
+        CadastroClientes.objects.filter(id=self.cliente.id).update(nome_social='=HYPERLINK("http://x","y")')
+        Profissionais.objects.filter(id=self.profissional.id).update(nome_social='@SUM(1+1)')
+        paga, _ = self.ler_csv(self.client.get(self.url))
+        self.assertEqual(paga['cliente'], '\'=HYPERLINK("http://x","y")')
+        self.assertEqual(paga['profissional'], "'@SUM(1+1)")
+        self.assertEqual(paga['preco_consulta'], '150.50')
+
+        #o NDJSON não é aberto em planilhas e sai sem alteração
+        response = self.client.get(self.url, {'formato': 'ndjson'})
+        linha = json.loads(b''.join(response.streaming_content).splitlines()[0])
+        self.assertEqual(linha['profissional'], '@SUM(1+1)')
+
+    def exportar_cliente(self, nome):
+        CadastroClientes.objects.filter(id=self.cliente.id).update(nome_social=nome)
+        return self.ler_csv(self.client.get(self.url))[0]['cliente']
+
+    def test_ndjson_filtrado_por_periodo(self):
+        response = self.client.get(self.url, {'formato': 'ndjson', 'inicio': '2026-09-01', 'fim': '2026-09-30'})
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        linhas = [json.loads(linha) for linha in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(linhas), 1)
+        self.assertEqual(linhas[0]['pagamento_id'], self.pagamento.id)
+        self.assertEqual(linhas[0]['preco_consulta'], '150.50')
+        self.assertEqual(linhas[0]['data_consulta'], '2026-09-30T14:00:00+00:00')
+
+    def test_lotes_pequenos_nao_mudam_o_arquivo(self):
+        from .exportacao import consultas_para_exportar, exportar
+        blocos = list(exportar(consultas_para_exportar(), 'csv', tamanho_do_lote=1))
+        self.assertEqual(len(blocos), 3)  # cabeçalho e primeira linha, segunda linha, final vazio
+        self.assertEqual(b''.join(blocos), b''.join(self.client.get(self.url).streaming_content))
+
+    def test_parametros_invalidos_e_sem_autenticacao(self):
+        self.assertEqual(self.client.get(self.url, {'formato': 'xlsx'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'inicio': 'setembro'}).status_code, 400)
+        self.client.cookies['access_token'] = None
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_comando_grava_o_arquivo(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'consultas.csv')
+            call_command('exportar_consultas', '--saida', caminho, '--inicio', '2026-10-01')
+            with open(caminho, newline='') as arquivo:
+                linhas = list(csv.DictReader(arquivo))
+        self.assertEqual([linha['consulta_id'] for linha in linhas], [str(self.sem_pagamento.id)])
@@ -1,9 +1,13 @@
 from django.urls import path
-from .views import CadastroConsultas, EditarConsultas, ConsultasPorProfissional
+from .views import CadastroConsultas, CadastroConsultasEmLote, EditarConsultas, ConsultasPorProfissional, DisponibilidadeProfissional, ProfissionaisDisponiveis, ExportarConsultas
 
 urlpatterns = [
     path('consultas/', CadastroConsultas.as_view(), name='listar-consultas'),
+    path('consultas/exportar/', ExportarConsultas.as_view(), name='exportar-consultas'),
+    path('consultas/lote/', CadastroConsultasEmLote.as_view(), name='cadastrar-consultas-em-lote'),
     path('consultas/<int:pk>/', EditarConsultas.as_view(), name='editar-excluir-consultas'),
-    path('consultas/profissional/<int:profissional_id>/', ConsultasPorProfissional.as_view(), name='consultas-por-profissional')
+    path('consultas/profissional/<int:profissional_id>/', ConsultasPorProfissional.as_view(), name='consultas-por-profissional'),
+    path('consultas/profissional/<int:profissional_id>/disponibilidade/', DisponibilidadeProfissional.as_view(), name='disponibilidade-profissional'),
+    path('consultas/disponiveis/', ProfissionaisDisponiveis.as_view(), name='profissionais-disponiveis'),
     
 ]
\ No newline at end of file
@@ -1,40 +1,120 @@
 from django.shortcuts import render
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Subquery
 from rest_framework import generics, status
-from .models import AgendamentosConsultas
+from .models import AgendamentosConsultas, conflito_de_horario
 from profissionais.models import Profissionais
-from clientes.models import PagamentoConsultas, CadastroClientes
+from clientes.models import CadastroClientes, PagamentoConsultas
+from clientes.outbox import enfileirar_cobranca
 from .serializers import SerializerConsultas
+from .paginacao import AgendaCursorPagination
+from .filters import AgendaFilter
+from .disponibilidade import horarios_livres, profissionais_livres
+from .lote import agendar_em_lote, MAXIMO_ITENS
+from .cache_agenda import chave_da_pagina, gravar_pagina, ler_pagina
+from .exportacao import FORMATOS, consultas_para_exportar, exportar
+from users.idempotencia import IdempotenciaMixin
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
-from users.utils.jwt_utils import verificar_token_cookies
-from datetime import datetime
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, timedelta
 import os, requests, json, logging, sys
 
-asaas_token = settings.ASAAS_ACCESS_TOKEN
-url_asaas = "https://api-sandbox.asaas.com/v3/payments"
-
-#verifica se o usuário fez login antes de proceder
-def check_login( request):
-    payload, error_response = verificar_token_cookies(request)
-    if error_response:
-        return None, error_response
-    return payload, None
-
-class CadastroConsultas(generics.ListCreateAPIView):
+def resposta_conflito(data_agendamento, profissional_id):
+    return Response(
+        {
+            "erro": "Este profissional já possui uma consulta agendada para este horário.",
+            "detalhes": {
+                "data_hora_conflitante": data_agendamento,
+                "profissional_id": profissional_id,
+                "substituir": "Se desejar substituir a consulta existente, envie o parâmetro 'substituir=true'"
+            },
+            "conflito": True
+        },
+        status=status.HTTP_409_CONFLICT
+    )
+
+
+def resposta_conflito_na_edicao(data_agendamento, profissional_id):
+    #a edição não substitui consultas: o cliente precisa escolher outro horário
+    return Response(
+        {
+            "erro": "Este profissional já possui uma consulta agendada para este horário.",
+            "detalhes": {
+                "data_hora_conflitante": data_agendamento,
+                "profissional_id": profissional_id,
+                "sugestao": "Escolha outro horário. A edição não substitui a consulta existente."
+            },
+            "conflito": True
+        },
+        status=status.HTTP_409_CONFLICT
+    )
+
+
+def etag_da_consulta(consulta):
+    return f'"{consulta.versao}"'
+
+
+def versao_do_etag(etag):
+    #aceita "3" ou W/"3"; None para qualquer outro valor
+    valor = etag.strip().removeprefix('W/').strip('"')
+    return int(valor) if valor.isdigit() else None
+
+
+def ler_data(request, parametro):
+    #data AAAA-MM-DD da query string; None se ausente, ValueError se inválida
+    valor = request.query_params.get(parametro)
+    if not valor:
+        return None
+    data = parse_date(valor)
+    if data is None:
+        raise ValueError(valor)
+    return data
+
+
+def resposta_versao_desatualizada():
+    return Response(
+        {"erro": "A consulta foi alterada por outra requisição. Busque a versão atual e tente novamente."},
+        status=status.HTTP_412_PRECONDITION_FAILED
+    )
+
+
+def profissional_e_cliente(profissional_id, cliente_id):
+    """
+    Profissional (com o preço e a duração da consulta) e cliente do agendamento em uma query:
+    o cliente vem como subquery do id e só carrega o resto dos campos se alguém pedir.
+    Quem não for encontrado fica de fora e o serializer devolve o erro de sempre.
+    """
+    try:
+        profissional = Profissionais.objects.annotate(
+            cliente_encontrado=Subquery(CadastroClientes.objects.filter(pk=cliente_id).values('pk')[:1]),
+        ).filter(pk=profissional_id).first()
+    except (TypeError, ValueError):
+        return {}
+    if profissional is None:
+        return {}
+    relacionados = {'profissional': profissional}
+    if profissional.cliente_encontrado is not None:
+        relacionados['cliente'] = CadastroClientes.from_db(
+            profissional._state.db, ['id'], [profissional.cliente_encontrado],
+        )
+    return relacionados
+
+
+class CadastroConsultas(IdempotenciaMixin, generics.ListCreateAPIView):
     queryset = AgendamentosConsultas.objects.all()
     serializer_class = SerializerConsultas
     http_method_names = ['post'] 
+    permission_classes = [IsAuthenticated] #só cria consultas se o usuário estiver logado na conta.
 
     
     def create(self, request, *args, **kwargs):
-        #só cria consultas se o usuário estiver logado na conta.
-        payload, error = check_login(request)
-        if error:
-            return error  
-
         data_agendamento = request.data.get('data_consulta') 
         profissional_id = request.data.get('profissional') 
         cliente_id = request.data.get('cliente')
@@ -72,191 +152,116 @@ class CadastroConsultas(generics.ListCreateAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 ) 
 
-            #verifica se não existe conflito na agenda
+        # o método de pagamento é validado antes de gravar qualquer coisa
+        metodo_pagamento = request.data.get('metodo_pagamento')
+        if not metodo_pagamento:
+            logging.debug('metodo de pagamento não encontrado.')
+            return Response(
+                {"erro": "Inclua o campo 'metodo_pagamento':'pix,boleto ou credit_card'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        metodos_validos = ['pix', 'boleto', 'credit_card'] # Exemplo
+        if metodo_pagamento not in metodos_validos:
+            logging.debug('o metodo de pagamento digitado é inválido.')
+            return Response(
+                {"erro": f"Método de pagamento '{metodo_pagamento}' é inválido."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            conflito = AgendamentosConsultas.objects.filter(
-                data_consulta=agendamento_dt,
-                profissional_id=profissional_id,
-                consulta_ativa=True,
-            ).exists()   
-            if conflito:
-                # Verifica se o usuário enviou a flag para substituir
-                substituir = str(request.data.get('substituir', '')).lower() == 'true'
-                
-                if not substituir:
-                    logging.debug(f'O profissional {profissional_id} Possui outra consulta para o horário e data mencionados.')
-                    return Response(
-                        {
-                            "erro": "Este profissional já possui uma consulta agendada para este horário.",
-                            "detalhes": {
-                                "data_hora_conflitante": data_agendamento,
-                                "profissional_id": profissional_id,
-                                "substituir": "Se desejar substituir a consulta existente, envie o parâmetro 'substituir=true'"
-                            },
-                            "conflito": True
-                        },
-                        status=status.HTTP_409_CONFLICT
-                    )
-                else:
-                     logging.debug('A consulta médica foi substituida.') 
-                    # inativa a consulta existente antes de criar a nova
-                     AgendamentosConsultas.objects.filter(
-                        data_consulta=agendamento_dt,
-                        profissional_id=profissional_id,
-                        consulta_ativa=True
-                    ).update(consulta_ativa=False,status_consulta='canceled')
-             
-        response = super().create(request, *args, **kwargs)
-        if response.status_code == status.HTTP_201_CREATED:
-            nova_consulta_id = response.data['id']
-            
-            try:
-                nova_consulta_instance = AgendamentosConsultas.objects.get(id=nova_consulta_id)
-            except AgendamentosConsultas.DoesNotExist:
-                # Se a consulta não for encontrada, ele irá apresentar o erro.
-                logging.debug(f'A consulta {nova_consulta_id} não foi encontrada para gerar o pagamento.')
-                return Response(
-                    {"erro": "Falha ao encontrar a consulta recém-criada para gerar o pagamento."},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+        serializer = self.get_serializer(
+            data=request.data,
+            context={**self.get_serializer_context(), 'relacionados': profissional_e_cliente(profissional_id, cliente_id)},
+        )
+        serializer.is_valid(raise_exception=True)
 
-            # Get additional data for the payment from the request
-            metodo_pagamento = request.data.get('metodo_pagamento') 
-            preco_consulta = None
-            if not metodo_pagamento:
-                logging.debug('metodo de pagamento não encontrado.')
-                return Response(
-                    {"erro": "Inclua o campo 'metodo_pagamento':'pix,boleto ou credit_card'"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            metodos_validos = ['pix', 'boleto', 'credit_card'] # Exemplo
-            if metodo_pagamento not in metodos_validos:
-                logging.debug('o metodo de pagamento digitado é inválido.')
-                return Response(
-                    {"erro": f"Método de pagamento '{metodo_pagamento}' é inválido."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        #profissional (com o preço) e cliente vieram em uma query, reaproveitados no pagamento
+        profissional = serializer.validated_data['profissional']
+        cliente_instance = serializer.validated_data['cliente']
+        preco_consulta = profissional.preco_consulta
+        if preco_consulta is None or preco_consulta < 0:
+            logging.debug(f'O profissional {profissional_id} precisa ter um preço válido de consulta.')
+            return Response(
+                {"erro": "O profissional não tem um preço de consulta válido configurado."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            try: 
-                cliente_instance = CadastroClientes.objects.get(id=cliente_id)
+        # Verifica se o usuário enviou a flag para substituir
+        substituir = str(request.data.get('substituir', '')).lower() == 'true'
 
-            except CadastroClientes.DoesNotExist:
-                logging.debug(f'A cliente {cliente_instance} não foi encontrado e o pagamento não foi gerado.')
-                return Response(
-                    {"erro": "O cliente associado não foi encontrado."},
-                    status=status.HTTP_404_NOT_FOUND    
-                )
-            try:
-                profissional = Profissionais.objects.get(id=profissional_id)
-                preco_consulta = profissional.preco_consulta
-            except Profissionais.DoesNotExist:
-                logging.debug(f'O profissional {profissional_id} não foi encontrado e por isso o preço da consulta não pode ser determinado.')
-                return Response(
-                    {"erro": "O profissional associado não foi encontrado para determinar o preço."},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            if preco_consulta is None or preco_consulta < 0:
-                 logging.debug(f'O profissional {profissional_id} precisa ter um preço válido de consulta.')
-                 return Response(
-                    {"erro": "O profissional não tem um preço de consulta válido configurado."},
-                    status=status.HTTP_400_BAD_REQUEST
+        #o conflito na agenda é detectado pela constraint do banco no próprio insert.
+        #substituição, consulta, pagamento e evento do outbox são gravados na mesma transação.
+        try:
+            with transaction.atomic():
+                if data_agendamento and substituir:
+                    # inativa as consultas que ocupam o horário antes de criar a nova
+                    substituidas = AgendamentosConsultas.objects.sobrepostas(
+                        profissional.id, agendamento_dt,
+                        agendamento_dt + timedelta(minutes=profissional.duracao_consulta),
+                    ).update(consulta_ativa=False, status_consulta='cancelada', versao=F('versao') + 1)
+                    if substituidas:
+                        logging.debug('A consulta médica foi substituida.')
+                nova_consulta_instance = serializer.save()
+
+                novo_pagamento_data = PagamentoConsultas.objects.create(
+                    cliente=cliente_instance,
+                    consulta=nova_consulta_instance,
+                    metodo_de_pagamento=metodo_pagamento,
+                    preco_consulta=preco_consulta,
+                    data_vencimento=timezone.localdate(),
+                    status_pagamento='pendente'  # Set the initial status
                 )
-
-        
-
-            # Create the PagamentoDeConsulta instance
-            novo_pagamento_data = PagamentoConsultas.objects.create(
-                cliente=cliente_instance,
-                consulta=nova_consulta_instance,
-                metodo_de_pagamento=metodo_pagamento,
-                preco_consulta=preco_consulta,
-                data_vencimento=timezone.localdate(),
-                status_pagamento='pendente'  # Set the initial status
-            )
-            
-            self.registrar_pagamento_no_asaas(novo_pagamento_data)
-        return response
+                self.registrar_pagamento_no_asaas(novo_pagamento_data)
+        except IntegrityError as erro:
+            if not conflito_de_horario(erro):
+                raise
+            logging.debug(f'O profissional {profissional_id} Possui outra consulta para o horário e data mencionados.')
+            return resposta_conflito(data_agendamento, profissional_id)
+
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     
     def registrar_pagamento_no_asaas(self, pagamento_data):
+        #a cobrança é enviada ao Asaas pelo worker do outbox (processar_outbox_asaas),
+        #fora da requisição. o evento é gravado na mesma transação do pagamento.
+        enfileirar_cobranca(pagamento_data)
     
-        if not asaas_token:
-            logging.debug("ERRO: A variável de ambiente ASAAS_ACCESS_TOKEN não está configurada.")
-            return 
-        
-        try:
-        # Acessa o cliente relacionado ao pagamento e pega o ID do Asaas
-            id_cliente_asaas = pagamento_data.cliente.asaas_customer_id
-        
-        # Verifica se o ID do cliente no Asaas realmente existe
-            if not id_cliente_asaas:
-                logging.debug(f"ERRO: O cliente {pagamento_data.cliente.id} não possui um asaas_customer_id registrado.")
-                return
-
-        except AttributeError:
-        # Este erro acontece se pagamento_data.cliente for None ou se o campo não existir
-            logging.debug("ERRO: Não foi possível encontrar o cliente associado a este pagamento.")
-            return
-
-        asaas_payload = {
-            "billingType": pagamento_data.metodo_de_pagamento,
-            "value": pagamento_data.preco_consulta,
-            "dueDate": pagamento_data.data_vencimento.strftime('%Y-%m-%d'),
-            "customer": id_cliente_asaas,
-            "description": f"Pagamento da consulta ID {pagamento_data.consulta.id} para o cliente {pagamento_data.cliente.nome_social}",
-            "externalReference": f"PAGAMENTO_{pagamento_data.id}" # Referência externa para conciliação
-        }
-        
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "access_token": asaas_token
-        }
-        logging.debug("Enviando para o Asaas o payload:", asaas_payload)
-
-    # --- EXECUÇÃO DA CHAMADA À API ---
-        try:
-            response = requests.post(url_asaas, json=asaas_payload, headers=headers, timeout=15)
-            response.raise_for_status()  # Lança uma exceção para erros HTTP (4xx ou 5xx)
-            
-            #salva o id do novo pagamento registrado
-            response_data = response.json()
-            id_pagamento_asaas = response_data.get('id')
-            pagamento_data.asaas_payment_id = id_pagamento_asaas 
-            pagamento_data.save()
-
-        except requests.exceptions.RequestException as e:
-            logging.debug(f"ERRO DE CONEXÃO: Falha ao se comunicar com a API do Asaas. Erro: {e}")
-            return None
-        
-    # --- TRATAMENTO DA RESPOSTA ---
-        response_data = response.json()
-        logging.debug("Resposta do Asaas:", response_data)
 
-    # Verifica se a cobrança foi criada com sucesso
-        if response.status_code == 200:
-            logging.debug("Pagamento criado com sucesso no Asaas!")
-        
-        
-        else:
-        # Se a resposta não for a esperada
-            logging.debug(f"ERRO: O Asaas retornou um status inesperado ou um erro.")
-            logging.debug(f"Status Code: {response.status_code}")
-            logging.debug(f"Resposta: {response_data}")
-        return None 
-    
+class CadastroConsultasEmLote(APIView):
+    #importação de agendas inteiras das clínicas parceiras: um resultado por consulta enviada
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        consultas = request.data.get('consultas') if isinstance(request.data, dict) else None
+        if not isinstance(consultas, list) or not consultas:
+            return Response(
+                {"erro": "Envie a lista de consultas no campo 'consultas'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(consultas) > MAXIMO_ITENS:
+            return Response(
+                {"erro": f"Envie no máximo {MAXIMO_ITENS} consultas por lote."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultados = agendar_em_lote(consultas)
+        resumo = {situacao: 0 for situacao in ('criada', 'conflito', 'invalida')}
+        for resultado in resultados:
+            resumo[resultado['status']] += 1
+        logging.debug(f'lote de consultas processado: {resumo}')
+        return Response(
+            {'resumo': resumo, 'resultados': resultados},
+            status=status.HTTP_201_CREATED if resumo['criada'] == len(resultados) else status.HTTP_207_MULTI_STATUS
+        )
+
 
 class EditarConsultas(generics.RetrieveUpdateDestroyAPIView):
     queryset = AgendamentosConsultas.objects.all()
     http_method_names = ['patch','get']  
     serializer_class = SerializerConsultas
+    permission_classes = [IsAuthenticated]
     
     
     def retrieve(self, request, *args, **kwargs): #exibe consulta por id
-        payload, error = check_login(request)
-        if error:
-            return error
-        
         try:
             instance = self.get_queryset().get(pk=kwargs.get('pk'))
         except AgendamentosConsultas.DoesNotExist:
@@ -264,15 +269,12 @@ class EditarConsultas(generics.RetrieveUpdateDestroyAPIView):
                 {'error': 'Consulta não encontrada'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        return super().retrieve(request, *args, **kwargs)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, headers={'ETag': etag_da_consulta(instance)})
     
     def patch(self, request, *args, **kwargs): #editar consultas
         data_agendamento = request.data.get('data_consulta')
         status_consulta = request.data.get('status_consulta')
-        payload, error = check_login(request)
-
-        if error:
-            return error
         
         try:
             instance = self.get_queryset().get(pk=kwargs.get('pk'))
@@ -306,61 +308,207 @@ class EditarConsultas(generics.RetrieveUpdateDestroyAPIView):
                         status=status.HTTP_400_BAD_REQUEST
             )
         
-        #logica para desativar a consulta completamente se for marcada como cancelada.
-        if 'status_consulta' in request.data and (status_consulta == 'cancelada'):
-            serializer = self.get_serializer(instance, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
-            serializer.save(consulta_ativa=False)
-            logging.debug('a consulta foi desativada com sucesso.')
-
-        else:
-            serializer = self.get_serializer(instance, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
-            serializer.save(consulta_ativa=True)
-
+        #If-Match com o ETag do GET protege contra edições simultâneas. sem ele vale a versão lida
+        #agora, o que ainda impede sobrescrever uma edição gravada entre a leitura e o UPDATE.
+        versao = instance.versao
+        if_match = request.headers.get('If-Match')
+        if if_match and if_match.strip() != '*':
+            versao = versao_do_etag(if_match)
+            if versao is None:
+                logging.debug(f'If-Match inválido: {if_match}')
+                return resposta_versao_desatualizada()
 
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
-        
-        return Response(serializer.data)
+        #só entram no UPDATE os campos que mudaram de valor (pelo attname, sem buscar as FKs)
+        atributos = {campo: instance._meta.get_field(campo).attname for campo in serializer.validated_data}
+        antes = {campo: getattr(instance, atributo) for campo, atributo in atributos.items()}
+        for campo, valor in serializer.validated_data.items():
+            setattr(instance, campo, valor)
+        campos = {campo for campo, atributo in atributos.items() if getattr(instance, atributo) != antes[campo]}
+
+        #logica para desativar a consulta completamente se for marcada como cancelada.
+        consulta_ativa = not ('status_consulta' in request.data and status_consulta == 'cancelada')
+        if consulta_ativa != instance.consulta_ativa:
+            instance.consulta_ativa = consulta_ativa
+            campos.add('consulta_ativa')
+
+        if not campos:
+            #nada mudou: sem UPDATE, a versão e o ETag continuam os mesmos
+            if versao != instance.versao:
+                return resposta_versao_desatualizada()
+            return Response(serializer.data, headers={'ETag': etag_da_consulta(instance)})
+
+        try:
+            with transaction.atomic():
+                #um único UPDATE condicional: se a versão mudou, nada é gravado
+                gravada = instance.salvar_na_versao(versao, campos)
+        except IntegrityError as erro:
+            if not conflito_de_horario(erro):
+                raise
+            logging.debug('a nova data da consulta conflita com outra consulta do profissional.')
+            return resposta_conflito_na_edicao(data_agendamento, instance.profissional_id)
+
+        if not gravada:
+            logging.debug(f'a consulta {instance.id} foi alterada por outra requisição.')
+            return resposta_versao_desatualizada()
+        if not consulta_ativa:
+            logging.debug('a consulta foi desativada com sucesso.')
+        return Response(serializer.data, headers={'ETag': etag_da_consulta(instance)})
     
 
 class ConsultasPorProfissional(generics.ListAPIView):
     serializer_class = SerializerConsultas
+    permission_classes = [IsAuthenticated]
+    pagination_class = AgendaCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AgendaFilter
 
     def get_queryset(self):
         profissional_id = self.kwargs['profissional_id']
-        return AgendamentosConsultas.objects.filter(
-            profissional_id=profissional_id,
-            consulta_ativa=True  
-        ).order_by('data_consulta')
+        return AgendamentosConsultas.objects.agenda_do_profissional(profissional_id)
 
     def list(self, request, *args, **kwargs):
-        
-        # 1. check de token 
-        payload, error = check_login(request)
-        if error:
-            return error
+        #a chave (com a versão da agenda) é lida antes do banco: uma edição no meio do caminho
+        #troca a versão e a página montada aqui fica na chave antiga, que ninguém mais lê
+        chave = chave_da_pagina(self.kwargs['profissional_id'], request)
+        dados = ler_pagina(chave)
+        if dados is not None:
+            return Response(dados)
 
         queryset = self.filter_queryset(self.get_queryset())
 
-        # 3. Check de existencia do profissional
-        if not queryset.exists():
+        # 3. página das consultas em uma única query. sem consultas na primeira página
+        # o profissional não existe (ou não tem agenda), sem precisar de um exists() antes.
+        page = self.paginate_queryset(queryset)
+        if not page and self.paginator.primeira_pagina() and not self.agenda_existe_fora_do_filtro():
             logging.debug('o profissional informado não está cadastrado.')
             return Response(
                 {'error': 'Profissional não encontrado'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # 4. filtro paginado das consultas.
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        gravar_pagina(chave, response.data)
+        return response
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
-    
-    
-   
\ No newline at end of file
+    def agenda_existe_fora_do_filtro(self):
+        #com filtros, página vazia só quer dizer que nada caiu na faixa pedida
+        filtros = set(AgendaFilter.base_filters) & set(self.request.query_params)
+        return bool(filtros) and self.get_queryset().exists()
+
+
+class DisponibilidadeProfissional(APIView):
+    permission_classes = [IsAuthenticated]
+    MAXIMO_DIAS = 62
+
+    def get(self, request, profissional_id):
+        try:
+            profissional = Profissionais.objects.get(id=profissional_id, ativo=True)
+        except Profissionais.DoesNotExist:
+            logging.debug(f'o profissional {profissional_id} não existe ou está inativo.')
+            return Response(
+                {'error': 'Profissional não encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        # período padrão: os próximos 7 dias
+        try:
+            inicio = ler_data(request, 'inicio') or timezone.localdate()
+            fim = ler_data(request, 'fim') or inicio + timedelta(days=6)
+        except ValueError:
+            return Response(
+                {"erro": "Formato de data inválido, use AAAA-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if fim < inicio or (fim - inicio).days >= self.MAXIMO_DIAS:
+            return Response(
+                {"erro": f"Informe um período de até {self.MAXIMO_DIAS} dias com 'fim' depois de 'inicio'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'profissional': profissional.id,
+            'duracao_consulta': profissional.duracao_consulta,
+            'dias': horarios_livres(profissional, inicio, fim),
+        })
+
+
+class ProfissionaisDisponiveis(APIView):
+    #"quem está livre nesse horário": profissionais de uma profissão com horário livre na janela pedida
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profissao = request.query_params.get('profissao')
+        try:
+            inicio = self.ler_horario('inicio')
+            fim = self.ler_horario('fim')
+        except ValueError:
+            return Response(
+                {"erro": "Formato de data inválido, use AAAA-MM-DDTHH:MM."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not profissao or not inicio or not fim:
+            return Response(
+                {"erro": "Informe 'profissao', 'inicio' e 'fim'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if fim <= inicio or timezone.localdate(inicio) != timezone.localdate(fim):
+            return Response(
+                {"erro": "A janela deve começar e terminar no mesmo dia, com 'fim' depois de 'inicio'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'profissao': profissao,
+            'inicio': inicio,
+            'fim': fim,
+            'profissionais': [
+                {
+                    'id': profissional.id,
+                    'nome_social': profissional.nome_social,
+                    'endereco': profissional.endereco,
+                    'preco_consulta': profissional.preco_consulta,
+                    'duracao_consulta': profissional.duracao_consulta,
+                    'horarios': horarios,
+                }
+                for profissional, horarios in profissionais_livres(profissao, inicio, fim)
+            ],
+        })
+
+    def ler_horario(self, parametro):
+        valor = self.request.query_params.get(parametro)
+        if not valor:
+            return None
+        horario = parse_datetime(valor)
+        if horario is None:
+            raise ValueError(valor)
+        return horario if timezone.is_aware(horario) else timezone.make_aware(horario)
+
+
+class ExportarConsultas(APIView):
+    #consultas com os pagamentos para o fechamento do mês, em CSV ou NDJSON, sem carregar tudo na memória
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response(
+                {"erro": f"Formato '{formato}' inválido, use csv ou ndjson."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            inicio = ler_data(request, 'inicio')
+            fim = ler_data(request, 'fim')
+        except ValueError:
+            return Response(
+                {"erro": "Formato de data inválido, use AAAA-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(
+            exportar(consultas_para_exportar(inicio, fim), formato), content_type=FORMATOS[formato]
+        )
+        response['Content-Disposition'] = f'attachment; filename="consultas.{formato}"'
+        return response
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lacreisaude.settings")
 
 application = get_asgi_application()
+
+from django.core.signals import request_started  # noqa: E402
+from lacreisaude.invalidacao import iniciar_ouvinte  # noqa: E402
+
+request_started.connect(iniciar_ouvinte, dispatch_uid='iniciar_ouvinte_invalidacao')
@@ -0,0 +1,141 @@
+"""
+Barramento de invalidação entre os nós da aplicação, pelo LISTEN/NOTIFY do Postgres.
+
+Cada processo tem caches próprios (tokens dos usuários, agenda no LocMemCache...). Quando um
+registro muda, o processo que gravou invalida o próprio cache pelos signals de sempre e
+publica o assunto e os ids no canal; o OuvinteInvalidacao dos outros processos recebe a
+mensagem e chama as funções assinadas para aquele assunto.
+
+Assuntos publicados (só os que têm cache local assinado):
+    'users.user'                  id do usuário
+    'consultas.agenda'            id do profissional cuja agenda mudou
+"""
+import json
+import logging
+import select
+import threading
+import uuid
+from django.conf import settings
+from django.db import connection, connections
+
+CANAL = 'lacreisaude_invalidacao'
+# o payload do NOTIFY vai até 8000 bytes: listas maiores são divididas em várias mensagens
+IDS_POR_MENSAGEM = 500
+# identifica este processo, que ignora as próprias mensagens (já invalidou pelos signals)
+ORIGEM = uuid.uuid4().hex
+
+# assunto -> [(invalidar(id), limpar() ou None)]
+ASSINATURAS = {}
+
+
+def assinar(assunto, invalidar, limpar=None):
+    """
+    'invalidar' recebe cada id publicado por outro processo. 'limpar' esvazia o cache inteiro
+    e é chamado quando o ouvinte reconecta, porque as mensagens do intervalo se perderam.
+    """
+    ASSINATURAS.setdefault(assunto, []).append((invalidar, limpar))
+
+
+def publicar(assunto, ids):
+    """
+    Publica os ids na transação atual: o Postgres só entrega o NOTIFY no commit e o descarta
+    no rollback. Mensagens iguais na mesma transação são entregues uma vez só.
+    """
+    if not settings.INVALIDACAO_ENTRE_NOS:
+        return
+    ids = sorted({id for id in ids if id is not None})
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(ids), IDS_POR_MENSAGEM):
+            mensagem = {'origem': ORIGEM, 'assunto': assunto, 'ids': ids[inicio:inicio + IDS_POR_MENSAGEM]}
+            cursor.execute('SELECT pg_notify(%s, %s)', [CANAL, json.dumps(mensagem)])
+
+
+def despachar(payload, origem=ORIGEM):
+    try:
+        mensagem = json.loads(payload)
+    except ValueError:
+        logging.debug(f'mensagem de invalidação inválida: {payload!r}')
+        return
+    if mensagem.get('origem') == origem:
+        return
+    for invalidar, _ in ASSINATURAS.get(mensagem.get('assunto'), ()):
+        for id in mensagem.get('ids', ()):
+            invalidar(id)
+
+
+def limpar_caches():
+    for assinaturas in ASSINATURAS.values():
+        for _, limpar in assinaturas:
+            if limpar is not None:
+                limpar()
+
+
+class OuvinteInvalidacao(threading.Thread):
+    """
+    Thread que escuta o canal em uma conexão própria (autocommit, fora das conexões do Django
+    usadas pelas requisições) e reconecta sozinha se o banco cair.
+    """
+
+    def __init__(self, alias='default', origem=ORIGEM, intervalo=5.0, espera_reconexao=1.0):
+        super().__init__(name='ouvinte-invalidacao', daemon=True)
+        self.alias = alias
+        self.origem = origem
+        self.intervalo = intervalo
+        self.espera_reconexao = espera_reconexao
+        self.conectado = threading.Event()
+        self._parar = threading.Event()
+
+    def run(self):
+        primeira = True
+        while not self._parar.is_set():
+            try:
+                self.escutar(limpar=not primeira)
+            except Exception as erro:
+                logging.debug(f'ouvinte de invalidação desconectado: {erro}')
+            primeira = False
+            self._parar.wait(self.espera_reconexao)
+
+    def escutar(self, limpar):
+        banco = connections.create_connection(self.alias)
+        try:
+            banco.ensure_connection()
+            conexao = banco.connection
+            with conexao.cursor() as cursor:
+                cursor.execute(f'LISTEN {CANAL}')
+            if limpar:
+                limpar_caches()
+            self.conectado.set()
+            while not self._parar.is_set():
+                if select.select([conexao], [], [], self.intervalo) == ([], [], []):
+                    continue
+                conexao.poll()
+                while conexao.notifies:
+                    despachar(conexao.notifies.pop(0).payload, self.origem)
+        finally:
+            self.conectado.clear()
+            banco.close()
+
+    def parar(self):
+        self._parar.set()
+
+
+_ouvinte = None
+_lock = threading.Lock()
+
+
+def iniciar_ouvinte(**kwargs):
+    """
+    Um ouvinte por processo. O wsgi/asgi liga esta função ao request_started: a thread começa
+    na primeira requisição de cada worker, depois do fork (com preload, uma thread iniciada no
+    processo mestre não existe nos filhos). Comandos e testes não escutam.
+    """
+    global _ouvinte
+    if not settings.INVALIDACAO_ENTRE_NOS:
+        return None
+    if _ouvinte is not None and _ouvinte.is_alive():
+        return _ouvinte
+    with _lock:
+        if _ouvinte is None or not _ouvinte.is_alive():
+            _ouvinte = OuvinteInvalidacao()
+            _ouvinte.start()
+    return _ouvinte
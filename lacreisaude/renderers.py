@@ -0,0 +1,47 @@
+"""
+Renderer e parser JSON do DRF com o orjson, configurados em REST_FRAMEWORK.
+
+A saída é a mesma do JSONRenderer padrão: datas, Decimal, lazy strings e os outros tipos que o
+orjson não conhece (ou formata diferente, como datetime) passam pelo encoder do próprio DRF.
+A diferença: NaN e Infinity em floats saem como null, em vez do ValueError do STRICT_JSON.
+"""
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# datetime, date e time no formato do DRF (milissegundos e 'Z' no UTC), e não no do orjson
+OPCOES = orjson.OPT_PASSTHROUGH_DATETIME
+_encoder = JSONEncoder()
+
+
+class OrjsonRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        #o orjson só gera JSON compacto e em UTF-8 (o padrão do DRF). indentação pedida no Accept,
+        #ensure_ascii e NaN permitido (STRICT_JSON=False) ficam com o renderer padrão
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=OPCOES)
+        except orjson.JSONEncodeError:
+            #inteiros acima de 64 bits, chaves que não são str...
+            return super().render(data, accepted_media_type, renderer_context)
+        #como o JSONRenderer: U+2028 e U+2029 escapados para o JSON valer como JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class OrjsonParser(JSONParser):
+    renderer_class = OrjsonRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -23,6 +23,37 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 ASAAS_ACCESS_TOKEN = os.getenv('ASAAS_ACCESS_TOKEN')
 TOKEN_ASAAS_ACESSO_API = os.getenv('ASAAS_WEBHOOK_TOKEN')
 
+# cliente HTTP do Asaas (clientes/asaas.py): pool keep-alive por processo e timeouts separados
+ASAAS_API_URL = os.getenv('ASAAS_API_URL', 'https://api-sandbox.asaas.com/v3/')
+ASAAS_POOL_CONEXOES = int(os.getenv('ASAAS_POOL_CONEXOES', 10))
+ASAAS_TENTATIVAS = int(os.getenv('ASAAS_TENTATIVAS', 2))  # só para métodos idempotentes
+ASAAS_TIMEOUT_CONEXAO = float(os.getenv('ASAAS_TIMEOUT_CONEXAO', 3.05))
+ASAAS_TIMEOUT_LEITURA = float(os.getenv('ASAAS_TIMEOUT_LEITURA', 15))
+# circuit breaker (clientes/circuito.py): abre após N falhas seguidas e recusa chamadas por alguns segundos
+ASAAS_CIRCUITO_LIMITE_FALHAS = int(os.getenv('ASAAS_CIRCUITO_LIMITE_FALHAS', 5))
+ASAAS_CIRCUITO_TEMPO_ABERTO = float(os.getenv('ASAAS_CIRCUITO_TEMPO_ABERTO', 30))
+
+# cache das páginas da agenda por profissional (consultas/cache_agenda.py). o LocMemCache vale só
+# para o processo; com mais de um processo use um backend compartilhado, como o FileBasedCache
+# (CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache, CACHE_LOCATION=/var/tmp/lacreisaude)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'lacreisaude'),
+    }
+}
+AGENDA_CACHE_TIMEOUT = int(os.getenv('AGENDA_CACHE_TIMEOUT', 300))
+# invalidação dos caches locais entre os nós pelo LISTEN/NOTIFY do Postgres (lacreisaude/invalidacao.py)
+INVALIDACAO_ENTRE_NOS = os.getenv('INVALIDACAO_ENTRE_NOS', 'true').lower() == 'true'
+
+# por quanto tempo a resposta de um POST com Idempotency-Key é devolvida nas repetições (users/idempotencia.py)
+IDEMPOTENCIA_TTL_HORAS = int(os.getenv('IDEMPOTENCIA_TTL_HORAS', 24))
+# quanto tempo a marca de "em andamento" segura a chave (acima do timeout das chamadas ao Asaas)
+IDEMPOTENCIA_EM_ANDAMENTO_SEGUNDOS = int(os.getenv('IDEMPOTENCIA_EM_ANDAMENTO_SEGUNDOS', 60))
+
+# quantidade máxima de access tokens verificados mantidos em memória por processo
+CACHE_TOKENS_MAX_ENTRADAS = int(os.getenv('CACHE_TOKENS_MAX_ENTRADAS', 1024))
+
 
 
 # Quick-start development settings - unsuitable for production
@@ -46,8 +77,10 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     'drf_yasg',
     'rest_framework',
+    'django_filters',
     'corsheaders',
     "profissionais",
     "consultas",
@@ -64,6 +97,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "users.middleware.RenovacaoTokensMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -166,8 +200,19 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.CookieJWTAuthentication',
         'rest_framework_simplejwt.authentication.JWTAuthentication',    
-    ]
+    ],
+    # JSON com o orjson, mesma saída do JSONRenderer padrão (lacreisaude/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'lacreisaude.renderers.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'lacreisaude.renderers.OrjsonParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
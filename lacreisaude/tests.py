@@ -0,0 +1,133 @@
+import io
+import json
+import queue
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+from . import invalidacao
+from .renderers import OrjsonParser, OrjsonRenderer
+
+
+class DespacharTestCase(SimpleTestCase):
+    def mensagem(self, origem, ids):
+        return json.dumps({'origem': origem, 'assunto': 'users.user', 'ids': ids})
+
+    def test_chama_as_assinaturas_para_cada_id(self):
+        invalidar = MagicMock()
+        with patch.dict(invalidacao.ASSINATURAS, {'users.user': [(invalidar, None)]}):
+            invalidacao.despachar(self.mensagem('outro-no', [1, 2]))
+        self.assertEqual([c.args for c in invalidar.call_args_list], [(1,), (2,)])
+
+    def test_ignora_as_proprias_mensagens_e_payload_invalido(self):
+        invalidar = MagicMock()
+        with patch.dict(invalidacao.ASSINATURAS, {'users.user': [(invalidar, None)]}):
+            invalidacao.despachar(self.mensagem(invalidacao.ORIGEM, [1]))
+            invalidacao.despachar('não é json')
+        invalidar.assert_not_called()
+
+
+class OuvinteInvalidacaoTestCase(TransactionTestCase):
+    def setUp(self):
+        self.recebidos = queue.Queue()
+        assinaturas = patch.dict(invalidacao.ASSINATURAS, {
+            'users.user': [(self.recebidos.put, None)],
+        })
+        assinaturas.start()
+        self.addCleanup(assinaturas.stop)
+
+        #outra origem: a thread faz o papel de outro nó
+        self.ouvinte = invalidacao.OuvinteInvalidacao(origem='outro-no', intervalo=0.1)
+        self.ouvinte.start()
+        self.addCleanup(self.ouvinte.join, 5)
+        self.addCleanup(self.ouvinte.parar)
+        self.assertTrue(self.ouvinte.conectado.wait(5))
+
+    def criar_usuario(self):
+        return get_user_model().objects.create_user(
+            email='barramento@teste.com', password='senha123', nome_social='Barramento',
+        )
+
+    def test_outro_no_recebe_a_alteracao(self):
+        usuario = self.criar_usuario()
+        self.assertEqual(self.recebidos.get(timeout=5), usuario.id)
+
+    def test_rollback_nao_publica(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.criar_usuario()
+                raise RuntimeError
+        with self.assertRaises(queue.Empty):
+            self.recebidos.get(timeout=0.5)
+
+
+class IniciarOuvinteTestCase(SimpleTestCase):
+    def setUp(self):
+        anterior = invalidacao._ouvinte
+        self.addCleanup(setattr, invalidacao, '_ouvinte', anterior)
+        invalidacao._ouvinte = None
+
+    @patch.object(invalidacao, 'OuvinteInvalidacao')
+    def test_uma_thread_por_processo_e_reiniciada_depois_do_fork(self, ouvinte):
+        self.assertIs(invalidacao.iniciar_ouvinte(sender=None), ouvinte.return_value)
+        invalidacao.iniciar_ouvinte(sender=None)
+        self.assertEqual(ouvinte.return_value.start.call_count, 1)
+
+        #no filho de um fork a thread do pai não existe mais
+        ouvinte.return_value.is_alive.return_value = False
+        invalidacao.iniciar_ouvinte(sender=None)
+        self.assertEqual(ouvinte.return_value.start.call_count, 2)
+
+    @patch.object(invalidacao, 'OuvinteInvalidacao')
+    def test_desligado_nas_configuracoes(self, ouvinte):
+        with self.settings(INVALIDACAO_ENTRE_NOS=False):
+            self.assertIsNone(invalidacao.iniciar_ouvinte())
+        ouvinte.assert_not_called()
+
+
+class OrjsonRendererTestCase(SimpleTestCase):
+    def assertMesmaSaida(self, data, **kwargs):
+        self.assertEqual(OrjsonRenderer().render(data, **kwargs), JSONRenderer().render(data, **kwargs))
+
+    def test_mesma_saida_do_json_renderer(self):
+        sao_paulo = timezone.get_fixed_timezone(-180)
+        self.assertMesmaSaida(ReturnDict({
+            'preco_consulta': Decimal('150.00'),
+            'utc': datetime(2026, 10, 18, 14, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'sao_paulo': datetime(2026, 10, 18, 14, 30, tzinfo=sao_paulo),
+            'dia': date(2026, 10, 18),
+            'hora': time(14, 30),
+            'duracao': timedelta(minutes=30),
+            'id': uuid.UUID(int=1),
+            'mensagem': gettext_lazy('Não é possível agendar'),
+            'lista': [1, 2.5, None, True, 'consulta\u2028agendada'],
+        }, serializer=None))
+
+    def test_indentacao_e_inteiros_grandes_usam_o_renderer_padrao(self):
+        self.assertMesmaSaida({'a': [1, 2]}, accepted_media_type='application/json; indent=4')
+        self.assertMesmaSaida({'grande': 2 ** 70, 1: 'chave inteira'})
+
+    def test_none_vira_corpo_vazio(self):
+        self.assertEqual(OrjsonRenderer().render(None), b'')
+
+
+class OrjsonParserTestCase(SimpleTestCase):
+    def test_le_o_corpo(self):
+        corpo = '{"nome_social": "Usuário", "numero": 11, "itens": [1.5, null]}'.encode()
+        self.assertEqual(OrjsonParser().parse(io.BytesIO(corpo)), {
+            'nome_social': 'Usuário', 'numero': 11, 'itens': [1.5, None],
+        })
+
+    def test_json_invalido(self):
+        with self.assertRaises(ParseError):
+            OrjsonParser().parse(io.BytesIO(b'{"nome": '))
+        with self.assertRaises(ParseError):
+            OrjsonParser().parse(io.BytesIO(b'{"preco": NaN}'))
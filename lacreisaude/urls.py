@@ -38,7 +38,7 @@ urlpatterns = [
     path('', include('consultas.urls')),
     path('users/', include ('users.urls')),
     path('clients/', include ('clientes.urls')),
+    path('', include('django_prometheus.urls')),
     path('', schema_view.with_ui('swagger', cache_timeout=0)),
-    #path('', include('django_prometheus.urls')), a ser implementado.
 
 ]
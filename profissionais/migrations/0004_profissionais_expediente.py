@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-18 06:42
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profissionais", "0003_profissionais_preco_consulta"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profissionais",
+            name="dias_atendimento",
+            field=models.PositiveSmallIntegerField(default=31),
+        ),
+        migrations.AddField(
+            model_name="profissionais",
+            name="duracao_consulta",
+            field=models.PositiveSmallIntegerField(default=30),
+        ),
+        migrations.AddField(
+            model_name="profissionais",
+            name="fim_expediente",
+            field=models.TimeField(default=datetime.time(18, 0)),
+        ),
+        migrations.AddField(
+            model_name="profissionais",
+            name="inicio_expediente",
+            field=models.TimeField(default=datetime.time(8, 0)),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.2 on 2026-10-18 06:45
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profissionais", "0004_profissionais_expediente"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="profissionais",
+            index=models.Index(
+                django.db.models.functions.text.Upper("profissao"),
+                condition=models.Q(("ativo", True)),
+                name="profissional_profissao_idx",
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.functions import Upper
+from datetime import time
 
 class Profissionais(models.Model):
     id = models.AutoField(primary_key=True)
@@ -8,7 +10,17 @@ class Profissionais(models.Model):
     contato = models.CharField(max_length=11, null=False)
     preco_consulta= models.IntegerField(default=80)
     ativo = models.BooleanField(default=True)
+    # expediente usado no cálculo dos horários livres (consultas/disponibilidade.py)
+    inicio_expediente = models.TimeField(default=time(8, 0))
+    fim_expediente = models.TimeField(default=time(18, 0))
+    duracao_consulta = models.PositiveSmallIntegerField(default=30)  # minutos, múltiplo de 15
+    dias_atendimento = models.PositiveSmallIntegerField(default=0b0011111)  # bit 0 = segunda ... bit 6 = domingo
 
+    class Meta:
+        indexes = [
+            # busca de profissionais livres por profissão (profissao__iexact usa UPPER)
+            models.Index(Upper('profissao'), condition=models.Q(ativo=True), name='profissional_profissao_idx'),
+        ]
 
     def __str__(self):
         return f"Profissional:{self.nome_social} "
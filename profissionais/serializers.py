@@ -4,4 +4,17 @@ from .models import Profissionais
 class SerializerProfissionais(serializers.ModelSerializer):
     class Meta:
         model = Profissionais
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def validate_duracao_consulta(self, value):
+        #a agenda é uma grade de 15 minutos (consultas/disponibilidade.py)
+        if value == 0 or value % 15:
+            raise serializers.ValidationError("A duração da consulta deve ser um múltiplo de 15 minutos.")
+        return value
+
+    def validate(self, attrs):
+        inicio = attrs.get('inicio_expediente', getattr(self.instance, 'inicio_expediente', None))
+        fim = attrs.get('fim_expediente', getattr(self.instance, 'fim_expediente', None))
+        if inicio and fim and inicio >= fim:
+            raise serializers.ValidationError({"fim_expediente": "O fim do expediente deve ser depois do início."})
+        return attrs
@@ -5,29 +5,15 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Profissionais
 from .serializers import SerializerProfissionais
-from consultas.views import check_login
 from consultas.models import AgendamentosConsultas
 import logging, sys
 
 class CadastroProfissionais(generics.ListCreateAPIView):
     queryset = Profissionais.objects.all()
     serializer_class = SerializerProfissionais
-    
-    def list(self, request, *args, **kwargs):
-        #verifica se o usuario está autenticado para exibir os profissionais.
-        payload, error = check_login(request)
-        if error:
-            logging.debug('usuário não conectado tentou listar os profissionais.')
-            return error
-        return super().list(request, *args, **kwargs)
+    permission_classes = [IsAuthenticated] #só lista e cria profissionais se o usuário estiver logado.
     
     def create(self, request, *args, **kwargs):
-        #só criar o novo profissional se o usuário estiver logado.
-        payload, error = check_login(request)
-        if error:
-            logging.debug('usuário não conectado tentou criar novos profissionais.')
-            return error   
-             
         logging.debug(f'profissional {request.data.get("nome_social")} cadastrado.')
         return super().create(request, *args, **kwargs)
         
@@ -37,16 +23,10 @@ class EditarExcluirProfissionais(generics.RetrieveUpdateDestroyAPIView):
     queryset = Profissionais.objects.all()
     http_method_names = ['patch', 'delete']  
     serializer_class = SerializerProfissionais
+    permission_classes = [IsAuthenticated]
    
     
     def patch(self, request, *args, **kwargs): #edita o profissional de saúde
-        
-        payload, error = check_login(request)
-        if error:
-            logging.debug('usuário não conectado tentou editar os profissionais.')
-            return error
-        
-
         try:
             instance = self.get_queryset().get(pk=kwargs.get('pk'))
         except Profissionais.DoesNotExist:
@@ -64,11 +44,6 @@ class EditarExcluirProfissionais(generics.RetrieveUpdateDestroyAPIView):
     
     def destroy(self, request, *args, **kwargs):
         #deleta o profissional
-        payload, error = check_login(request)
-        if error:
-            logging.debug('usuário não conectado tentou excluir um profissional.')
-            return error
-        
         try:
             profissional = self.get_object()
         except Profissionais.DoesNotExist:
@@ -78,11 +53,8 @@ class EditarExcluirProfissionais(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        consultas_futuras = AgendamentosConsultas.objects.filter(
-        profissional=profissional,
-        data_consulta__gte=timezone.now(),
-        consulta_ativa=True,  # Pesquisa consultas futuras para esse profissional.
-        ).exists()
+        # Pesquisa consultas futuras para esse profissional.
+        consultas_futuras = AgendamentosConsultas.objects.futuras_do_profissional(profissional.id).exists()
         if consultas_futuras:
             logging.debug(f'Não foi possivel excluir o profissional {request.data.get('nome_social')}, Ele possui consultas futuras.')
             return Response(
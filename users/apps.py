@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from lacreisaude.invalidacao import assinar
+        from .utils.cache_tokens import cache_tokens
+        assinar('users.user', cache_tokens.invalidar_usuario, cache_tokens.limpar)
@@ -0,0 +1,53 @@
+import jwt
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from .models import User
+from .utils.jwt_utils import obter_usuario_do_access_token, renovar_tokens
+
+
+class CookieJWTAuthentication(BaseAuthentication):
+    """
+    Autentica pelo cookie 'access_token'.
+
+    Se o access token expirou e o refresh token é válido, o usuário é autenticado
+    normalmente e os novos tokens ficam em request.tokens_renovados para que o
+    RenovacaoTokensMiddleware grave os cookies na resposta do próprio endpoint.
+    """
+
+    def authenticate(self, request):
+        access_token = request.COOKIES.get('access_token')
+        if not access_token:
+            return None
+
+        try:
+            user = obter_usuario_do_access_token(access_token)
+            return user, None
+
+        except User.DoesNotExist:
+            raise AuthenticationFailed('Usuário associado ao token não encontrado.')
+
+        except jwt.ExpiredSignatureError:
+            return self.renovar_sessao(request)
+
+        except jwt.InvalidTokenError:
+            raise AuthenticationFailed('Token de acesso inválido.')
+
+    def renovar_sessao(self, request):
+        # o access token expirou, tenta usar o refresh token.
+        refresh_token = request.COOKIES.get('refresh_token')
+        if not refresh_token:
+            raise AuthenticationFailed('Sessão expirada. Faça login novamente.')
+
+        try:
+            user, novos_tokens = renovar_tokens(refresh_token)
+        except jwt.ExpiredSignatureError:
+            raise AuthenticationFailed('Sessão expirada. Faça login novamente.')
+        except (jwt.InvalidTokenError, User.DoesNotExist):
+            raise AuthenticationFailed('Não foi possível validar a sessão.')
+
+        request._request.tokens_renovados = novos_tokens
+        return user, None
+
+    def authenticate_header(self, request):
+        # garante 401 (e não 403) quando o usuário não está autenticado
+        return 'Cookie realm="api"'
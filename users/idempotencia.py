@@ -0,0 +1,104 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import ChaveIdempotencia
+
+
+def hash_da_requisicao(request):
+    corpo = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path} {corpo}'.encode()).hexdigest()
+
+
+class IdempotenciaMixin:
+    """
+    Suporte ao cabeçalho Idempotency-Key no POST de views autenticadas. Envolve o post(),
+    e não o create(), para cobrir também o que as views fazem no próprio create().
+
+    A primeira requisição com a chave grava uma marca de "em andamento" numa transação curta
+    e executa a view fora dela (sem lock aberto durante a chamada ao Asaas). A resposta é
+    gravada no fim, por usuário e rota, até IDEMPOTENCIA_TTL_HORAS. Uma repetição com o mesmo
+    corpo recebe a mesma resposta, sem executar a view de novo; com outro corpo, recebe 422.
+    Repetições que chegam enquanto a primeira ainda roda recebem 409. Uma marca esquecida por
+    um processo que morreu vale por IDEMPOTENCIA_EM_ANDAMENTO_SEGUNDOS. Respostas 5xx e erros
+    levantados como exceção (validação do serializer) liberam a chave.
+    """
+
+    def post(self, request, *args, **kwargs):
+        chave = request.headers.get('Idempotency-Key')
+        if not chave:
+            return super().post(request, *args, **kwargs)
+        if len(chave) > ChaveIdempotencia._meta.get_field('chave').max_length:
+            return Response(
+                {"erro": "O cabeçalho Idempotency-Key deve ter no máximo 255 caracteres."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        registro, resposta = self.reservar_chave(request, chave)
+        if resposta is not None:
+            return resposta
+
+        try:
+            response = super().post(request, *args, **kwargs)
+        except Exception:
+            ChaveIdempotencia.objects.filter(pk=registro.pk).delete()
+            raise
+        if response.status_code >= 500:
+            #o cliente pode tentar de novo com a mesma chave
+            ChaveIdempotencia.objects.filter(pk=registro.pk).delete()
+            return response
+
+        ChaveIdempotencia.objects.filter(pk=registro.pk).update(
+            status_resposta=response.status_code,
+            resposta=json.dumps(response.data, cls=DjangoJSONEncoder, ensure_ascii=False),
+            expira_em=timezone.now() + timedelta(hours=settings.IDEMPOTENCIA_TTL_HORAS),
+        )
+        return response
+
+    def reservar_chave(self, request, chave):
+        """
+        Devolve o registro da chave e, quando a view não deve ser executada, a resposta pronta.
+        O lock da linha dura só esta transação.
+        """
+        hash_requisicao = hash_da_requisicao(request)
+        agora = timezone.now()
+        em_andamento_ate = agora + timedelta(seconds=settings.IDEMPOTENCIA_EM_ANDAMENTO_SEGUNDOS)
+        with transaction.atomic():
+            registro, criado = ChaveIdempotencia.objects.select_for_update().get_or_create(
+                usuario=request.user, rota=request.path, chave=chave,
+                defaults={'hash_requisicao': hash_requisicao, 'expira_em': em_andamento_ate},
+            )
+            if criado:
+                return registro, None
+
+            if registro.expira_em > agora:
+                if registro.hash_requisicao != hash_requisicao:
+                    logging.debug(f'Idempotency-Key {chave} reutilizada com outro corpo.')
+                    return registro, Response(
+                        {"erro": "Esta Idempotency-Key já foi usada com outra requisição."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if registro.status_resposta is None:
+                    logging.debug(f'Idempotency-Key {chave} ainda em processamento.')
+                    return registro, Response(
+                        {"erro": "Uma requisição com esta Idempotency-Key ainda está em processamento."},
+                        status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'}
+                    )
+                logging.debug(f'repetição da requisição com Idempotency-Key {chave}, devolvendo a resposta original.')
+                return registro, Response(
+                    json.loads(registro.resposta), status=registro.status_resposta, headers={'Idempotent-Replayed': 'true'}
+                )
+
+            #expirada (ou marca de um processo que morreu): vale como uma chave nova
+            registro.hash_requisicao = hash_requisicao
+            registro.status_resposta = None
+            registro.resposta = None
+            registro.expira_em = em_andamento_ate
+            registro.save()
+        return registro, None
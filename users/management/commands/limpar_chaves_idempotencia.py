@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from users.models import ChaveIdempotencia
+
+
+class Command(BaseCommand):
+    help = 'Apaga as chaves de Idempotency-Key expiradas (IDEMPOTENCIA_TTL_HORAS).'
+
+    def handle(self, *args, **options):
+        apagadas, _ = ChaveIdempotencia.objects.filter(expira_em__lte=timezone.now()).delete()
+        self.stdout.write(f'{apagadas} chave(s) expirada(s) apagada(s).')
@@ -0,0 +1,18 @@
+from .utils.jwt_utils import definir_cookies_token
+
+
+class RenovacaoTokensMiddleware:
+    """
+    Grava nos cookies os tokens renovados pelo CookieJWTAuthentication,
+    junto com a resposta real do endpoint (sem exigir uma segunda requisição).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        novos_tokens = getattr(request, 'tokens_renovados', None)
+        if novos_tokens:
+            definir_cookies_token(response, novos_tokens)
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.2 on 2026-10-18 07:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChaveIdempotencia",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rota", models.CharField(max_length=100)),
+                ("chave", models.CharField(max_length=255)),
+                ("hash_requisicao", models.CharField(max_length=64)),
+                ("status_resposta", models.PositiveSmallIntegerField(null=True)),
+                ("resposta", models.TextField(null=True)),
+                ("expira_em", models.DateTimeField(db_index=True)),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("usuario", "rota", "chave"),
+                        name="chave_idempotencia_unica",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -25,3 +25,19 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+
+
+class ChaveIdempotencia(models.Model):
+    # resposta de um POST com o cabeçalho Idempotency-Key, devolvida de novo nas repetições (users/idempotencia.py)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    rota = models.CharField(max_length=100)
+    chave = models.CharField(max_length=255)
+    hash_requisicao = models.CharField(max_length=64)  # sha256 do método, rota e corpo
+    status_resposta = models.PositiveSmallIntegerField(null=True)
+    resposta = models.TextField(null=True)  # corpo da resposta em JSON
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'rota', 'chave'], name='chave_idempotencia_unica'),
+        ]
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from lacreisaude.invalidacao import publicar
+from .models import User
+from .utils.cache_tokens import cache_tokens
+
+
+@receiver(post_save, sender=User)
+def invalidar_tokens_ao_salvar(sender, instance, **kwargs):
+    #qualquer alteração (senha, is_active, perfil): a próxima requisição lê o usuário do banco
+    cache_tokens.invalidar_usuario(instance.id)
+    publicar('users.user', [instance.id])
+
+
+@receiver(post_delete, sender=User)
+def invalidar_tokens_ao_excluir(sender, instance, **kwargs):
+    cache_tokens.invalidar_usuario(instance.id)
+    publicar('users.user', [instance.id])
@@ -3,7 +3,12 @@ from rest_framework.test import APIClient
 from rest_framework import status
 from django.urls import reverse
 from .models import User
-import json
+from .utils.jwt_utils import criar_token, obter_usuario_do_access_token
+from .utils.cache_tokens import cache_tokens, CacheTokens
+from django.conf import settings
+from prometheus_client import REGISTRY
+from datetime import datetime, timedelta, timezone
+import json, time, jwt
 
 class RegistroUsuarioTests(TestCase):
     def setUp(self):
@@ -164,4 +169,154 @@ class LoginUsuarioTests(TestCase):
         }
         response = self.client.post(self.base_url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('email', response.data)                        
\ No newline at end of file
+        self.assertIn('email', response.data)                        
+
+class CacheTokensTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='cache@teste.com',
+            password='senhacorreta123',
+            nome_social='Usuário Cache'
+        )
+        self.token = criar_token(self.user)['access']
+        cache_tokens.limpar()
+
+    def test_token_repetido_nao_consulta_o_banco(self):
+        user = obter_usuario_do_access_token(self.token)
+        self.assertEqual(user, self.user)
+
+        with self.assertNumQueries(0):
+            user = obter_usuario_do_access_token(self.token)
+        self.assertEqual(user.id, self.user.id)
+
+        estatisticas = cache_tokens.estatisticas()
+        self.assertEqual(estatisticas['acertos'], 1)
+        self.assertEqual(estatisticas['falhas'], 1)
+
+    def test_acertos_e_falhas_no_prometheus(self):
+        def amostra(resultado):
+            return REGISTRY.get_sample_value('cache_tokens_consultas_total', {'resultado': resultado}) or 0
+        acertos, falhas = amostra('hit'), amostra('miss')
+        obter_usuario_do_access_token(self.token)
+        obter_usuario_do_access_token(self.token)
+        self.assertEqual((amostra('hit'), amostra('miss')), (acertos + 1, falhas + 1))
+
+    def test_troca_de_senha_invalida_o_cache(self):
+        obter_usuario_do_access_token(self.token)
+        self.user.set_password('novasenha456')
+        self.user.save()
+
+        self.assertEqual(cache_tokens.estatisticas()['entradas'], 0)
+
+    def test_usuario_desativado_perde_acesso(self):
+        obter_usuario_do_access_token(self.token)
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+
+        with self.assertRaises(User.DoesNotExist):
+            obter_usuario_do_access_token(self.token)
+
+    def test_acerto_devolve_uma_copia(self):
+        primeira = obter_usuario_do_access_token(self.token)
+        segunda = obter_usuario_do_access_token(self.token)
+        self.assertIsNot(primeira, segunda)
+        primeira.nome_social = 'alterado só nesta requisição'
+        self.assertEqual(obter_usuario_do_access_token(self.token).nome_social, 'Usuário Cache')
+
+    def test_alteracao_do_perfil_invalida_o_cache(self):
+        obter_usuario_do_access_token(self.token)
+        self.user.nome_social = 'Novo Nome'
+        self.user.save(update_fields=['nome_social'])
+
+        self.assertEqual(cache_tokens.estatisticas()['entradas'], 0)
+        self.assertEqual(obter_usuario_do_access_token(self.token).nome_social, 'Novo Nome')
+
+    def test_limite_de_entradas(self):
+        cache = CacheTokens(max_entradas=2)
+        for i in range(3):
+            cache.guardar(f'token-{i}', self.user, time.time() + 60)
+        self.assertIsNone(cache.obter('token-0'))
+        self.assertEqual(cache.obter('token-2'), self.user)
+
+    def test_entrada_expirada_nao_e_servida(self):
+        cache = CacheTokens()
+        cache.guardar('token-expirado', self.user, time.time() - 1)
+        self.assertIsNone(cache.obter('token-expirado'))
+
+
+class CookieJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/users/user/'
+        self.user = User.objects.create_user(
+            email='sessao@teste.com',
+            password='senhacorreta123',
+            nome_social='Usuário Sessão'
+        )
+        cache_tokens.limpar()
+
+    def _token_expirado(self):
+        payload = {
+            'id': self.user.id,
+            'token_type': 'access',
+            'exp': datetime.now(timezone.utc) - timedelta(minutes=1),
+            'iat': datetime.now(timezone.utc) - timedelta(minutes=61),
+        }
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+    def test_acesso_com_token_valido(self):
+        self.client.cookies['access_token'] = criar_token(self.user)['access']
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], self.user.email)
+        self.assertNotIn('access_token', response.cookies)
+
+    def test_sem_token_retorna_401(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_invalido_retorna_401(self):
+        self.client.cookies['access_token'] = 'token-invalido'
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_expirado_renova_na_propria_resposta(self):
+        """O endpoint responde normalmente e já devolve os novos cookies."""
+        self.client.cookies['access_token'] = self._token_expirado()
+        self.client.cookies['refresh_token'] = criar_token(self.user)['refresh']
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], self.user.email)
+        self.assertTrue(response.cookies['access_token'].value)
+        self.assertTrue(response.cookies['refresh_token'].value)
+
+        # o novo access token já é aceito sem renovação
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('access_token', response.cookies)
+
+    def test_token_expirado_sem_refresh_retorna_401(self):
+        self.client.cookies['access_token'] = self._token_expirado()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_invalidado_pela_troca_de_senha(self):
+        self.client.cookies['access_token'] = self._token_expirado()
+        self.client.cookies['refresh_token'] = criar_token(self.user)['refresh']
+        self.user.set_password('novasenha456')
+        self.user.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_ignora_cookie_expirado(self):
+        self.client.cookies['access_token'] = self._token_expirado()
+        response = self.client.post(
+            '/users/login/',
+            data=json.dumps({'email': 'sessao@teste.com', 'password': 'senhacorreta123'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
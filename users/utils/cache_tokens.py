@@ -0,0 +1,106 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from prometheus_client import Counter
+
+# taxa de acerto: rate(cache_tokens_consultas_total{resultado="hit"}[5m]) / rate(cache_tokens_consultas_total[5m])
+CONSULTAS_CACHE_TOKENS = Counter(
+    'cache_tokens_consultas',
+    'Leituras do cache em memória dos access tokens verificados',
+    ['resultado'],
+)
+
+
+class CacheTokens:
+    """
+    Cache LRU em memória (por processo) dos access tokens já verificados.
+
+    A chave é o sha256 do token, o valor é o usuário resolvido e o 'exp' do token.
+    Cada entrada vale até o 'exp' do token ou até ser invalidada pelos signals do usuário
+    (qualquer save). Cada acerto devolve uma cópia: a instância guardada não é compartilhada
+    entre requisições e threads.
+    """
+
+    def __init__(self, max_entradas=1024):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # digest -> (user, expira_em)
+        self._digests_por_usuario = {}  # user_id -> set(digest)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    @staticmethod
+    def gerar_chave(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def obter(self, token):
+        chave = self.gerar_chave(token)
+        agora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.falhas += 1
+                CONSULTAS_CACHE_TOKENS.labels(resultado='miss').inc()
+                return None
+            user, expira_em = entrada
+            if expira_em <= agora:
+                # token expirado não pode ser servido pelo cache
+                self._remover(chave)
+                self.falhas += 1
+                CONSULTAS_CACHE_TOKENS.labels(resultado='miss').inc()
+                return None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            CONSULTAS_CACHE_TOKENS.labels(resultado='hit').inc()
+        return copy.copy(user)
+
+    def guardar(self, token, user, exp):
+        chave = self.gerar_chave(token)
+        with self._lock:
+            self._remover(chave)
+            self._entradas[chave] = (copy.copy(user), exp)
+            self._digests_por_usuario.setdefault(user.id, set()).add(chave)
+            while len(self._entradas) > self.max_entradas:
+                chave_antiga = next(iter(self._entradas))
+                self._remover(chave_antiga)
+
+    def invalidar_usuario(self, user_id):
+        #remove todos os tokens do usuário (usuário alterado ou excluído)
+        with self._lock:
+            for chave in list(self._digests_por_usuario.get(user_id, ())):
+                self._remover(chave)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._digests_por_usuario.clear()
+            self.acertos = 0
+            self.falhas = 0
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                'entradas': len(self._entradas),
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': self.acertos / total if total else 0.0,
+            }
+
+    def _remover(self, chave):
+        # deve ser chamado com o lock adquirido
+        entrada = self._entradas.pop(chave, None)
+        if entrada is None:
+            return
+        user_id = entrada[0].id
+        digests = self._digests_por_usuario.get(user_id)
+        if digests is not None:
+            digests.discard(chave)
+            if not digests:
+                del self._digests_por_usuario[user_id]
+
+
+cache_tokens = CacheTokens(max_entradas=getattr(settings, 'CACHE_TOKENS_MAX_ENTRADAS', 1024))
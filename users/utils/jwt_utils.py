@@ -1,8 +1,8 @@
 import jwt
 from datetime import datetime, timedelta, timezone
 from django.conf import settings
-from django.http import JsonResponse
 from users.models import User
+from .cache_tokens import cache_tokens
 
 
 def criar_token(user):
@@ -42,72 +42,62 @@ def criar_token(user):
         'refresh': refresh_token
     }
 
-def verificar_token_cookies(request):
-    
-    access_token = request.COOKIES.get('access_token')
-
-    if not access_token:
-        return None, JsonResponse({'error': 'Token de acesso não encontrado.'}, status=401)
-
-    try:
-        # 1. Tenta decodificar o access token com a chave secreta principal
-        payload = jwt.decode(access_token, settings.SECRET_KEY, algorithms=['HS256'])
-        user = User.objects.get(id=payload['id'])
-        return user, None  
-
-    except User.DoesNotExist:
-        return None, JsonResponse({'error': 'Usuário associado ao token não encontrado.'}, status=401)
-
-    except jwt.ExpiredSignatureError:
-        # 2. Se o access token expirou, tenta usar o refresh token.
-        refresh_token = request.COOKIES.get('refresh_token')
-
-        if not refresh_token:
-            return None, JsonResponse({'error': 'Sessão expirada. Faça login novamente.'}, status=401)
-
-        try:
-            #  Decodifica o payload do refresh token SEM verificar a assinatura para obter o 'id' do usuário.
-            #  Isso é necessário para buscar o usuário e sua senha para construir a chave secreta correta.
-            unverified_payload = jwt.decode(refresh_token, options={"verify_signature": False})
-            
-            if unverified_payload.get('token_type') != 'refresh':
-                return None, JsonResponse({'error': 'Tipo de token inválido'}, status=401)
-
-            # Busca o usuário no banco de dados.
-            user = User.objects.get(id=unverified_payload['id']) 
-
-            # AGORA, constrói a chave secreta correta e verifica a assinatura do refresh token.
-            jwt.decode(
-                refresh_token,
-                settings.SECRET_KEY + user.password, 
-                algorithms=['HS256']
-            )
-
-            #gera os novos tokens
-            new_tokens = criar_token(user)
-
-            response = JsonResponse({'message': 'Tokens renovados com sucesso.'})
-            response.set_cookie(
-                key='access_token',
-                value=new_tokens['access'],
-                httponly=True,
-                secure=False,
-                samesite='Lax'
-            )
-            response.set_cookie(
-                key='refresh_token',
-                value=new_tokens['refresh'],
-                httponly=True,
-                secure=False,
-                samesite='Lax',
-            )
-            return user, response
-
-        except jwt.ExpiredSignatureError:
-            return None, JsonResponse({'error': 'Sessão expirada. Faça login novamente.'}, status=401)
-        
-        except (jwt.DecodeError, jwt.InvalidTokenError, User.DoesNotExist):
-            return None, JsonResponse({'error': 'Não foi possível validar a sessão.'}, status=401)
+def definir_cookies_token(response, tokens):
+    #grava os tokens nos cookies httponly da resposta
+    response.set_cookie(
+        key='access_token',
+        value=tokens['access'],
+        httponly=True,
+        secure=False,
+        samesite='Lax'
+    )
+    response.set_cookie(
+        key='refresh_token',
+        value=tokens['refresh'],
+        httponly=True,
+        secure=False,
+        samesite='Lax',
+        max_age=604800  # dura 7 dias
+    )
+    return response
+
+
+def obter_usuario_do_access_token(access_token):
+    """
+    Retorna o usuário dono do access token.
+    Lança jwt.ExpiredSignatureError, jwt.InvalidTokenError ou User.DoesNotExist.
+    """
+    # Token já verificado recentemente: evita o jwt.decode e a consulta ao banco
+    user = cache_tokens.obter(access_token)
+    if user is not None:
+        return user
+
+    payload = jwt.decode(access_token, settings.SECRET_KEY, algorithms=['HS256'])
+    user = User.objects.get(id=payload['id'], is_active=True)
+    cache_tokens.guardar(access_token, user, payload['exp'])
+    return user
+
+
+def renovar_tokens(refresh_token):
+    """
+    Valida o refresh token e gera um novo par de tokens.
+    Retorna (user, novos_tokens). Lança jwt.InvalidTokenError ou User.DoesNotExist.
+    """
+    #  Decodifica o payload do refresh token SEM verificar a assinatura para obter o 'id' do usuário.
+    #  Isso é necessário para buscar o usuário e sua senha para construir a chave secreta correta.
+    unverified_payload = jwt.decode(refresh_token, options={"verify_signature": False})
+
+    if unverified_payload.get('token_type') != 'refresh':
+        raise jwt.InvalidTokenError('Tipo de token inválido')
+
+    # Busca o usuário no banco de dados.
+    user = User.objects.get(id=unverified_payload['id'], is_active=True)
+
+    # AGORA, constrói a chave secreta correta e verifica a assinatura do refresh token.
+    jwt.decode(
+        refresh_token,
+        settings.SECRET_KEY + user.password,
+        algorithms=['HS256']
+    )
 
-    except jwt.InvalidTokenError:
-        return None, JsonResponse({'error': 'Token de acesso inválido.'}, status=401)
\ No newline at end of file
+    return user, criar_token(user)